@@ -0,0 +1,166 @@
+import asyncio
+import io
+import json
+import shutil
+import tempfile
+from datetime import date
+from typing import Optional
+from fastapi import APIRouter, Depends, File, Query, UploadFile
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from core.admission import admission_metrics
+from core.cache import cache_bus
+from core.compression import compression_metrics
+from core.database import DBSession, SessionLocal, get_db, pool_status, replica_status, run_db
+from core.security import get_current_admin_user, password_hasher, principal_cache
+from models.schemas import User
+from services.async_business import AsyncAnalyticsService
+from services.business import ProductService, catalog_cache, price_cache
+from services.catalog_import import detect_format, import_catalog
+from services.images import image_processor, store_image
+from services.jobs import JobService
+
+router = APIRouter()
+
+@router.get("/stats/catalog-cache")
+async def get_catalog_cache_stats(current_user: User = Depends(get_current_admin_user)):
+    """Get catalog cache hit/miss/eviction counters (admin only)."""
+    return ProductService.get_cache_stats()
+
+@router.get("/stats/shared-cache")
+async def get_shared_cache_stats(current_user: User = Depends(get_current_admin_user)):
+    """Get the shared cache backend's broadcast counts and each shared cache's hit rates (admin only)."""
+    return {
+        **cache_bus.stats(),
+        "caches": [cache.stats() for cache in (catalog_cache, price_cache, principal_cache)],
+    }
+
+@router.get("/stats/password-hasher")
+async def get_password_hasher_stats(current_user: User = Depends(get_current_admin_user)):
+    """Get password hashing pool queue depth and throughput (admin only)."""
+    return password_hasher.stats()
+
+@router.get("/stats/image-processor")
+async def get_image_processor_stats(current_user: User = Depends(get_current_admin_user)):
+    """Get image derivative pool load and outcomes (admin only)."""
+    return image_processor.stats()
+
+@router.get("/stats/jobs")
+async def get_job_stats(
+    window_seconds: int = Query(3600, ge=1, le=7 * 86400),
+    db: DBSession = Depends(get_db),
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Get background job queue depth, backlog age and latencies over the last window (admin only)."""
+    return await run_db(db, JobService.get_stats, window_seconds=window_seconds)
+
+@router.post("/jobs/requeue")
+async def requeue_failed_jobs(
+    job_id: Optional[int] = Query(None, description="Only this job; all failed jobs when omitted"),
+    db: DBSession = Depends(get_db),
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Queue failed background jobs again with a fresh set of attempts (admin only)."""
+    return {"requeued": await run_db(db, JobService.requeue_failed, job_id)}
+
+@router.get("/stats/admission")
+async def get_admission_stats(current_user: User = Depends(get_current_admin_user)):
+    """Get rate-limited and shed request counts and current concurrency (admin only)."""
+    return admission_metrics.snapshot()
+
+@router.get("/stats/db-pool")
+async def get_db_pool_stats(current_user: User = Depends(get_current_admin_user)):
+    """Get database connection pool occupancy and checkout wait times (admin only)."""
+    return pool_status()
+
+@router.get("/stats/db-replicas")
+async def get_db_replica_stats(current_user: User = Depends(get_current_admin_user)):
+    """Get read replica routing counts and replica pool occupancy (admin only)."""
+    return replica_status()
+
+@router.get("/stats/compression")
+async def get_compression_stats(current_user: User = Depends(get_current_admin_user)):
+    """Get compressed response counts and bytes saved per encoding (admin only)."""
+    return compression_metrics.snapshot()
+
+@router.get("/analytics/sales")
+async def get_daily_sales(
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None, description="Inclusive"),
+    db: DBSession = Depends(get_db),
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Get units sold and revenue per day (admin only)."""
+    return await AsyncAnalyticsService.get_daily_sales(db, start=start, end=end)
+
+@router.get("/analytics/top-products")
+async def get_top_products(
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None, description="Inclusive"),
+    limit: int = Query(10, ge=1, le=100),
+    db: DBSession = Depends(get_db),
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Get the best-selling products by units, all time or within a date range (admin only)."""
+    return await AsyncAnalyticsService.get_top_products(db, start=start, end=end, limit=limit)
+
+@router.get("/analytics/categories")
+async def get_category_sales(
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None, description="Inclusive"),
+    db: DBSession = Depends(get_db),
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Get units sold and revenue per category, highest revenue first (admin only)."""
+    return await AsyncAnalyticsService.get_category_sales(db, start=start, end=end)
+
+@router.post("/images", status_code=201)
+async def upload_image(
+    file: UploadFile = File(...),
+    current_user: User = Depends(get_current_admin_user),
+):
+    """Upload a product image, returning its URL and those of its resized WebP copies (admin only)."""
+    return await store_image(file)
+
+@router.post("/catalog/import")
+async def import_catalog_feed(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, pattern="^(csv|jsonl)$"),
+    chunk_size: int = Query(1000, ge=1, le=10000),
+    create_categories: bool = True,
+    current_user: User = Depends(get_current_admin_user),
+):
+    """Bulk-import a CSV or JSONL product feed, streaming NDJSON progress lines (admin only)."""
+    fmt = format or detect_format(file.filename)
+    # FastAPI closes the upload when this handler returns, before the response streams
+    feed = tempfile.TemporaryFile()
+    await run_in_threadpool(shutil.copyfileobj, file.file, feed)
+    feed.seek(0)
+    loop = asyncio.get_running_loop()
+    updates: asyncio.Queue = asyncio.Queue()
+
+    def run():
+        db = SessionLocal()
+        try:
+            with io.TextIOWrapper(feed, encoding="utf-8-sig", newline="") as text:
+                return import_catalog(
+                    db, text, fmt, chunk_size=chunk_size, create_categories=create_categories,
+                    progress=lambda progress: loop.call_soon_threadsafe(updates.put_nowait, progress),
+                )
+        finally:
+            db.close()
+
+    async def progress_lines():
+        task = asyncio.ensure_future(run_in_threadpool(run))
+        # Progress callbacks are queued before the task completes, so the sentinel comes last
+        task.add_done_callback(lambda _: updates.put_nowait(None))
+        while (progress := await updates.get()) is not None:
+            yield json.dumps(progress) + "\n"
+        try:
+            summary = task.result()
+        except Exception as e:
+            yield json.dumps({"done": False, "error": str(e)}) + "\n"
+        else:
+            yield json.dumps({**summary, "done": True}) + "\n"
+
+    return StreamingResponse(progress_lines(), media_type="application/x-ndjson")
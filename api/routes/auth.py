@@ -1,20 +1,25 @@
 from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from core.database import get_db
-from core.security import verify_password, create_access_token, get_current_active_user
+from core.database import DBSession, get_db
+from core.security import (
+    create_access_token,
+    get_current_active_user,
+    get_password_hash_async,
+    verify_and_update_password,
+)
 from models.schemas import Token, UserCreate, User
-from services.business import UserService
+from services.async_business import AsyncUserService
 from app.config import settings
 
 router = APIRouter()
 
 @router.post("/register", response_model=User)
-async def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: DBSession = Depends(get_db)):
     """Register a new user."""
+    hashed_password = await get_password_hash_async(user.password)
     try:
-        db_user = UserService.create_user(db, user)
+        db_user = await AsyncUserService.create_user(db, user, hashed_password=hashed_password)
         return db_user
     except HTTPException:
         raise
@@ -25,15 +30,21 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
         )
 
 @router.post("/login", response_model=Token)
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: DBSession = Depends(get_db)):
     """Login user and return access token."""
-    user = UserService.get_user_by_email(db, form_data.username)
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    user = await AsyncUserService.get_user_by_email(db, form_data.username)
+    verified, new_hash = False, None
+    if user:
+        verified, new_hash = await verify_and_update_password(form_data.password, user.hashed_password)
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if new_hash:
+        # Stored hash uses an outdated bcrypt cost
+        await AsyncUserService.update_password_hash(db, user, new_hash)
     
     access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
     access_token = create_access_token(
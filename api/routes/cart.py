@@ -0,0 +1,109 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, status, Response
+from core.database import DBSession, get_db
+from core.security import get_current_active_user
+from models.schemas import Cart, CartItem, CartItemUpdate, Order, OrderBase, User
+from services.async_business import AsyncCartService
+from services.idempotency import fingerprint, run_idempotent
+
+router = APIRouter()
+
+def _line_not_found() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Cart item not found"
+    )
+
+@router.get("/", response_model=Cart)
+async def get_cart(
+    db: DBSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Get the current user's cart with its running totals."""
+    return await AsyncCartService.get_cart(db, current_user.id)
+
+@router.post("/items", response_model=Cart)
+async def add_cart_item(
+    item: CartItem,
+    db: DBSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Add an item to the cart, merging it with a line for the same product, size and color."""
+    return await AsyncCartService.add_item(db, current_user.id, item)
+
+@router.put("/items/{item_id}", response_model=Cart)
+async def update_cart_item(
+    item_id: int,
+    update: CartItemUpdate,
+    db: DBSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Set a cart line's quantity; zero removes it."""
+    cart = await AsyncCartService.set_quantity(db, current_user.id, item_id, update.quantity)
+    if cart is None:
+        raise _line_not_found()
+    return cart
+
+@router.delete("/items/{item_id}", response_model=Cart)
+async def remove_cart_item(
+    item_id: int,
+    db: DBSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Remove a line from the cart."""
+    cart = await AsyncCartService.remove_item(db, current_user.id, item_id)
+    if cart is None:
+        raise _line_not_found()
+    return cart
+
+@router.delete("/", response_model=Cart)
+async def clear_cart(
+    db: DBSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Empty the cart."""
+    return await AsyncCartService.clear(db, current_user.id)
+
+@router.post("/checkout", response_model=Order)
+async def checkout(
+    details: OrderBase,
+    idempotency_key: Optional[str] = Header(
+        None, max_length=255, description="Retries with the same key return the first response"
+    ),
+    db: DBSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Place an order for everything in the cart and empty it.
+
+    Honours Idempotency-Key the same way as POST /api/orders/.
+    """
+    async def place_order(before_commit=None):
+        try:
+            return await AsyncCartService.checkout(db, current_user.id, details, before_commit)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to create order"
+            )
+
+    if idempotency_key is None:
+        return await place_order()
+
+    async def place_and_record(record):
+        def render(session, db_order):
+            # Stored in the order's own transaction, so it commits together with the order
+            record(session, (status.HTTP_200_OK, Order.model_validate(db_order).model_dump_json()))
+        await place_order(render)
+
+    (status_code, body), replayed = await run_idempotent(
+        db, current_user.id, idempotency_key, fingerprint(b"cart:" + details.model_dump_json().encode()),
+        place_and_record
+    )
+    return Response(
+        content=body,
+        status_code=status_code,
+        media_type="application/json",
+        headers={"Idempotent-Replayed": "true"} if replayed else None,
+    )
@@ -1,48 +1,115 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from core.database import get_db
-from core.security import get_current_active_user
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, status, Query, Response
+from fastapi.responses import StreamingResponse
+from core.database import DBSession, SessionLocal, get_db
+from core.security import get_current_active_user, get_current_admin_user
+from core.utils import encode_cursor
 from models.schemas import Order, OrderCreate, User
-from services.business import OrderService
+from services.async_business import AsyncOrderService
+from services.idempotency import fingerprint, run_idempotent
+from services.order_export import EXPORTERS
 
 router = APIRouter()
 
 @router.post("/", response_model=Order)
 async def create_order(
     order: OrderCreate,
-    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(
+        None, max_length=255, description="Retries with the same key return the first response"
+    ),
+    db: DBSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    """Create a new order."""
-    try:
-        db_order = OrderService.create_order(db, order, current_user.id)
-        return db_order
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to create order"
-        )
+    """Create a new order.
+
+    With an Idempotency-Key header the order is placed at most once per key:
+    a retry gets the stored response (marked Idempotent-Replayed: true), and
+    one that arrives while the first attempt is still running waits for it.
+    """
+    async def place_order(before_commit=None):
+        try:
+            return await AsyncOrderService.create_order(db, order, current_user.id, before_commit)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to create order"
+            )
+
+    if idempotency_key is None:
+        return await place_order()
+
+    async def place_and_record(record):
+        def render(session, db_order):
+            # Stored in the order's own transaction, so it commits together with the order
+            record(session, (status.HTTP_200_OK, Order.model_validate(db_order).model_dump_json()))
+        await place_order(render)
+
+    (status_code, body), replayed = await run_idempotent(
+        db, current_user.id, idempotency_key, fingerprint(order.model_dump_json().encode()), place_and_record
+    )
+    return Response(
+        content=body,
+        status_code=status_code,
+        media_type="application/json",
+        headers={"Idempotent-Replayed": "true"} if replayed else None,
+    )
 
 @router.get("/", response_model=List[Order])
 async def get_user_orders(
-    db: Session = Depends(get_db),
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous X-Next-Cursor header"),
+    db: DBSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    """Get all orders for the current user."""
-    orders = OrderService.get_user_orders(db, current_user.id)
+    """Get the current user's orders, newest first.
+
+    When a full page is returned the X-Next-Cursor header carries a cursor
+    for the next page; skip/limit paging still works when no cursor is given.
+    """
+    orders = await AsyncOrderService.get_user_orders(db, current_user.id, skip=skip, limit=limit, cursor=cursor)
+    if len(orders) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(orders[-1].created_at, orders[-1].id)
     return orders
 
+@router.get("/export")
+async def export_orders(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    start: Optional[datetime] = Query(None, description="Orders created at or after this time (UTC)"),
+    end: Optional[datetime] = Query(None, description="Orders created before this time (UTC)"),
+    after_id: Optional[int] = Query(None, ge=0, description="Resume after this order id"),
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Stream orders and their line items as CSV or NDJSON, in order id order (admin only)."""
+    exporter, media_type = EXPORTERS[format]
+
+    def chunks():
+        # The request session is closed before the body streams, so the export owns its own
+        db = SessionLocal()
+        try:
+            yield from exporter(db, start=start, end=end, after_id=after_id)
+        finally:
+            db.close()
+
+    # A sync iterator is advanced in the threadpool, keeping the event loop free
+    return StreamingResponse(
+        chunks(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="orders.{format}"'},
+    )
+
 @router.get("/{order_id}", response_model=Order)
 async def get_order(
     order_id: int,
-    db: Session = Depends(get_db),
+    db: DBSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Get a specific order."""
-    order = OrderService.get_order(db, order_id, current_user.id)
+    order = await AsyncOrderService.get_order(db, order_id, current_user.id)
     if not order:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
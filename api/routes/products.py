@@ -1,49 +1,131 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from core.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from core.database import DBSession, get_db
+from core.http_cache import conditional_response, content_etag, last_modified, product_etag
+from core.responses import snapshot_response
 from core.security import get_current_active_user
-from models.schemas import Product, ProductCreate, ProductUpdate, User
-from services.business import ProductService
+from core.utils import encode_cursor
+from models.schemas import Product, ProductCreate, ProductUpdate, ProductVariantBase, ProductFacets, User
+from services.async_business import AsyncProductService
+from app.config import settings
 import models.database as db_models
 
 router = APIRouter()
 
 @router.get("/", response_model=List[Product])
 async def get_products(
+    request: Request,
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
     category_id: Optional[int] = Query(None),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous X-Next-Cursor header"),
+    size: Optional[str] = Query(None, description="Only products with this size in stock"),
+    color: Optional[str] = Query(None, description="Only products with this color in stock"),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    sort: str = Query("newest", pattern="^(newest|best_selling)$"),
+    db: DBSession = Depends(get_db)
 ):
-    """Get all products with optional filtering."""
-    products = ProductService.get_products(db, skip=skip, limit=limit, category_id=category_id)
+    """Get all products with optional filtering.
+
+    Results are ordered by creation time, or by units sold with
+    sort=best_selling. When a full page is returned the
+    X-Next-Cursor header carries a cursor for the next page; skip/limit
+    paging still works when no cursor is given. Size and color together
+    match products stocking that exact combination. Responses carry an ETag;
+    a matching If-None-Match gets 304 Not Modified.
+    """
+    products = await AsyncProductService.get_products(
+        db, skip=skip, limit=limit, category_id=category_id, cursor=cursor,
+        size=size, color=color, min_price=min_price, max_price=max_price, sort=sort
+    )
+    if len(products) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(products[-1].created_at, products[-1].id)
+    not_modified = conditional_response(request, response, product_etag(products), last_modified(products))
+    if not_modified:
+        return not_modified
+    if settings.fast_json_responses:
+        return snapshot_response(products, Product, response)
     return products
 
 @router.get("/featured", response_model=List[Product])
 async def get_featured_products(
+    request: Request,
+    response: Response,
     limit: int = Query(6, ge=1, le=20),
-    db: Session = Depends(get_db)
+    db: DBSession = Depends(get_db)
 ):
     """Get featured products."""
-    products = ProductService.get_featured_products(db, limit=limit)
+    products = await AsyncProductService.get_featured_products(db, limit=limit)
+    not_modified = conditional_response(request, response, product_etag(products), last_modified(products))
+    if not_modified:
+        return not_modified
+    if settings.fast_json_responses:
+        return snapshot_response(products, Product, response)
+    return products
+
+@router.get("/facets", response_model=ProductFacets)
+async def get_product_facets(
+    request: Request,
+    response: Response,
+    category_id: Optional[int] = Query(None),
+    size: Optional[str] = Query(None),
+    color: Optional[str] = Query(None),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    db: DBSession = Depends(get_db)
+):
+    """Get product counts per category, size and color plus the price range.
+
+    Takes the same filters as the listing; each facet applies every filter
+    except its own, so the counts show what selecting another value would give.
+    """
+    facets = await AsyncProductService.get_facets(
+        db, category_id=category_id, size=size, color=color, min_price=min_price, max_price=max_price
+    )
+    not_modified = conditional_response(request, response, content_etag(facets))
+    if not_modified:
+        return not_modified
+    return facets
+
+@router.get("/search", response_model=List[Product])
+async def search_products(
+    request: Request,
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: DBSession = Depends(get_db)
+):
+    """Search products by name, description and category, best matches first.
+
+    The last query word also matches as a prefix, and small typos are tolerated.
+    """
+    products = await AsyncProductService.search_products(db, q, limit=limit, offset=offset)
+    not_modified = conditional_response(request, response, product_etag(products), last_modified(products))
+    if not_modified:
+        return not_modified
     return products
 
 @router.get("/{product_id}", response_model=Product)
-async def get_product(product_id: int, db: Session = Depends(get_db)):
+async def get_product(product_id: int, request: Request, response: Response, db: DBSession = Depends(get_db)):
     """Get a specific product by ID."""
-    product = ProductService.get_product(db, product_id)
+    product = await AsyncProductService.get_product(db, product_id)
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Product not found"
         )
+    not_modified = conditional_response(request, response, product_etag([product]), last_modified([product]))
+    if not_modified:
+        return not_modified
     return product
 
 @router.post("/", response_model=Product)
 async def create_product(
     product: ProductCreate,
-    db: Session = Depends(get_db),
+    db: DBSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Create a new product (admin only)."""
@@ -53,13 +135,13 @@ async def create_product(
             detail="Not enough permissions"
         )
     
-    return ProductService.create_product(db, product)
+    return await AsyncProductService.create_product(db, product)
 
 @router.put("/{product_id}", response_model=Product)
 async def update_product(
     product_id: int,
     product_update: ProductUpdate,
-    db: Session = Depends(get_db),
+    db: DBSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Update a product (admin only)."""
@@ -69,10 +151,32 @@ async def update_product(
             detail="Not enough permissions"
         )
     
-    product = ProductService.update_product(db, product_id, product_update)
+    product = await AsyncProductService.update_product(db, product_id, product_update)
+    if not product:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Product not found"
+        )
+    return product
+
+@router.put("/{product_id}/variants", response_model=Product)
+async def update_variant_stock(
+    product_id: int,
+    variants: List[ProductVariantBase],
+    db: DBSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Set stock per size/color combination (admin only)."""
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    
+    product = await AsyncProductService.update_variant_stock(db, product_id, variants)
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Product not found"
         )
-    return product
\ No newline at end of file
+    return product
@@ -1,6 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from core.database import get_db
+from core.database import DBSession, get_db
 from core.security import get_current_active_user
 from models.schemas import User
 
@@ -14,7 +13,7 @@ async def get_user_profile(current_user: User = Depends(get_current_active_user)
 @router.put("/profile", response_model=User)
 async def update_user_profile(
     user_update: dict,
-    db: Session = Depends(get_db),
+    db: DBSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Update user profile."""
@@ -2,13 +2,78 @@ from pydantic_settings import BaseSettings
 from typing import Optional
 
 class Settings(BaseSettings):
-    database_url: str = "sqlite:///./adidas_store.db"
+    database_url: str = "sqlite:///./adidas_store.db"  # the primary
+    database_replica_urls: str = ""  # comma-separated read replicas, same driver as DATABASE_URL
+    replica_lag_seconds: float = 5.0  # reads stay on the primary this long after a write; above worst replica lag
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0
+    db_pool_recycle: int = 1800  # seconds, -1 disables
+    db_pool_pre_ping: bool = True
+    sqlite_journal_mode: str = "wal"
+    sqlite_synchronous: str = "normal"
+    sqlite_cache_size: int = -64000  # negative values are KiB
+    sqlite_mmap_size: int = 268435456
     secret_key: str = "your-secret-key-change-in-production"
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
+    bcrypt_rounds: int = 12
+    password_hash_workers: int = 2
+    password_hash_max_pending: int = 32
+    principal_cache_size: int = 10000
+    principal_cache_ttl_seconds: float = 60.0
+    token_cache_enabled: bool = True
     environment: str = "development"
     host: str = "0.0.0.0"
     port: int = 8000
+    catalog_cache_size: int = 1024
+    catalog_cache_ttl_seconds: float = 300.0
+    price_cache_size: int = 10000  # product prices looked up by cart updates
+    cache_backend: str = "local"  # local, sqlite:<path> or redis://[:password@]host:port/db, shared by all workers
+    cache_namespace: str = "store"  # key prefix in the shared cache store
+    cache_bus_poll_interval_seconds: float = 0.1  # how often sqlite: workers pick up other workers' invalidations
+    catalog_http_max_age: int = 60  # seconds; 0 makes clients revalidate every time
+    catalog_http_stale_while_revalidate: int = 300
+    fast_json_responses: bool = False  # orjson rendering plus pre-serialized catalog lists
+    compression_enabled: bool = True
+    compression_min_size: int = 1024  # bytes; smaller responses go out as they are
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 4
+    metrics_enabled: bool = False  # serve /metrics; it exposes internals, so set METRICS_TOKEN too
+    metrics_token: str = ""  # when set, /metrics requires Authorization: Bearer <token>
+    slow_query_threshold_ms: float = 200.0  # negative disables the slow-query log
+    slow_query_log_parameters: bool = True
+    idempotency_key_ttl_seconds: int = 86400  # how long a completed order response is replayed
+    idempotency_wait_seconds: float = 30.0  # how long a duplicate waits for the first request
+    idempotency_lock_timeout_seconds: int = 120  # after this an unfinished request is presumed dead
+    job_max_attempts: int = 5
+    job_retry_base_seconds: float = 2.0  # doubled after each failed attempt
+    job_retry_max_seconds: float = 600.0
+    job_lock_timeout_seconds: int = 300  # after this a running job is presumed abandoned
+    job_poll_interval_seconds: float = 1.0
+    job_batch_size: int = 10
+    job_retention_seconds: int = 604800  # finished jobs are purged after this
+    jobs_run_in_process: bool = True  # run a worker thread inside the API process; false with scripts/run_worker.py
+    low_stock_threshold: int = 5
+    image_upload_max_bytes: int = 10485760
+    image_derivative_widths: str = "320,640,1280"  # comma-separated pixel widths of the WebP copies
+    image_webp_quality: int = 80
+    image_workers: int = 2
+    image_max_pending: int = 8
+    rate_limit_enabled: bool = True
+    rate_limit_backend: str = "memory"  # memory, sqlite:<path> shared by all workers, or module:factory
+    rate_limit_default: str = "30/s"  # per client across all requests; also the burst size
+    rate_limit_routes: str = "POST /api/auth/login=10/m,POST /api/auth/register=5/m"  # extra per-route buckets
+    rate_limit_exempt_paths: str = "/health,/metrics,/static/"
+    rate_limit_trust_forwarded_for: bool = False  # key anonymous clients on X-Forwarded-For behind a proxy
+    rate_limit_client_ip_header: str = ""  # header the proxy sets to the client's address, e.g. Fly-Client-IP
+    rate_limit_max_keys: int = 100000  # buckets kept by the memory backend
+    max_concurrent_requests: int = 256  # per process; 0 disables admission control
+    max_waiting_requests: int = 128  # beyond this, requests are shed immediately
+    admission_wait_seconds: float = 1.0  # longest a request waits for a slot before it is shed
+    admission_exempt_paths: str = "/health,/metrics"
+    orm_loading_strategy: str = "selectin"  # selectin, joined or lazy
+    search_backend: str = "auto"  # auto, fts5 or memory
     
     class Config:
         env_file = ".env"
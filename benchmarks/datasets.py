@@ -0,0 +1,147 @@
+"""Deterministic synthetic data sets for the benchmarks.
+
+Rows go in with bulk Core INSERTs in fixed-size batches and explicit ids, so
+even the 1M-product catalog builds in minutes with flat memory. The same size
+and seed always produce the same data.
+"""
+import json
+import random
+from typing import Dict, Iterator, List
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+from core.security import get_password_hash
+from models.database import Category, Order, OrderItem, Product, ProductVariant, User
+from services.business import AnalyticsService
+
+SIZES = {
+    "1k": {"products": 1_000, "users": 200, "orders": 2_000},
+    "100k": {"products": 100_000, "users": 10_000, "orders": 100_000},
+    "1m": {"products": 1_000_000, "users": 100_000, "orders": 1_000_000},
+}
+
+USER_PASSWORD = "benchmark"
+BATCH_SIZE = 5_000
+
+MODELS = ["Ultraboost", "Adizero", "Gazelle", "Samba", "Superstar", "Forum", "Ozweego", "Terrex",
+          "Predator", "Copa", "Harden", "Dame", "Supernova", "Solarglide", "Duramo", "Pureboost"]
+ADJECTIVES = ["lightweight", "responsive", "breathable", "cushioned", "durable", "waterproof",
+              "classic", "retro", "premium", "grippy", "supportive", "flexible"]
+MATERIALS = ["primeknit", "suede", "leather", "mesh", "canvas", "nylon", "rubber", "foam"]
+CATEGORIES = ["Running", "Lifestyle", "Basketball", "Football", "Training", "Outdoor", "Tennis"]
+SHOE_SIZES = ["7", "7.5", "8", "8.5", "9", "9.5", "10", "10.5", "11", "11.5", "12"]
+COLORS = ["Black", "White", "Blue", "Red", "Grey", "Green"]
+VARIANT_STOCK = 10_000  # large enough that checkout scenarios never run out
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def _batches(rows: Iterator[dict], size: int = BATCH_SIZE) -> Iterator[List[dict]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def product_variants(product_id: int) -> List[Dict[str, object]]:
+    """The size/color combinations generated for a product (also used to build checkout requests)."""
+    rng = random.Random(product_id)
+    start = rng.randint(0, len(SHOE_SIZES) - 4)
+    sizes = SHOE_SIZES[start:start + 4]
+    colors = rng.sample(COLORS, 2)
+    return [{"size": size, "color": color} for size in sizes for color in colors]
+
+def _products(count: int, seed: int) -> Iterator[dict]:
+    rng = random.Random(seed)
+    for product_id in range(1, count + 1):
+        model = rng.choice(MODELS)
+        variants = product_variants(product_id)
+        yield {
+            "id": product_id,
+            "name": f"{model} {rng.randint(1, 99)} {rng.choice(MATERIALS).title()}",
+            "description": f"{rng.choice(ADJECTIVES).title()} {rng.choice(ADJECTIVES)} shoe with "
+                           f"{rng.choice(MATERIALS)} upper and {rng.choice(MATERIALS)} outsole.",
+            "price": round(rng.uniform(40, 250), 2),
+            "category_id": rng.randint(1, len(CATEGORIES)),
+            "sizes": json.dumps(sorted({v["size"] for v in variants}, key=SHOE_SIZES.index)),
+            "colors": json.dumps(sorted({v["color"] for v in variants}, key=COLORS.index)),
+            "stock_quantity": VARIANT_STOCK * len(variants),
+            "is_featured": rng.random() < 0.01,
+            "is_active": True,
+        }
+
+def _variants(count: int) -> Iterator[dict]:
+    for product_id in range(1, count + 1):
+        for variant in product_variants(product_id):
+            yield {"product_id": product_id, "stock_quantity": VARIANT_STOCK, **variant}
+
+def _users(count: int, hashed_password: str) -> Iterator[dict]:
+    for user_id in range(1, count + 1):
+        yield {
+            "id": user_id,
+            "email": user_email(user_id),
+            "hashed_password": hashed_password,
+            "first_name": "Bench",
+            "last_name": f"User {user_id}",
+            "is_active": True,
+            "is_admin": False,
+        }
+
+def user_email(user_id: int) -> str:
+    return f"bench{user_id}@example.com"
+
+def _orders(count: int, users: int, products: int, seed: int):
+    rng = random.Random(seed + 1)
+    orders, items = [], []
+    for order_id in range(1, count + 1):
+        subtotal = 0.0
+        for _ in range(rng.randint(1, 3)):
+            product_id = rng.randint(1, products)
+            variant = rng.choice(product_variants(product_id))
+            price = round(rng.uniform(40, 250), 2)
+            subtotal += price
+            items.append({"order_id": order_id, "product_id": product_id, "quantity": 1,
+                          "unit_price": price, "total_price": price, **variant})
+        orders.append({"id": order_id, "user_id": rng.randint(1, users), "status": "confirmed",
+                       "subtotal": subtotal, "total_amount": subtotal})
+        if len(orders) == BATCH_SIZE:
+            yield orders, items
+            orders, items = [], []
+    if orders:
+        yield orders, items
+
+def build(bind, size: str, seed: int = 42, progress=print) -> Dict[str, int]:
+    """Fill an empty database with the named data set; returns the row counts."""
+    spec = SIZES[size]
+    with Session(bind) as db:
+        db.execute(insert(Category), [{"id": i, "name": name} for i, name in enumerate(CATEGORIES, 1)])
+        for batch in _batches(_products(spec["products"], seed)):
+            db.execute(insert(Product), batch)
+        progress(f"  products: {spec['products']}")
+        for batch in _batches(_variants(spec["products"])):
+            db.execute(insert(ProductVariant), batch)
+        progress("  variants")
+        # Every benchmark user shares one password, so hash it once
+        for batch in _batches(_users(spec["users"], get_password_hash(USER_PASSWORD))):
+            db.execute(insert(User), batch)
+        progress(f"  users: {spec['users']}")
+        for orders, items in _orders(spec["orders"], spec["users"], spec["products"], seed):
+            db.execute(insert(Order), orders)
+            db.execute(insert(OrderItem), items)
+        progress(f"  orders: {spec['orders']}")
+        db.commit()
+        # Orders went in directly rather than through checkout
+        AnalyticsService.rebuild_rollups(db)
+        progress("  sales rollups")
+    return counts(bind)
+
+def counts(bind) -> Dict[str, int]:
+    with Session(bind) as db:
+        return {
+            "products": db.scalar(select(func.count()).select_from(Product)),
+            "users": db.scalar(select(func.count()).select_from(User)),
+            "orders": db.scalar(select(func.count()).select_from(Order)),
+        }
@@ -0,0 +1,213 @@
+"""Load test for the store API.
+
+Builds (or reuses) a synthetic data set from benchmarks/datasets.py, drives the
+real app in-process over httpx's ASGI transport and reports throughput and
+p50/p95/p99 latency per scenario and concurrency level:
+
+* browse   - GET /api/products/ pages, following X-Next-Cursor, some by category
+* detail   - GET /api/products/{id} for random products
+* login    - POST /api/auth/login (bcrypt verification)
+* checkout - POST /api/orders/ with one or two random variants
+
+    python benchmarks/load_test.py [--size 1k|100k|1m] [--concurrency 1,8,32] [--requests 500]
+        [--scenarios browse,detail,login,checkout] [--save baseline.json]
+        [--compare baseline.json] [--threshold 0.15]
+
+The data set lives in the system temp directory and is reused by later runs
+with the same size (--fresh rebuilds it). --compare exits with status 1 when
+any scenario's p95 latency rose, or its throughput fell, by more than the
+threshold.
+"""
+import sys
+import os
+import argparse
+import asyncio
+import json
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SCENARIOS = ["browse", "detail", "login", "checkout"]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", default="1k", choices=["1k", "100k", "1m"])
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=500, help="measured requests per scenario and level")
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured requests before each run")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--database-url", default=None, help="defaults to a reusable SQLite file in the temp dir")
+    parser.add_argument("--fresh", action="store_true", help="rebuild the data set even if it exists")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--save", metavar="FILE", help="write results as a JSON baseline")
+    parser.add_argument("--compare", metavar="FILE", help="compare against a saved baseline")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed relative regression")
+    return parser.parse_args()
+
+args = parse_args()
+_db_path = os.path.join(tempfile.gettempdir(), f"store-bench-{args.size}.db")
+if args.database_url:
+    os.environ["DATABASE_URL"] = args.database_url
+else:
+    if args.fresh:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(_db_path + suffix):
+                os.remove(_db_path + suffix)
+    os.environ["DATABASE_URL"] = f"sqlite:///{_db_path}"
+
+# Every simulated request comes from one client address
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+import httpx
+from core.database import Base, async_engine, engine
+from core.security import create_access_token
+from benchmarks import datasets
+
+def prepare() -> dict:
+    Base.metadata.create_all(bind=engine)
+    spec = datasets.SIZES[args.size]
+    existing = datasets.counts(engine)
+    if existing["products"] == spec["products"] and existing["users"] == spec["users"]:
+        print(f"reusing {args.size} data set: {existing}")
+        return existing
+    if existing["products"] or existing["users"]:
+        sys.exit(f"database holds a different data set {existing}; use --fresh or another --database-url")
+    print(f"building {args.size} data set")
+    start = time.perf_counter()
+    built = datasets.build(engine, args.size, seed=args.seed)
+    print(f"built in {time.perf_counter() - start:.1f}s: {built}")
+    return built
+
+async def browse(client, rng, ctx):
+    params = {"limit": 20}
+    if ctx.get("cursor") and rng.random() < 0.7:
+        params["cursor"] = ctx["cursor"]
+    else:
+        ctx["category_id"] = rng.choice([None, *range(1, len(datasets.CATEGORIES) + 1)])
+    if ctx.get("category_id"):
+        params["category_id"] = ctx["category_id"]
+    response = await client.get("/api/products/", params=params)
+    ctx["cursor"] = response.headers.get("x-next-cursor")
+    return response
+
+async def detail(client, rng, ctx):
+    return await client.get(f"/api/products/{rng.randint(1, ctx['products'])}")
+
+async def login(client, rng, ctx):
+    email = datasets.user_email(rng.randint(1, ctx["users"]))
+    return await client.post("/api/auth/login", data={"username": email, "password": datasets.USER_PASSWORD})
+
+async def checkout(client, rng, ctx):
+    email = datasets.user_email(rng.randint(1, ctx["users"]))
+    items = []
+    for product_id in rng.sample(range(1, ctx["products"] + 1), rng.randint(1, 2)):
+        items.append({"product_id": product_id, "quantity": 1, **rng.choice(datasets.product_variants(product_id))})
+    return await client.post(
+        "/api/orders/",
+        json={"items": items, "shipping_address": "1 Benchmark Way"},
+        headers={"Authorization": f"Bearer {create_access_token({'sub': email})}"},
+    )
+
+async def run_level(client, scenario, concurrency: int, total: int, dataset: dict, seed: int) -> dict:
+    latencies, statuses = [], {}
+
+    async def worker(worker_id: int, pending, record: bool):
+        rng = random.Random(seed * 10_000 + worker_id)
+        ctx = dict(dataset)
+        # Workers share one iterator, so exactly `total` requests are made between them
+        for _ in pending:
+            started = time.perf_counter()
+            response = await scenario(client, rng, ctx)
+            if record:
+                latencies.append((time.perf_counter() - started) * 1000)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    if args.warmup:
+        warmup = iter(range(args.warmup))
+        await asyncio.gather(*(worker(-i - 1, warmup, False) for i in range(concurrency)))
+    started = time.perf_counter()
+    pending = iter(range(total))
+    await asyncio.gather(*(worker(i, pending, True) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": len(latencies),
+        "errors": sum(count for code, count in statuses.items() if code >= 400),
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "mean_ms": round(statistics.mean(latencies), 3),
+        "p50_ms": round(datasets.percentile(latencies, 50), 3),
+        "p95_ms": round(datasets.percentile(latencies, 95), 3),
+        "p99_ms": round(datasets.percentile(latencies, 99), 3),
+    }
+
+async def run_all(dataset: dict) -> dict:
+    import main
+    scenarios = {name: globals()[name] for name in args.scenarios.split(",")}
+    levels = [int(level) for level in args.concurrency.split(",")]
+    results = {}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for name, scenario in scenarios.items():
+            for concurrency in levels:
+                result = await run_level(client, scenario, concurrency, args.requests, dataset, args.seed)
+                results[f"{name}@{concurrency}"] = result
+                print(f"  {name:9} c={concurrency:<4} {result['throughput_rps']:9.1f} req/s  "
+                      f"p50={result['p50_ms']:8.2f}ms p95={result['p95_ms']:8.2f}ms p99={result['p99_ms']:8.2f}ms "
+                      f"errors={result['errors']}")
+    if async_engine is not None:
+        await async_engine.dispose()
+    return results
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def compare(current: dict, baseline: dict, threshold: float) -> int:
+    print(f"comparing with baseline from {baseline['meta'].get('timestamp')} ({baseline['meta'].get('revision')})")
+    regressions = 0
+    for key, result in current["results"].items():
+        base = baseline["results"].get(key)
+        if not base:
+            continue
+        p95_change = result["p95_ms"] / base["p95_ms"] - 1 if base["p95_ms"] else 0.0
+        rps_change = result["throughput_rps"] / base["throughput_rps"] - 1 if base["throughput_rps"] else 0.0
+        regressed = p95_change > threshold or rps_change < -threshold
+        regressions += regressed
+        print(f"  {'REGRESSED' if regressed else 'ok':9} {key:16} p95 {p95_change:+7.1%}  throughput {rps_change:+7.1%}")
+    return 1 if regressions else 0
+
+def run() -> int:
+    dataset = prepare()
+    results = asyncio.run(run_all(dataset))
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "revision": git_revision(),
+            "size": args.size,
+            "dataset": dataset,
+            "database": engine.url.get_backend_name(),
+            "async_engine": async_engine is not None,
+            "requests": args.requests,
+            "python": platform.python_version(),
+        },
+        "results": results,
+    }
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"saved baseline to {args.save}")
+    if args.compare:
+        with open(args.compare) as f:
+            return compare(report, json.load(f), args.threshold)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -0,0 +1,86 @@
+"""Product search benchmark.
+
+Builds a synthetic catalog (100k products by default) in a throwaway SQLite
+database, indexes it with both search backends and reports build time plus
+p50/p95/p99 query latency for exact, prefix, multi-word and misspelled queries.
+
+    python benchmarks/search_benchmark.py [--products 100000] [--queries 200]
+"""
+import sys
+import os
+import argparse
+import random
+import statistics
+import tempfile
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_tmpdir = tempfile.mkdtemp(prefix="search-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'search_bench.db')}"
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from core.database import Base, engine
+from models.database import Category, Product
+from services.search import FTS5SearchIndex, InvertedIndex
+from benchmarks.datasets import ADJECTIVES, CATEGORIES, MATERIALS, MODELS, percentile
+
+QUERIES = {
+    "exact": ["gazelle", "samba", "terrex", "predator"],
+    "prefix": ["ultra", "super", "solarg", "pure"],
+    "multi-word": ["waterproof terrex", "retro suede samba", "running responsive"],
+    "typo": ["ultrabost", "predatr", "breatheable", "supernvoa"],
+}
+
+def seed(count: int) -> None:
+    rng = random.Random(42)
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        db.execute(insert(Category), [{"name": name} for name in CATEGORIES])
+        batch = []
+        for i in range(count):
+            model = rng.choice(MODELS)
+            batch.append({
+                "name": f"{model} {rng.randint(1, 99)} {rng.choice(MATERIALS).title()}",
+                "description": f"{rng.choice(ADJECTIVES).title()} {rng.choice(ADJECTIVES)} shoe with "
+                               f"{rng.choice(MATERIALS)} upper and {rng.choice(MATERIALS)} outsole.",
+                "price": round(rng.uniform(40, 250), 2),
+                "category_id": rng.randint(1, len(CATEGORIES)),
+                "stock_quantity": rng.randint(0, 200),
+                "is_active": True,
+            })
+            if len(batch) == 5000:
+                db.execute(insert(Product), batch)
+                batch.clear()
+        if batch:
+            db.execute(insert(Product), batch)
+        db.commit()
+
+def bench(index, queries: int) -> None:
+    with Session(engine) as db:
+        start = time.perf_counter()
+        if isinstance(index, FTS5SearchIndex):
+            index.ensure(engine)
+        else:
+            index.rebuild(db)
+        print(f"{index.name}: build {time.perf_counter() - start:.2f}s")
+        for kind, terms in QUERIES.items():
+            timings, hits = [], 0
+            for i in range(queries):
+                query = terms[i % len(terms)]
+                t0 = time.perf_counter()
+                hits += len(index.search(db, query, limit=20))
+                timings.append((time.perf_counter() - t0) * 1000)
+            print(f"  {kind:10} p50={statistics.median(timings):7.2f}ms p95={percentile(timings, 95):7.2f}ms "
+                  f"p99={percentile(timings, 99):7.2f}ms avg_hits={hits / queries:.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+    start = time.perf_counter()
+    seed(args.products)
+    print(f"seeded {args.products} products in {time.perf_counter() - start:.2f}s")
+    bench(FTS5SearchIndex(), args.queries)
+    bench(InvertedIndex(), args.queries)
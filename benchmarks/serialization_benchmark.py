@@ -0,0 +1,93 @@
+"""Response serialization microbenchmark.
+
+Renders a 100-item product page (with category and variants) the way the
+product listing does and compares:
+
+* default:       FastAPI response_model validation + JSONResponse (stdlib json)
+* fast-class:    response_model validation + FastJSONResponse (orjson if installed)
+* snapshot-cold: pydantic dump_json straight from the cached snapshots
+* snapshot-warm: the bytes a cached SnapshotList already holds
+
+    python benchmarks/serialization_benchmark.py [--items 100] [--rounds 500]
+"""
+import sys
+import os
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from datetime import datetime, timezone
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from api.routes.products import router
+from core.responses import FastJSONResponse, SnapshotList, orjson, snapshot_json
+from models.schemas import Product
+
+def build_page(items: int) -> SnapshotList:
+    now = datetime.now(timezone.utc)
+    category = {"id": 1, "name": "Running", "description": "High-performance running shoes", "created_at": now}
+    sizes = ["7", "7.5", "8", "8.5", "9", "9.5", "10", "10.5", "11"]
+    colors = ["Black", "White", "Blue"]
+    return SnapshotList(
+        Product.model_validate({
+            "id": i, "name": f"Ultraboost {i}", "price": 190.0, "original_price": 220.0,
+            "description": "Incredible energy return with every step. " * 3,
+            "image_url": f"https://images.example.com/{i}.jpg", "category_id": 1,
+            "sizes": json.dumps(sizes), "colors": json.dumps(colors), "stock_quantity": 54,
+            "is_featured": i % 5 == 0, "is_active": True, "created_at": now, "updated_at": now,
+            "category": category,
+            "variants": [
+                {"id": i * 100 + n, "size": size, "color": color, "stock_quantity": 2}
+                for n, (size, color) in enumerate((s, c) for s in sizes for c in colors)
+            ],
+        })
+        for i in range(items)
+    )
+
+def listing_field():
+    route = next(r for r in router.routes if r.path == "/" and "GET" in r.methods)
+    return route.secure_cloned_response_field or route.response_field
+
+async def via_response_model(page, field, response_class) -> bytes:
+    content = await serialize_response(field=field, response_content=page)
+    return response_class(content).body
+
+def timed(fn, rounds: int):
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+def run(items: int, rounds: int) -> None:
+    page = build_page(items)
+    field = listing_field()
+    loop = asyncio.new_event_loop()
+    paths = {
+        "default": lambda: loop.run_until_complete(via_response_model(page, field, JSONResponse)),
+        "fast-class": lambda: loop.run_until_complete(via_response_model(page, field, FastJSONResponse)),
+        "snapshot-cold": lambda: snapshot_json(list(page), Product),
+        "snapshot-warm": lambda: snapshot_json(page, Product),
+    }
+    reference = json.loads(paths["default"]())
+    for name, fn in paths.items():
+        assert json.loads(fn()) == reference, f"{name} renders a different payload"
+    print(f"{items} items, {len(paths['default']())} bytes, orjson={'yes' if orjson else 'no'}")
+    baseline = None
+    for name, fn in paths.items():
+        samples = timed(fn, rounds)
+        median = statistics.median(samples)
+        baseline = baseline or median
+        print(f"  {name:14} p50={median:8.3f}ms mean={statistics.mean(samples):8.3f}ms speedup={baseline / median:6.1f}x")
+    loop.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=500)
+    args = parser.parse_args()
+    run(args.items, args.rounds)
@@ -0,0 +1,259 @@
+"""Per-client rate limiting and global admission control.
+
+RateLimitMiddleware gives every client a token bucket per rule: the default
+rule covers all requests, and route rules add tighter buckets for specific
+endpoints such as login. Clients are identified by the subject of a valid
+bearer token, otherwise by IP. Buckets live in a backend: in memory per
+process by default, or a shared one so every worker enforces the same limit.
+
+ConcurrencyLimitMiddleware caps the requests a process works on at once.
+Requests beyond the cap wait briefly for a slot; once the wait queue is full,
+or the wait runs out, they are shed with 503 instead of queueing until the
+client times out.
+
+Both reject with a Retry-After header.
+"""
+import asyncio
+import importlib
+import math
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import anyio
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+from app.config import settings
+from core.security import verify_token_subject
+
+_PERIODS = {"s": 1, "sec": 1, "second": 1, "m": 60, "min": 60, "minute": 60, "h": 3600, "hour": 3600}
+_RATE = re.compile(r"^\s*(\d+)\s*/\s*(\d*)\s*([a-z]+)\s*$")
+
+class Rate(NamedTuple):
+    """A bucket of capacity tokens refilled at per_second tokens a second."""
+    capacity: int
+    per_second: float
+
+def parse_rate(spec: str) -> Rate:
+    """Parse "20/s", "10/minute" or "100/5m" into a Rate."""
+    match = _RATE.match(spec.lower())
+    if match is None or match.group(3) not in _PERIODS:
+        raise ValueError(f"Invalid rate {spec!r}; expected e.g. 20/s, 10/m or 100/5m")
+    count, multiple, unit = int(match.group(1)), int(match.group(2) or 1), match.group(3)
+    return Rate(count, count / (multiple * _PERIODS[unit]))
+
+def parse_route_rates(spec: str) -> Dict[Tuple[str, str], Rate]:
+    """Parse "POST /api/auth/login=10/m, ..." into {(method, path): Rate}."""
+    rules = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        route, _, rate = entry.partition("=")
+        method, _, path = route.strip().partition(" ")
+        rules[(method.upper(), path.strip().rstrip("/") or "/")] = parse_rate(rate)
+    return rules
+
+def _refill(tokens: float, updated: float, now: float, rate: Rate, cost: float) -> Tuple[float, bool, float]:
+    """New token count, whether cost could be taken, and seconds until it could."""
+    tokens = min(rate.capacity, tokens + max(now - updated, 0) * rate.per_second)
+    if tokens >= cost:
+        return tokens - cost, True, 0.0
+    return tokens, False, (cost - tokens) / rate.per_second
+
+class MemoryBackend:
+    """Token buckets in this process, least recently used evicted beyond maxsize."""
+
+    def __init__(self, maxsize: int = 100000):
+        self.maxsize = maxsize
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def take(self, key: str, rate: Rate, cost: float = 1.0) -> Tuple[bool, float]:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (rate.capacity, now))
+            tokens, allowed, retry_after = _refill(tokens, updated, now, rate, cost)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.maxsize:
+                # An evicted bucket is full again, which only errs towards allowing
+                self._buckets.popitem(last=False)
+        return allowed, retry_after
+
+class SQLiteBackend:
+    """Token buckets in a SQLite file, shared by every worker process on the host."""
+
+    PRUNE_EVERY = 10000
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._calls = 0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit_buckets "
+                "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=wal")
+            # Losing a few buckets to a crash is harmless
+            conn.execute("PRAGMA synchronous=off")
+            self._local.conn = conn
+        return conn
+
+    def _take(self, key: str, rate: Rate, cost: float) -> Tuple[bool, float]:
+        conn = self._connect()
+        # Wall clock, since the buckets are shared between processes
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM rate_limit_buckets WHERE key = ?", (key,)).fetchone()
+            tokens, allowed, retry_after = _refill(*(row or (rate.capacity, now)), now, rate, cost)
+            conn.execute("INSERT OR REPLACE INTO rate_limit_buckets VALUES (?, ?, ?)", (key, tokens, now))
+            self._calls += 1
+            if self._calls % self.PRUNE_EVERY == 0:
+                # Idle for an hour means full for any rate the buckets are used with
+                conn.execute("DELETE FROM rate_limit_buckets WHERE updated < ?", (now - 3600,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed, retry_after
+
+    async def take(self, key: str, rate: Rate, cost: float = 1.0) -> Tuple[bool, float]:
+        return await anyio.to_thread.run_sync(self._take, key, rate, cost)
+
+def create_backend(spec: str):
+    """memory, sqlite:<path>, or module:callable returning an object with an async take(key, rate, cost)."""
+    if spec == "memory":
+        return MemoryBackend(settings.rate_limit_max_keys)
+    if spec.startswith("sqlite:"):
+        return SQLiteBackend(spec[len("sqlite:"):])
+    module, _, attr = spec.partition(":")
+    if not attr:
+        raise ValueError(f"Unknown rate limit backend {spec!r}")
+    return getattr(importlib.import_module(module), attr)()
+
+class AdmissionMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.rate_limited = 0
+        self.shed = 0
+        self.in_flight = 0
+        self.waiting = 0
+        self.peak_in_flight = 0
+
+    def count(self, field: str, delta: int = 1) -> None:
+        with self._lock:
+            setattr(self, field, getattr(self, field) + delta)
+            if field == "in_flight":
+                self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "rate_limited": self.rate_limited,
+                "shed": self.shed,
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "peak_in_flight": self.peak_in_flight,
+                "max_concurrent_requests": settings.max_concurrent_requests,
+                "max_waiting_requests": settings.max_waiting_requests,
+            }
+
+admission_metrics = AdmissionMetrics()
+
+async def _reject(scope: Scope, receive: Receive, send: Send, status_code: int, detail: str, retry_after: float):
+    response = JSONResponse(
+        {"detail": detail}, status_code=status_code, headers={"Retry-After": str(max(math.ceil(retry_after), 1))}
+    )
+    await response(scope, receive, send)
+
+def _exempt(path: str, prefixes: List[str]) -> bool:
+    return any(path == prefix.rstrip("/") or path.startswith(prefix) for prefix in prefixes)
+
+def _split_list(value: str) -> List[str]:
+    return [part.strip() for part in value.split(",") if part.strip()]
+
+class RateLimitMiddleware:
+    def __init__(self, app: ASGIApp, backend=None):
+        self.app = app
+        self.backend = backend if backend is not None else create_backend(settings.rate_limit_backend)
+        self.default_rate = parse_rate(settings.rate_limit_default)
+        self.route_rates = parse_route_rates(settings.rate_limit_routes)
+        self.exempt_paths = _split_list(settings.rate_limit_exempt_paths)
+
+    def client_key(self, scope: Scope) -> str:
+        headers = Headers(scope=scope)
+        scheme, _, token = headers.get("authorization", "").partition(" ")
+        if scheme.lower() == "bearer" and token:
+            subject = verify_token_subject(token)
+            if subject is not None:
+                return f"user:{subject}"
+        # Behind a proxy every connection comes from the proxy's address
+        client_ip = headers.get(settings.rate_limit_client_ip_header) if settings.rate_limit_client_ip_header else None
+        if client_ip:
+            return f"ip:{client_ip.strip()}"
+        forwarded = headers.get("x-forwarded-for") if settings.rate_limit_trust_forwarded_for else None
+        if forwarded:
+            return f"ip:{forwarded.split(',')[0].strip()}"
+        client = scope.get("client")
+        return f"ip:{client[0] if client else 'unknown'}"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or _exempt(scope["path"], self.exempt_paths):
+            await self.app(scope, receive, send)
+            return
+        client = self.client_key(scope)
+        rules = [("all", self.default_rate)]
+        route = (scope["method"], scope["path"].rstrip("/") or "/")
+        if route in self.route_rates:
+            rules.append((" ".join(route), self.route_rates[route]))
+        for name, rate in rules:
+            allowed, retry_after = await self.backend.take(f"{name}|{client}", rate)
+            if not allowed:
+                admission_metrics.count("rate_limited")
+                await _reject(scope, receive, send, 429, "Too many requests", retry_after)
+                return
+        await self.app(scope, receive, send)
+
+class ConcurrencyLimitMiddleware:
+    def __init__(self, app: ASGIApp, max_concurrent: Optional[int] = None, max_waiting: Optional[int] = None,
+                 wait_seconds: Optional[float] = None):
+        self.app = app
+        self.max_concurrent = max_concurrent or settings.max_concurrent_requests
+        self.max_waiting = settings.max_waiting_requests if max_waiting is None else max_waiting
+        self.wait_seconds = settings.admission_wait_seconds if wait_seconds is None else wait_seconds
+        self.exempt_paths = _split_list(settings.admission_exempt_paths)
+        self._slots = asyncio.Semaphore(self.max_concurrent)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or _exempt(scope["path"], self.exempt_paths):
+            await self.app(scope, receive, send)
+            return
+        if self._slots.locked():
+            if admission_metrics.waiting >= self.max_waiting:
+                admission_metrics.count("shed")
+                await _reject(scope, receive, send, 503, "Server busy, please retry", 1)
+                return
+            admission_metrics.count("waiting")
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.wait_seconds)
+            except asyncio.TimeoutError:
+                admission_metrics.count("shed")
+                await _reject(scope, receive, send, 503, "Server busy, please retry", 1)
+                return
+            finally:
+                admission_metrics.count("waiting", -1)
+        else:
+            await self._slots.acquire()
+        admission_metrics.count("in_flight")
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission_metrics.count("in_flight", -1)
+            self._slots.release()
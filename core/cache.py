@@ -0,0 +1,342 @@
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import pickle
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Set, Tuple
+from app.config import settings
+from core.cache_backends import create_backend
+
+logger = logging.getLogger("app.cache")
+
+_MISSING = object()
+
+class TTLCache:
+    """Thread-safe, size-bounded LRU cache with per-entry TTL and tag invalidation."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0, name: str = "cache"):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self._data: "OrderedDict[Hashable, Tuple[float, Any, frozenset]]" = OrderedDict()
+        self._tags: Dict[str, Set[Hashable]] = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            expires_at, value, _ = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, tags: Iterable[str] = (), ttl: Optional[float] = None) -> None:
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        tag_set = frozenset(tags)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (expires_at, value, tag_set)
+            for tag in tag_set:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._data) > self.maxsize:
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+                self.invalidations += 1
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        """Drop every entry carrying any of the given tags and return how many were dropped."""
+        dropped = 0
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    if key in self._data:
+                        self._remove(key)
+                        dropped += 1
+            self.invalidations += dropped
+        return dropped
+
+    def clear(self) -> None:
+        with self._lock:
+            self.invalidations += len(self._data)
+            self._data.clear()
+            self._tags.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+    def _remove(self, key: Hashable) -> None:
+        _, _, tags = self._data.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+class CacheBus:
+    """Connects this process to the CACHE_BACKEND store and carries broadcasts between workers.
+
+    The backend is opened on first use in each process, so workers forked after
+    import get their own connections and listener. After an error the store is
+    left alone for a few seconds and caches run on their local copies.
+    """
+
+    BACKOFF_SECONDS = 5.0
+
+    def __init__(self, spec: str):
+        self.spec = spec
+        # Tells this process's own broadcasts apart; they were applied before sending
+        self.origin = uuid.uuid4().hex
+        self._backend = None
+        self._pid: Optional[int] = None
+        self._handlers: Dict[str, Callable[[dict], None]] = {}
+        self._lock = threading.Lock()
+        self._down_until = 0.0
+        self.sent = 0
+        self.received = 0
+        self.errors = 0
+
+    @property
+    def backend(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._backend = create_backend(self.spec, settings.cache_bus_poll_interval_seconds)
+                    if self._backend is not None:
+                        self._backend.listen(self._deliver)
+                    self._pid = os.getpid()
+        if self._down_until and time.monotonic() < self._down_until:
+            return None
+        return self._backend
+
+    def start(self) -> None:
+        """Open the backend and start listening now rather than on first use."""
+        self.backend
+
+    def subscribe(self, channel: str, handler: Callable[[dict], None]) -> None:
+        """Call handler(message) for every message other processes publish on channel."""
+        self._handlers[channel] = handler
+
+    def publish(self, channel: str, message: dict) -> None:
+        backend = self.backend
+        if backend is None:
+            return
+        try:
+            backend.publish(json.dumps({"origin": self.origin, "channel": channel, **message}).encode())
+            self.sent += 1
+        except Exception:
+            self.failed("publish to")
+
+    def failed(self, action: str) -> None:
+        """Record a backend error; callers carry on with their local cache."""
+        self.errors += 1
+        self._down_until = time.monotonic() + self.BACKOFF_SECONDS
+        logger.warning("Cache backend %s: could not %s the shared store", self.spec, action, exc_info=True)
+
+    def _deliver(self, raw: bytes) -> None:
+        try:
+            message = json.loads(raw)
+            if message.pop("origin") == self.origin:
+                return
+            handler = self._handlers.get(message.pop("channel"))
+            if handler is not None:
+                self.received += 1
+                handler(message)
+        except Exception:
+            logger.exception("Could not apply cache message %r", raw[:200])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            # Without the password of a redis:// URL
+            "backend": re.sub(r"//[^@/]*@", "//", self.spec),
+            "messages_sent": self.sent,
+            "messages_received": self.received,
+            "errors": self.errors,
+            "available": time.monotonic() >= self._down_until,
+        }
+
+cache_bus = CacheBus(settings.cache_backend)
+
+# Shared entries are signed so only processes holding SECRET_KEY can produce
+# something this process will unpickle
+_SIGNING_KEY = hashlib.sha256(b"shared-cache:" + settings.secret_key.encode()).digest()
+_SIGNATURE_SIZE = hashlib.sha256().digest_size
+
+class UnsignedCacheEntry(ValueError):
+    """Shared cache data whose signature does not match; it is never decoded."""
+
+def _seal(key: str, value: Any) -> bytes:
+    payload = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    # The key is signed too, so a valid entry cannot be copied under another key
+    return hmac.new(_SIGNING_KEY, key.encode() + b"\0" + payload, hashlib.sha256).digest() + payload
+
+def _unseal(key: str, data: bytes) -> Any:
+    signature, payload = data[:_SIGNATURE_SIZE], data[_SIGNATURE_SIZE:]
+    expected = hmac.new(_SIGNING_KEY, key.encode() + b"\0" + payload, hashlib.sha256).digest()
+    if not hmac.compare_digest(signature, expected):
+        raise UnsignedCacheEntry(f"bad signature on shared cache entry {key!r}")
+    return pickle.loads(payload)
+
+class SharedCache:
+    """TTLCache interface for caches that every worker process must agree on.
+
+    Entries are kept in a local TTLCache in front of the CACHE_BACKEND store, so
+    a value one worker computed is reused by the others. Deletes, tag
+    invalidations and clears remove entries from the store and are broadcast, so
+    every worker also drops its local copy. With replicate=True values are not
+    stored but broadcast on set, for small entries every worker needs at once.
+    Values are pickled and signed with SECRET_KEY; data from the store or the
+    bus that fails the signature check is dropped without being unpickled.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0, name: str = "cache",
+                 bus: Optional[CacheBus] = None, replicate: bool = False):
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl, name=name)
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self.bus = bus or cache_bus
+        self.replicate = replicate
+        self.prefix = f"{settings.cache_namespace}:{name}:"
+        self.shared_hits = 0
+        self.shared_misses = 0
+        self.bus.subscribe(f"cache:{name}", self._apply)
+
+    def _store(self):
+        return None if self.replicate or self.maxsize <= 0 else self.bus.backend
+
+    def _tags(self, tags: Iterable[str]) -> list:
+        return [f"{self.prefix}tag:{tag}" for tag in tags]
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        # Keys travel between processes as their repr
+        key = repr(key)
+        value = self.local.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        store = self._store()
+        if store is None:
+            return default
+        try:
+            data = store.get(self.prefix + key)
+        except Exception:
+            self.bus.failed("read from")
+            return default
+        if data is None:
+            self.shared_misses += 1
+            return default
+        try:
+            value, tags, expires_at = _unseal(self.prefix + key, data)
+        except UnsignedCacheEntry:
+            logger.warning("Ignoring shared cache entry %s%s with a bad signature", self.prefix, key)
+            self.shared_misses += 1
+            return default
+        self.shared_hits += 1
+        self.local.set(key, value, tags, ttl=max(expires_at - time.time(), 0.0))
+        return value
+
+    def set(self, key: Hashable, value: Any, tags: Iterable[str] = (), ttl: Optional[float] = None) -> None:
+        key, tags = repr(key), list(tags)
+        ttl = self.ttl if ttl is None else ttl
+        self.local.set(key, value, tags, ttl)
+        if self.replicate:
+            data = base64.b64encode(_seal(self.prefix + key, value)).decode()
+            self.bus.publish(f"cache:{self.name}", {"op": "set", "key": key, "value": data, "tags": tags, "ttl": ttl})
+            return
+        store = self._store()
+        if store is None:
+            return
+        try:
+            data = _seal(self.prefix + key, (value, tags, time.time() + ttl))
+            store.set(self.prefix + key, data, ttl, self._tags(tags))
+        except Exception:
+            self.bus.failed("write to")
+
+    def delete(self, key: Hashable) -> None:
+        key = repr(key)
+        self.local.delete(key)
+        self._invalidate({"op": "delete", "keys": [key]}, lambda store: store.delete([self.prefix + key]))
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        """Drop every entry carrying any of the given tags here and in every worker; returns how many were local."""
+        tags = list(tags)
+        dropped = self.local.invalidate_tags(tags)
+        self._invalidate({"op": "tags", "tags": tags}, lambda store: store.invalidate_tags(self._tags(tags)))
+        return dropped
+
+    def clear(self) -> None:
+        self.local.clear()
+        self._invalidate({"op": "clear"}, lambda store: store.clear(self.prefix))
+
+    def _invalidate(self, message: dict, remove: Callable) -> None:
+        store = self._store()
+        if store is not None:
+            try:
+                remove(store)
+            except Exception:
+                self.bus.failed("invalidate in")
+        self.bus.publish(f"cache:{self.name}", message)
+
+    def _apply(self, message: dict) -> None:
+        op = message["op"]
+        if op == "delete":
+            for key in message["keys"]:
+                self.local.delete(key)
+        elif op == "tags":
+            self.local.invalidate_tags(message["tags"])
+        elif op == "clear":
+            self.local.clear()
+        elif op == "set":
+            value = _unseal(self.prefix + message["key"], base64.b64decode(message["value"]))
+            self.local.set(message["key"], value, message["tags"], message["ttl"])
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.local.stats()
+        stats["shared"] = {
+            "mode": "replicate" if self.replicate else "store",
+            "hits": self.shared_hits,
+            "misses": self.shared_misses,
+        }
+        return stats
@@ -0,0 +1,287 @@
+"""Stores shared by every worker process, behind core.cache.SharedCache.
+
+A backend keeps cache values as bytes under string keys with a TTL and tags,
+and carries broadcast messages between processes: SQLiteBackend through a
+local file (one machine), RedisBackend through any server speaking the Redis
+protocol (scripts/redis_standin.py is a local stand-in). Both are used from
+sync code and block briefly on I/O.
+"""
+import logging
+import socket
+import sqlite3
+import threading
+import time
+from typing import Callable, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+logger = logging.getLogger("app.cache")
+
+Listener = Callable[[bytes], None]
+
+class SQLiteBackend:
+    """Values and messages in a SQLite file; other processes pick messages up by polling."""
+
+    PURGE_EVERY = 1000
+    # Messages older than this are deleted; every listener has long since read them
+    MESSAGE_RETENTION_SECONDS = 60.0
+
+    def __init__(self, path: str, poll_interval: float = 0.1):
+        self.path = path
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        self._writes = 0
+        conn = self._connection()
+        conn.executescript(
+            "CREATE TABLE IF NOT EXISTS cache_entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS cache_tags (tag TEXT NOT NULL, key TEXT NOT NULL, PRIMARY KEY (tag, key));"
+            "CREATE INDEX IF NOT EXISTS ix_cache_tags_key ON cache_tags (key);"
+            "CREATE TABLE IF NOT EXISTS cache_messages (id INTEGER PRIMARY KEY AUTOINCREMENT, message BLOB NOT NULL, sent_at REAL NOT NULL);"
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=wal")
+            # Everything here can be rebuilt, so durability is not worth an fsync
+            conn.execute("PRAGMA synchronous=off")
+            self._local.conn = conn
+        return conn
+
+    def _write(self, statements: Iterable[Tuple[str, tuple]]) -> None:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for sql, params in statements:
+                conn.execute(sql, params)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get(self, key: str) -> Optional[bytes]:
+        row = self._connection().execute(
+            "SELECT value FROM cache_entries WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: bytes, ttl: float, tags: Iterable[str] = ()) -> None:
+        statements = [
+            ("INSERT OR REPLACE INTO cache_entries VALUES (?, ?, ?)", (key, value, time.time() + ttl)),
+            ("DELETE FROM cache_tags WHERE key = ?", (key,)),
+            *(("INSERT OR IGNORE INTO cache_tags VALUES (?, ?)", (tag, key)) for tag in tags),
+        ]
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            now = time.time()
+            statements += [
+                ("DELETE FROM cache_tags WHERE key IN (SELECT key FROM cache_entries WHERE expires_at <= ?)", (now,)),
+                ("DELETE FROM cache_entries WHERE expires_at <= ?", (now,)),
+                ("DELETE FROM cache_messages WHERE sent_at < ?", (now - self.MESSAGE_RETENTION_SECONDS,)),
+            ]
+        self._write(statements)
+
+    def delete(self, keys: List[str]) -> None:
+        self._write(
+            statement for key in keys for statement in (
+                ("DELETE FROM cache_entries WHERE key = ?", (key,)),
+                ("DELETE FROM cache_tags WHERE key = ?", (key,)),
+            )
+        )
+
+    def invalidate_tags(self, tags: List[str]) -> None:
+        self._write(
+            statement for tag in tags for statement in (
+                ("DELETE FROM cache_entries WHERE key IN (SELECT key FROM cache_tags WHERE tag = ?)", (tag,)),
+                ("DELETE FROM cache_tags WHERE key IN (SELECT key FROM cache_tags WHERE tag = ?)", (tag,)),
+            )
+        )
+
+    def clear(self, prefix: str) -> None:
+        pattern = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        self._write([
+            ("DELETE FROM cache_entries WHERE key LIKE ? ESCAPE '\\'", (pattern,)),
+            ("DELETE FROM cache_tags WHERE key LIKE ? ESCAPE '\\'", (pattern,)),
+        ])
+
+    def publish(self, message: bytes) -> None:
+        self._write([("INSERT INTO cache_messages (message, sent_at) VALUES (?, ?)", (message, time.time()))])
+
+    def listen(self, callback: Listener) -> None:
+        """Deliver messages published from now on to callback, on a daemon thread."""
+        conn = self._connection()
+        last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM cache_messages").fetchone()[0]
+
+        def poll():
+            nonlocal last_id
+            while True:
+                time.sleep(self.poll_interval)
+                try:
+                    rows = self._connection().execute(
+                        "SELECT id, message FROM cache_messages WHERE id > ? ORDER BY id", (last_id,)
+                    ).fetchall()
+                except sqlite3.Error:
+                    logger.exception("Polling cache messages failed")
+                    continue
+                for message_id, message in rows:
+                    last_id = message_id
+                    callback(message)
+
+        threading.Thread(target=poll, name="cache-listener", daemon=True).start()
+
+class RespError(Exception):
+    """An error reply from the server."""
+
+class RespConnection:
+    """A minimal blocking client for the Redis serialization protocol (RESP2)."""
+
+    def __init__(self, host: str, port: int, db: int = 0, password: Optional[str] = None, timeout: float = 2.0):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile("rb")
+        if password:
+            self.execute("AUTH", password)
+        if db:
+            self.execute("SELECT", db)
+
+    @staticmethod
+    def _encode(args) -> bytes:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(parts)
+
+    def read_reply(self):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest
+        if kind == b"-":
+            raise RespError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self.reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            length = int(rest)
+            return None if length < 0 else [self.read_reply() for _ in range(length)]
+        raise ConnectionError(f"Unexpected reply {line!r}")
+
+    def pipeline(self, *commands):
+        """Send commands in one write and return their replies in order."""
+        self.sock.sendall(b"".join(self._encode(command) for command in commands))
+        return [self.read_reply() for _ in commands]
+
+    def execute(self, *args):
+        return self.pipeline(args)[0]
+
+    def close(self) -> None:
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+class RedisBackend:
+    """Values in Redis (or anything speaking its protocol), messages over pub/sub."""
+
+    def __init__(self, url: str, channel: str = "cache"):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.password = parsed.password
+        self.channel = channel
+        self._local = threading.local()
+
+    def _connection(self) -> RespConnection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = RespConnection(self.host, self.port, self.db, self.password)
+        return conn
+
+    def _call(self, *commands):
+        try:
+            return self._connection().pipeline(*commands)
+        except (OSError, ConnectionError):
+            # Reconnect once, e.g. after the server restarted
+            self._local.conn.close()
+            self._local.conn = None
+            return self._connection().pipeline(*commands)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._call(("GET", key))[0]
+
+    def set(self, key: str, value: bytes, ttl: float, tags: Iterable[str] = ()) -> None:
+        ttl_ms = max(int(ttl * 1000), 1)
+        commands = [("SET", key, value, "PX", ttl_ms)]
+        for tag in tags:
+            # A tag is a set of keys that lives as long as the entries it may point at
+            commands += [("SADD", tag, key), ("PEXPIRE", tag, ttl_ms)]
+        self._call(*commands)
+
+    def delete(self, keys: List[str]) -> None:
+        if keys:
+            self._call(("DEL", *keys))
+
+    def invalidate_tags(self, tags: List[str]) -> None:
+        members = self._call(*(("SMEMBERS", tag) for tag in tags))
+        keys = {key for group in members for key in (group or ())}
+        self._call(("DEL", *keys, *tags))
+
+    def clear(self, prefix: str) -> None:
+        cursor = b"0"
+        while True:
+            cursor, keys = self._call(("SCAN", cursor, "MATCH", prefix + "*", "COUNT", 1000))[0]
+            if keys:
+                self._call(("DEL", *keys))
+            if cursor in (b"0", 0):
+                break
+
+    def publish(self, message: bytes) -> None:
+        self._call(("PUBLISH", self.channel, message))
+
+    def listen(self, callback: Listener) -> None:
+        """Deliver messages published from now on to callback, on a daemon thread that reconnects on errors."""
+        subscribed = threading.Event()
+
+        def subscribe():
+            delay = 0.1
+            while True:
+                conn = None
+                try:
+                    conn = RespConnection(self.host, self.port, self.db, self.password, timeout=None)
+                    conn.execute("SUBSCRIBE", self.channel)
+                    subscribed.set()
+                    delay = 0.1
+                    while True:
+                        kind, _, message = conn.read_reply()
+                        if kind == b"message":
+                            callback(message)
+                except Exception:
+                    logger.exception("Cache subscription to %s:%s lost, reconnecting", self.host, self.port)
+                    time.sleep(delay)
+                    delay = min(delay * 2, 5.0)
+                finally:
+                    if conn is not None:
+                        conn.close()
+
+        threading.Thread(target=subscribe, name="cache-listener", daemon=True).start()
+        # Messages published before the subscription is active would be missed
+        subscribed.wait(2.0)
+
+def create_backend(spec: str, poll_interval: float = 0.1):
+    """None for local, or the backend named by sqlite:<path> or redis://host:port/db."""
+    if spec == "local":
+        return None
+    if spec.startswith("sqlite:"):
+        return SQLiteBackend(spec[len("sqlite:"):], poll_interval=poll_interval)
+    if spec.startswith("redis://"):
+        return RedisBackend(spec)
+    raise ValueError(f"Unknown cache backend {spec!r}; expected local, sqlite:<path> or redis://host:port/db")
@@ -0,0 +1,211 @@
+"""Response compression.
+
+CompressionMiddleware gzip/brotli-encodes API responses above a size threshold
+according to the client's Accept-Encoding. PrecompressedStaticFiles serves the
+.br/.gz siblings written by scripts/precompress_static.py instead of compressing
+static assets on every request.
+"""
+import gzip
+import stat
+import threading
+import zlib
+from typing import Dict, List, Optional, Pattern, Sequence
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.staticfiles import StaticFiles
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.config import settings
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+SUPPORTED_ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+COMPRESSIBLE_TYPES = (
+    "text/", "application/json", "application/javascript", "application/x-ndjson",
+    "application/xml", "image/svg+xml",
+)
+
+def accepted_encodings(header: str, supported: Sequence[str]) -> List[str]:
+    """Encodings from supported that an Accept-Encoding header allows, best first."""
+    qualities: Dict[str, float] = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[name.strip().lower()] = quality
+    wildcard = qualities.get("*", 0.0)
+    available = [name for name in supported if qualities.get(name, wildcard) > 0]
+    # Ties keep the order of supported, otherwise the client's weights win
+    return sorted(available, key=lambda name: -qualities.get(name, wildcard))
+
+class CompressionMetrics:
+    """Per-encoding response and byte counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    def record(self, encoding: str, original: int, compressed: int) -> None:
+        with self._lock:
+            counters = self._counters.setdefault(encoding, {"responses": 0, "bytes_in": 0, "bytes_out": 0})
+            counters["responses"] += 1
+            counters["bytes_in"] += original
+            counters["bytes_out"] += compressed
+
+    def snapshot(self) -> Dict[str, Dict[str, object]]:
+        with self._lock:
+            counters = {encoding: dict(values) for encoding, values in self._counters.items()}
+        for values in counters.values():
+            values["bytes_saved"] = values["bytes_in"] - values["bytes_out"]
+            values["ratio"] = round(values["bytes_out"] / values["bytes_in"], 4) if values["bytes_in"] else None
+        return counters
+
+compression_metrics = CompressionMetrics()
+
+class _Compressor:
+    """Incremental encoder; flush() keeps streamed chunks decodable as they arrive."""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=settings.compression_brotli_quality)
+        else:
+            self._zlib = zlib.compressobj(settings.compression_gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(data) + (self._brotli.finish() if final else self._brotli.flush())
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=settings.compression_brotli_quality)
+    return gzip.compress(data, compresslevel=settings.compression_gzip_level, mtime=0)
+
+class CompressionMiddleware:
+    """Compress responses of compressible types once they reach compression_min_size bytes."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encodings = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""), SUPPORTED_ENCODINGS)
+        if not encodings:
+            await self.app(scope, receive, send)
+            return
+        await _CompressedResponder(self.app, encodings[0])(scope, receive, send)
+
+class _CompressedResponder:
+    def __init__(self, app: ASGIApp, encoding: str):
+        self.app = app
+        self.encoding = encoding
+        self.send = None
+        self.start_message: Optional[Message] = None
+        self.compressor: Optional[_Compressor] = None
+        self.passthrough = False
+        self.original = 0
+        self.compressed = 0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            content_type = headers.get("content-type", "")
+            self.passthrough = (
+                "content-encoding" in headers
+                or not content_type.startswith(COMPRESSIBLE_TYPES)
+            )
+            # Hold the start message until the first body chunk shows how large the body is
+            self.start_message = message
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.start_message is not None:
+            start, self.start_message = self.start_message, None
+            if self.passthrough or (not more_body and (not body or len(body) < settings.compression_min_size)):
+                self.passthrough = True
+                await self.send(start)
+                await self.send(message)
+                return
+            self.compressor = _Compressor(self.encoding)
+            headers = MutableHeaders(raw=start["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                # The encoded bytes differ from the identity representation
+                headers["ETag"] = f"W/{etag}"
+            if more_body:
+                del headers["content-length"]
+            else:
+                data = compress(body, self.encoding)
+                headers["Content-Length"] = str(len(data))
+                compression_metrics.record(self.encoding, len(body), len(data))
+                await self.send(start)
+                await self.send({"type": "http.response.body", "body": data})
+                return
+            await self.send(start)
+        elif self.passthrough:
+            await self.send(message)
+            return
+
+        data = self.compressor.compress(body, final=not more_body)
+        self.original += len(body)
+        self.compressed += len(data)
+        if not more_body:
+            compression_metrics.record(self.encoding, self.original, self.compressed)
+        await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that serves a file's .br/.gz sibling when the client accepts it.
+
+    Paths matching immutable_paths are content-addressed and get a year-long
+    immutable Cache-Control.
+    """
+
+    SUFFIXES = {"br": ".br", "gzip": ".gz"}
+    IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+    def __init__(self, *args, immutable_paths: Optional[Pattern] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.immutable_paths = immutable_paths
+
+    async def get_response(self, path: str, scope: Scope):
+        response = await self._get_response(path, scope)
+        if self.immutable_paths is not None and response.status_code < 400 and self.immutable_paths.match(path):
+            response.headers["Cache-Control"] = self.IMMUTABLE_CACHE_CONTROL
+        return response
+
+    async def _get_response(self, path: str, scope: Scope):
+        if scope["method"] in ("GET", "HEAD"):
+            # Serving a precompressed file needs no encoder, so brotli is offered either way
+            accept = Headers(scope=scope).get("accept-encoding", "")
+            for encoding in accepted_encodings(accept, tuple(self.SUFFIXES)):
+                full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + self.SUFFIXES[encoding])
+                if stat_result and stat.S_ISREG(stat_result.st_mode):
+                    response = self.file_response(full_path, stat_result, scope)
+                    response.headers["Content-Encoding"] = encoding
+                    response.headers.add_vary_header("Accept-Encoding")
+                    return response
+        response = await super().get_response(path, scope)
+        # Other clients may get a precompressed variant, so caches must key on Accept-Encoding
+        response.headers.add_vary_header("Accept-Encoding")
+        return response
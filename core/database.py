@@ -1,24 +1,390 @@
-from sqlalchemy import create_engine
+import asyncio
+import contextvars
+import functools
+import itertools
+import logging
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Hashable, List, Optional, Union
+from sqlalchemy import create_engine, event, exc as sa_exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from starlette.concurrency import run_in_threadpool
 from app.config import settings
+from core.cache import SharedCache
+from core.metrics import Histogram
+
+# Async drivers and the sync driver used for the same database by scripts and
+# create_all(). An async driver in DATABASE_URL switches request handling to
+# AsyncEngine/AsyncSession, e.g. sqlite+aiosqlite:///./adidas_store.db
+_SYNC_DRIVERS = {
+    "sqlite+aiosqlite": "sqlite",
+    "postgresql+asyncpg": "postgresql",
+}
+
+def _split_driver(url: str):
+    scheme, _, rest = url.partition("://")
+    return scheme, rest
+
+def is_async_url(url: str) -> bool:
+    return _split_driver(url)[0] in _SYNC_DRIVERS
+
+def sync_url(url: str) -> str:
+    scheme, rest = _split_driver(url)
+    return f"{_SYNC_DRIVERS.get(scheme, scheme)}://{rest}"
+
+database_is_async = is_async_url(settings.database_url)
+
+class PoolMetrics:
+    """Checkout wait times and timeouts for one engine's connection pool."""
+
+    def __init__(self):
+        self.wait_seconds = Histogram()
+        self.timeouts = 0
+
+class _InstrumentedPoolMixin:
+    """Times how long each checkout waits for a pooled connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except sa_exc.TimeoutError:
+            self.metrics.timeouts += 1
+            raise
+        finally:
+            self.metrics.wait_seconds.observe(time.perf_counter() - start)
+
+    def recreate(self):
+        # engine.dispose() swaps in a fresh pool; keep the history
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    pass
+
+class InstrumentedAsyncQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+def _is_sqlite_memory(url: str) -> bool:
+    return url.startswith("sqlite") and (":memory:" in url or url.rstrip("/").endswith(":"))
+
+def engine_options(url: str, async_driver: bool = False) -> dict:
+    """create_engine()/create_async_engine() keyword arguments built from Settings."""
+    options = {}
+    if "sqlite" in url and not async_driver:
+        options["connect_args"] = {"check_same_thread": False}
+    if _is_sqlite_memory(url):
+        # In-memory SQLite keeps its own single-connection pool
+        return options
+    options.update(
+        poolclass=InstrumentedAsyncQueuePool if async_driver else InstrumentedQueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pool_pre_ping,
+    )
+    return options
+
+def _tune_sqlite(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA journal_mode={settings.sqlite_journal_mode}")
+        cursor.execute(f"PRAGMA synchronous={settings.sqlite_synchronous}")
+        cursor.execute(f"PRAGMA cache_size={int(settings.sqlite_cache_size)}")
+        cursor.execute(f"PRAGMA mmap_size={int(settings.sqlite_mmap_size)}")
+    finally:
+        cursor.close()
+
+def _query_only(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA query_only=1")
+    finally:
+        cursor.close()
+
+replica_urls: List[str] = [url.strip() for url in settings.database_replica_urls.split(",") if url.strip()]
+
+# Keys (a read scope, or "user:<id>") whose reads stay on the primary until the replicas have caught up
+# Replicated to every worker, since the next request may land on any of them
+_primary_pins = SharedCache(maxsize=100000, ttl=settings.replica_lag_seconds, name="primary-pins", replicate=True)
+_read_scope: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("read_scope", default=None)
+_principal: contextvars.ContextVar[Optional[Hashable]] = contextvars.ContextVar("principal", default=None)
+_replica_turn = itertools.count()
+# read_only() statements by where they were sent
+routed_reads = {"primary": 0, "replica": 0}
+
+def read_only(scope: str):
+    """Mark a sync service method as safe to run on a read replica.
+
+    Reads in scope go to a replica unless the session has already written in
+    this transaction, the scope was pinned by pin_primary(), or the current
+    principal committed a write within REPLICA_LAG_SECONDS.
+    """
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            token = _read_scope.set(scope)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _read_scope.reset(token)
+        return wrapper
+    return decorate
+
+def pin_primary(scope: str) -> None:
+    """Keep reads in scope on the primary for REPLICA_LAG_SECONDS, e.g. after a write the replicas may not have yet."""
+    if replica_urls:
+        _primary_pins.set(scope, True)
+
+def read_from_replica(db: Session) -> bool:
+    """Whether db has sent any reads to a replica, whose data may be up to REPLICA_LAG_SECONDS old."""
+    return getattr(db, "_replica", None) is not None
+
+def set_principal(principal: Hashable) -> None:
+    """Identify who the current request acts for, so their reads follow their own writes."""
+    _principal.set(principal)
+
+class RoutingSession(Session):
+    """Session that sends read_only() reads to a replica and everything else to the primary."""
+
+    def __init__(self, *args, replicas: List[Engine] = (), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replicas = list(replicas)
+        self._replica: Optional[Engine] = None
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if not self.replicas:
+            return super().get_bind(mapper, clause=clause, **kwargs)
+        if self._flushing or getattr(clause, "is_dml", False):
+            self.info["wrote"] = True
+        else:
+            scope = _read_scope.get()
+            if scope is not None:
+                principal = _principal.get()
+                if (
+                    self.info.get("wrote")
+                    or _primary_pins.get(scope)
+                    or (principal is not None and _primary_pins.get(f"user:{principal}"))
+                ):
+                    routed_reads["primary"] += 1
+                else:
+                    routed_reads["replica"] += 1
+                    if self._replica is None:
+                        # One replica per session, so its reads see a single point in time
+                        self._replica = self.replicas[next(_replica_turn) % len(self.replicas)]
+                    return self._replica
+        return super().get_bind(mapper, clause=clause, **kwargs)
+
+@event.listens_for(RoutingSession, "after_commit")
+def _pin_writer(session):
+    if session.info.pop("wrote", False):
+        principal = _principal.get()
+        if principal is not None:
+            _primary_pins.set(f"user:{principal}", True)
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _forget_write(session):
+    session.info.pop("wrote", None)
 
 # Create SQLAlchemy engine
-engine = create_engine(
-    settings.database_url,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.database_url else {}
-)
+engine = create_engine(sync_url(settings.database_url), **engine_options(settings.database_url))
+replica_engines = [create_engine(sync_url(url), **engine_options(url)) for url in replica_urls]
 
 # Create SessionLocal class
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, bind=engine, class_=RoutingSession, replicas=replica_engines
+)
+
+async_engine: Optional[AsyncEngine] = None
+async_replica_engines: List[AsyncEngine] = []
+AsyncSessionLocal: Optional[async_sessionmaker] = None
+if database_is_async:
+    async_engine = create_async_engine(
+        settings.database_url,
+        **engine_options(settings.database_url, async_driver=True)
+    )
+    async_replica_engines = [
+        create_async_engine(url, **engine_options(url, async_driver=True)) for url in replica_urls
+    ]
+    # Objects outlive the commit that produced them and are serialized after the
+    # session's greenlet has returned, so they must not expire.
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine, autoflush=False, expire_on_commit=False, sync_session_class=RoutingSession,
+        replicas=[replica.sync_engine for replica in async_replica_engines],
+    )
+
+if settings.database_url.startswith("sqlite"):
+    _replica_binds = [*replica_engines, *(replica.sync_engine for replica in async_replica_engines)]
+    for bind in [engine, *([async_engine.sync_engine] if async_engine is not None else []), *_replica_binds]:
+        event.listen(bind, "connect", _tune_sqlite)
+    # Replicas are only ever written by replication
+    for bind in _replica_binds:
+        event.listen(bind, "connect", _query_only)
+
+# Session type handed to route handlers by get_db
+DBSession = Union[Session, AsyncSession]
 
 # Create Base class for models
 Base = declarative_base()
 
+def pool_capacity(bind: Engine) -> Optional[int]:
+    """Most connections the engine's pool hands out at once, or None if unbounded."""
+    pool = bind.pool
+    if isinstance(pool, QueuePool) and pool._max_overflow >= 0:
+        return pool.size() + pool._max_overflow
+    return None
+
 # Dependency to get database session
-def get_db():
-    db = SessionLocal()
+if database_is_async:
+    async def get_db():
+        async with AsyncSessionLocal() as db:
+            yield db
+else:
+    # Sync sessions run their queries on threadpool workers and keep their
+    # connection between calls. Admitting no more sessions than the pool can
+    # serve keeps every worker from blocking on a connection held by a request
+    # that is itself waiting for a free worker.
+    _capacity = pool_capacity(engine)
+    _session_slots = asyncio.Semaphore(_capacity) if _capacity else nullcontext()
+
+    async def get_db():
+        async with _session_slots:
+            db = SessionLocal()
+            try:
+                yield db
+            finally:
+                await run_in_threadpool(db.close)
+
+async def run_db(db: DBSession, fn: Callable, *args, **kwargs):
+    """Run sync ORM code, fn(session, *args, **kwargs), without blocking the event loop.
+
+    On an AsyncSession the callable runs through run_sync() on the async driver;
+    on a sync Session it is moved to the threadpool.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(functools.partial(fn, db, *args, **kwargs))
+
+def pool_status(bind: Optional[Engine] = None) -> dict:
+    """Live pool occupancy plus checkout wait telemetry for an engine."""
+    bind = bind if bind is not None else request_engine()
+    pool = bind.pool
+    status = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+            max_overflow=pool._max_overflow,
+            timeout_seconds=pool.timeout(),
+        )
+    metrics = getattr(pool, "metrics", None)
+    if metrics is not None:
+        status.update(timeouts=metrics.timeouts, checkout_wait_seconds=metrics.wait_seconds.snapshot())
+    return status
+
+def replica_status() -> dict:
+    """Configured replicas, how read_only() statements were routed, and each replica's pool."""
+    binds = [replica.sync_engine for replica in async_replica_engines] if database_is_async else replica_engines
+    return {
+        "replicas": len(binds),
+        "lag_window_seconds": settings.replica_lag_seconds,
+        "routed_statements": dict(routed_reads),
+        "pools": [pool_status(bind) for bind in binds],
+    }
+
+def request_engine() -> Engine:
+    """The engine request sessions execute on (the sync core of the async engine if enabled)."""
+    return async_engine.sync_engine if async_engine is not None else engine
+
+class QueryCounter:
+    """Collects the SQL statements executed while a count_queries() block is active."""
+
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+@contextmanager
+def count_queries(bind=None):
+    """Count statements sent to the database, e.g. to catch N+1 query regressions."""
+    bind = bind if bind is not None else request_engine()
+    counter = QueryCounter()
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        counter.statements.append(statement)
+
+    event.listen(bind, "before_cursor_execute", _record)
     try:
-        yield db
+        yield counter
     finally:
-        db.close()
\ No newline at end of file
+        event.remove(bind, "before_cursor_execute", _record)
+
+slow_query_logger = logging.getLogger("app.slow_queries")
+
+# Every statement's execution time, across all engines
+query_seconds = Histogram()
+
+class QueryStats:
+    """Statements and database time attributed to one request."""
+
+    __slots__ = ("count", "seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+_query_stats: contextvars.ContextVar[Optional[QueryStats]] = contextvars.ContextVar("query_stats", default=None)
+
+def track_queries() -> QueryStats:
+    """Attribute statements run from the current context (and its threadpool calls) to a fresh QueryStats."""
+    stats = QueryStats()
+    _query_stats.set(stats)
+    return stats
+
+def _truncate(value, limit: int = 500) -> str:
+    text = repr(value)
+    return text if len(text) <= limit else text[:limit] + "..."
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _record_query_time(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("query_started")
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    query_seconds.observe(elapsed)
+    stats = _query_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += elapsed
+    if settings.slow_query_threshold_ms >= 0 and elapsed * 1000 >= settings.slow_query_threshold_ms:
+        slow_query_logger.warning(
+            "slow query (%.1f ms): %s | parameters: %s",
+            elapsed * 1000,
+            " ".join(statement.split()),
+            _truncate(parameters) if settings.slow_query_log_parameters else "<hidden>",
+        )
+
+@event.listens_for(Engine, "handle_error")
+def _discard_query_timer(exception_context):
+    # after_cursor_execute never fires for failed statements
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_started"):
+        conn.info["query_started"].pop()
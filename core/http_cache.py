@@ -0,0 +1,82 @@
+import hashlib
+import json
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional, Sequence
+from fastapi import Request, Response, status
+from app.config import settings
+from models.schemas import Product as ProductSchema
+
+# Part of every product ETag, so a release that changes the payload's shape
+# does not match ETags sent by the previous one; the same in every worker
+_PAYLOAD_EPOCH = hashlib.sha1(
+    json.dumps(ProductSchema.model_json_schema(), sort_keys=True).encode()
+).hexdigest()
+
+def _changed_at(product) -> Optional[datetime]:
+    return product.updated_at or product.created_at
+
+def product_etag(products: Sequence) -> str:
+    """Strong ETag for product snapshots from their ids and updated_at.
+
+    Every write to a product's payload stamps updated_at, so the ETag is the
+    same in every worker and survives restarts.
+    """
+    digest = hashlib.sha1(_PAYLOAD_EPOCH.encode())
+    for product in products:
+        changed_at = _changed_at(product)
+        digest.update(f"{product.id}:{changed_at.isoformat() if changed_at else ''};".encode())
+    return f'"{digest.hexdigest()}"'
+
+def content_etag(payload) -> str:
+    """Strong ETag for small payloads that are cheap to hash directly."""
+    return f'"{hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()}"'
+
+def last_modified(products: Sequence) -> Optional[datetime]:
+    stamps = [stamp for stamp in map(_changed_at, products) if stamp is not None]
+    if not stamps:
+        return None
+    # SQLite hands back naive timestamps; they are stored in UTC
+    return max(stamp if stamp.tzinfo else stamp.replace(tzinfo=timezone.utc) for stamp in stamps)
+
+def cache_control() -> str:
+    if settings.catalog_http_max_age <= 0:
+        return "no-cache"
+    value = f"public, max-age={settings.catalog_http_max_age}"
+    if settings.catalog_http_stale_while_revalidate > 0:
+        value += f", stale-while-revalidate={settings.catalog_http_stale_while_revalidate}"
+    return value
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in header.split(","))
+
+def _not_modified_since(header: str, modified: datetime) -> bool:
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return modified.replace(microsecond=0) <= since
+
+def conditional_response(
+    request: Request, response: Response, etag: str, modified: Optional[datetime] = None
+) -> Optional[Response]:
+    """Attach validators and Cache-Control; return a 304 when the client's copy is still current."""
+    headers = {"ETag": etag, "Cache-Control": cache_control()}
+    if modified is not None:
+        headers["Last-Modified"] = format_datetime(modified, usegmt=True)
+    response.headers.update(headers)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        fresh = _etag_matches(if_none_match, etag)
+    else:
+        if_modified_since = request.headers.get("if-modified-since")
+        fresh = bool(if_modified_since and modified is not None and _not_modified_since(if_modified_since, modified))
+    if fresh:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return None
@@ -0,0 +1,49 @@
+import json
+from functools import lru_cache
+from typing import Any, List, Optional
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib encoder
+    orjson = None
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when it is installed."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+class SnapshotList(list):
+    """A list of cached response snapshots that remembers its own JSON encoding."""
+
+    __slots__ = ("json",)
+
+    def __init__(self, items=()):
+        super().__init__(items)
+        self.json: Optional[bytes] = None
+
+@lru_cache(maxsize=None)
+def _list_adapter(schema) -> TypeAdapter:
+    return TypeAdapter(List[schema])
+
+def snapshot_json(items: list, schema) -> bytes:
+    """Encode snapshots with pydantic's serializer, reusing the bytes a SnapshotList already holds."""
+    body = getattr(items, "json", None)
+    if body is None:
+        body = _list_adapter(schema).dump_json(items)
+        if isinstance(items, SnapshotList):
+            items.json = body
+    return body
+
+def snapshot_response(items: list, schema, response: Response) -> Response:
+    """Send pre-serialized snapshots, skipping response_model validation; keeps headers set on response."""
+    headers = {key: value for key, value in response.headers.items() if key != "content-length"}
+    return Response(content=snapshot_json(items, schema), media_type="application/json", headers=headers)
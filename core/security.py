@@ -1,21 +1,55 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import event, inspect
 from sqlalchemy.orm import Session
 from app.config import settings
-from core.database import get_db
-from models.schemas import TokenData
+from core.cache import SharedCache, TTLCache
+from core.database import DBSession, get_db, run_db, set_principal
+from models.schemas import TokenData, User as UserSchema
 import models.database as db_models
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing. Hashes whose cost differs from bcrypt_rounds are flagged
+# by verify_and_update() so they can be rehashed on the next login.
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.bcrypt_rounds)
 
 # JWT token scheme
 security = HTTPBearer()
 
+# Authenticated principals keyed by token subject (email), and verified tokens
+# mapped to their subject so repeat requests skip both the DB and the signature check.
+# Principals are shared between workers so a user change reaches all of them; the
+# token mapping never goes stale and is cheaper to rebuild than to fetch.
+principal_cache = SharedCache(
+    maxsize=settings.principal_cache_size,
+    ttl=settings.principal_cache_ttl_seconds,
+    name="principal",
+)
+token_cache = TTLCache(
+    maxsize=settings.principal_cache_size,
+    ttl=settings.principal_cache_ttl_seconds,
+    name="token",
+)
+
+def invalidate_principal(email: str) -> None:
+    """Forget the cached principal for a user, e.g. after it is changed outside the ORM."""
+    principal_cache.delete(email)
+
+@event.listens_for(db_models.User, "after_update")
+@event.listens_for(db_models.User, "after_delete")
+def _invalidate_changed_user(mapper, connection, target):
+    invalidate_principal(target.email)
+    old_emails = inspect(target).attrs.email.history.deleted
+    for email in old_emails or ():
+        invalidate_principal(email)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
     return pwd_context.verify(plain_password, hashed_password)
@@ -24,6 +58,69 @@ def get_password_hash(password: str) -> str:
     """Hash a password."""
     return pwd_context.hash(password)
 
+class PasswordHasher:
+    """Runs bcrypt on a bounded worker pool so hashing never blocks the event loop.
+
+    bcrypt releases the GIL, so a small thread pool gives real parallelism.
+    Once max_pending jobs are queued or running, new requests are rejected
+    with 503 instead of piling up behind a login burst.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hasher")
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.peak_pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    async def run(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Authentication service busy, please retry",
+                    headers={"Retry-After": "1"},
+                )
+            self.pending += 1
+            self.peak_pending = max(self.peak_pending, self.pending)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "queue_depth": max(self.pending - self.workers, 0),
+                "in_flight": self.pending,
+                "peak_in_flight": self.peak_pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "bcrypt_rounds": settings.bcrypt_rounds,
+            }
+
+password_hasher = PasswordHasher(settings.password_hash_workers, settings.password_hash_max_pending)
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password on the password hasher pool."""
+    return await password_hasher.run(pwd_context.hash, password)
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password on the hasher pool.
+
+    Returns (verified, new_hash); new_hash is set when the stored hash uses a
+    different bcrypt cost than configured and should replace it.
+    """
+    return await password_hasher.run(pwd_context.verify_and_update, plain_password, hashed_password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a JWT access token."""
     to_encode = data.copy()
@@ -36,10 +133,32 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
     return encoded_jwt
 
+def verify_token_subject(token: str) -> Optional[str]:
+    """Return the subject of a valid token, memoizing verified signatures until expiry."""
+    if settings.token_cache_enabled:
+        email = token_cache.get(token)
+        if email is not None:
+            return email
+    
+    try:
+        payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+    except JWTError:
+        return None
+    email = payload.get("sub")
+    if email is not None and settings.token_cache_enabled:
+        exp = payload.get("exp")
+        ttl = min(settings.principal_cache_ttl_seconds, exp - time.time()) if exp else None
+        if ttl is None or ttl > 0:
+            token_cache.set(token, email, ttl=ttl)
+    return email
+
+def _get_user_by_email(db: Session, email: str) -> Optional[db_models.User]:
+    return db.query(db_models.User).filter(db_models.User.email == email).first()
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-):
+    db: DBSession = Depends(get_db)
+) -> UserSchema:
     """Get current authenticated user."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -47,22 +166,33 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    try:
-        payload = jwt.decode(credentials.credentials, settings.secret_key, algorithms=[settings.algorithm])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-        token_data = TokenData(email=email)
-    except JWTError:
+    email = verify_token_subject(credentials.credentials)
+    if email is None:
         raise credentials_exception
+    token_data = TokenData(email=email)
     
-    user = db.query(db_models.User).filter(db_models.User.email == token_data.email).first()
+    user = principal_cache.get(token_data.email)
     if user is None:
-        raise credentials_exception
+        db_user = await run_db(db, _get_user_by_email, token_data.email)
+        if db_user is None:
+            raise credentials_exception
+        user = UserSchema.model_validate(db_user)
+        principal_cache.set(token_data.email, user)
+    # Reads after this user's own writes go to the primary
+    set_principal(user.id)
     return user
 
-async def get_current_active_user(current_user: db_models.User = Depends(get_current_user)):
+async def get_current_active_user(current_user: UserSchema = Depends(get_current_user)) -> UserSchema:
     """Get current active user."""
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
-    return current_user
\ No newline at end of file
+    return current_user
+
+async def get_current_admin_user(current_user: UserSchema = Depends(get_current_active_user)) -> UserSchema:
+    """Get current active user, requiring admin permissions."""
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    return current_user
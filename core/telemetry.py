@@ -0,0 +1,170 @@
+"""Request timing and Prometheus exposition.
+
+TimingMiddleware times every HTTP request, attributes SQL statements and
+database time to it (see core.database.track_queries), records per-route
+histograms and adds a Server-Timing header. render_prometheus() renders these
+together with the pool, cache and compression counters in the Prometheus text
+format for the /metrics endpoint.
+"""
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+from starlette.datastructures import MutableHeaders
+from starlette.routing import Mount
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from core.admission import admission_metrics
+from core.compression import compression_metrics
+from core.database import pool_status, query_seconds, track_queries
+from core.metrics import Histogram
+from services.business import ProductService
+
+class RouteMetrics:
+    """Latency histograms and query totals per (method, route template)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.db_seconds: Dict[Tuple[str, str], Histogram] = {}
+        self.queries: Dict[Tuple[str, str], int] = {}
+        self.responses: Dict[Tuple[str, str, str], int] = {}
+
+    def observe(self, method: str, route: str, status: int, seconds: float, queries: int, db_seconds: float) -> None:
+        key = (method, route)
+        with self._lock:
+            if key not in self.latency:
+                self.latency[key] = Histogram()
+                self.db_seconds[key] = Histogram()
+                self.queries[key] = 0
+            self.queries[key] += queries
+            status_key = (method, route, str(status))
+            self.responses[status_key] = self.responses.get(status_key, 0) + 1
+        self.latency[key].observe(seconds)
+        self.db_seconds[key].observe(db_seconds)
+
+route_metrics = RouteMetrics()
+
+_route_templates: Dict[Any, str] = {}
+
+def _route_template(scope: Scope) -> str:
+    """The matched route's path template, so /api/products/42 is reported as /api/products/{product_id}."""
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        # Unmatched paths share one label to keep the series count bounded
+        return "unmatched"
+    if endpoint not in _route_templates:
+        for route in getattr(scope.get("app"), "routes", ()):
+            target = route.app if isinstance(route, Mount) else getattr(route, "endpoint", None)
+            if target is not None:
+                _route_templates.setdefault(target, route.path)
+    return _route_templates.get(endpoint, "unmatched")
+
+class TimingMiddleware:
+    """Record latency, query count and DB time per request; expose them in a Server-Timing header."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = track_queries()
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", ", ".join([
+                    f"app;dur={elapsed_ms:.1f}",
+                    f'db;dur={stats.seconds * 1000:.1f};desc="{stats.count} queries"',
+                ]))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            route_metrics.observe(
+                scope["method"], _route_template(scope), status,
+                time.perf_counter() - started, stats.count, stats.seconds,
+            )
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+def _histogram_lines(name: str, snapshot: Dict[str, Any], **labels: str) -> List[str]:
+    lines = [f"{name}_bucket{_labels(**labels, le=bound)} {count}" for bound, count in snapshot["buckets"].items()]
+    suffix = _labels(**labels) if labels else ""
+    lines.append(f"{name}_sum{suffix} {snapshot['sum']}")
+    lines.append(f"{name}_count{suffix} {snapshot['count']}")
+    return lines
+
+def _family(name: str, kind: str, help_text: str, lines: List[str]) -> List[str]:
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", *lines]
+
+def render_prometheus() -> str:
+    with route_metrics._lock:
+        latency = dict(route_metrics.latency)
+        db_seconds = dict(route_metrics.db_seconds)
+        queries = dict(route_metrics.queries)
+        responses = dict(route_metrics.responses)
+
+    out: List[str] = []
+    out += _family("http_request_duration_seconds", "histogram", "Request latency by route.", [
+        line for (method, route), histogram in sorted(latency.items())
+        for line in _histogram_lines("http_request_duration_seconds", histogram.snapshot(), method=method, route=route)
+    ])
+    out += _family("http_requests_total", "counter", "Responses by route and status code.", [
+        f"http_requests_total{_labels(method=method, route=route, status=status)} {count}"
+        for (method, route, status), count in sorted(responses.items())
+    ])
+    out += _family("http_request_db_seconds", "histogram", "Database time per request by route.", [
+        line for (method, route), histogram in sorted(db_seconds.items())
+        for line in _histogram_lines("http_request_db_seconds", histogram.snapshot(), method=method, route=route)
+    ])
+    out += _family("http_request_db_queries_total", "counter", "SQL statements executed by route.", [
+        f"http_request_db_queries_total{_labels(method=method, route=route)} {count}"
+        for (method, route), count in sorted(queries.items())
+    ])
+    out += _family("db_query_duration_seconds", "histogram", "Execution time of every SQL statement.",
+                   _histogram_lines("db_query_duration_seconds", query_seconds.snapshot()))
+
+    pool = pool_status()
+    for field, help_text in (("size", "Configured pool size."), ("checked_out", "Connections in use."),
+                             ("checked_in", "Idle connections."), ("overflow", "Connections above the pool size.")):
+        if field in pool:
+            out += _family(f"db_pool_{field}", "gauge", help_text, [f"db_pool_{field} {pool[field]}"])
+    if "timeouts" in pool:
+        out += _family("db_pool_timeouts_total", "counter", "Checkouts that timed out waiting for a connection.",
+                       [f"db_pool_timeouts_total {pool['timeouts']}"])
+        out += _family("db_pool_checkout_wait_seconds", "histogram", "Time spent waiting for a pooled connection.",
+                       _histogram_lines("db_pool_checkout_wait_seconds", pool["checkout_wait_seconds"]))
+
+    cache = ProductService.get_cache_stats()
+    out += _family("catalog_cache_events_total", "counter", "Catalog cache lookups and removals.", [
+        f"catalog_cache_events_total{_labels(event=event)} {cache[event]}"
+        for event in ("hits", "misses", "evictions", "expirations", "invalidations")
+    ])
+
+    admission = admission_metrics.snapshot()
+    out += _family("http_requests_rejected_total", "counter", "Requests turned away before reaching a route.", [
+        f"http_requests_rejected_total{_labels(reason='rate_limited')} {admission['rate_limited']}",
+        f"http_requests_rejected_total{_labels(reason='overloaded')} {admission['shed']}",
+    ])
+    out += _family("http_requests_in_flight", "gauge", "Requests holding a concurrency slot.",
+                   [f"http_requests_in_flight {admission['in_flight']}"])
+    out += _family("http_requests_waiting", "gauge", "Requests waiting for a concurrency slot.",
+                   [f"http_requests_waiting {admission['waiting']}"])
+
+    out += _family("http_compression_bytes_total", "counter", "Response bytes before and after compression.", [
+        f"http_compression_bytes_total{_labels(encoding=encoding, stage=stage)} {values[key]}"
+        for encoding, values in sorted(compression_metrics.snapshot().items())
+        for stage, key in (("in", "bytes_in"), ("out", "bytes_out"))
+    ])
+    return "\n".join(out) + "\n"
@@ -1,24 +1,84 @@
 import os
-import uuid
-from typing import Optional
-from fastapi import UploadFile
-import shutil
-
-def save_upload_file(upload_file: UploadFile, destination_dir: str = "static/images") -> str:
-    """Save uploaded file and return the file path."""
-    # Create destination directory if it doesn't exist
+import json
+import base64
+import hashlib
+import tempfile
+from datetime import datetime
+from typing import Optional, Tuple
+from fastapi import HTTPException, UploadFile, status
+from starlette.concurrency import run_in_threadpool
+
+# Leading bytes of the image formats accepted for upload, by file extension
+IMAGE_SIGNATURES = {
+    "jpg": (b"\xff\xd8\xff",),
+    "png": (b"\x89PNG\r\n\x1a\n",),
+    "gif": (b"GIF87a", b"GIF89a"),
+}
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """Return the file extension for a JPEG, PNG, GIF or WebP header, or None."""
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    for extension, signatures in IMAGE_SIGNATURES.items():
+        if head.startswith(signatures):
+            return extension
+    return None
+
+async def save_upload_file(
+    upload_file: UploadFile,
+    destination_dir: str = "static/images",
+    max_bytes: int = 10 * 1024 * 1024,
+    chunk_size: int = 1024 * 1024,
+) -> Tuple[str, bool]:
+    """Stream an uploaded image to destination_dir, named by its content hash.
+
+    The type comes from the file's magic bytes, not the client filename.
+    Identical uploads end up in the same file. Returns the file path and
+    whether this call created it, rather than finding it already stored.
+    """
+    too_large = HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"File exceeds the {max_bytes} byte limit"
+    )
+    if upload_file.size is not None and upload_file.size > max_bytes:
+        raise too_large
     os.makedirs(destination_dir, exist_ok=True)
     
-    # Generate unique filename
-    file_extension = upload_file.filename.split(".")[-1] if upload_file.filename else "jpg"
-    unique_filename = f"{uuid.uuid4()}.{file_extension}"
-    file_path = os.path.join(destination_dir, unique_filename)
-    
-    # Save file
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(upload_file.file, buffer)
-    
-    return file_path
+    digest = hashlib.sha256()
+    extension = None
+    size = 0
+    # Written under a temporary name in the same directory so the final rename is atomic
+    fd, temp_path = tempfile.mkstemp(dir=destination_dir, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as buffer:
+            while chunk := await upload_file.read(chunk_size):
+                if extension is None:
+                    extension = sniff_image_type(chunk)
+                    if extension is None:
+                        raise HTTPException(
+                            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                            detail="Only JPEG, PNG, GIF and WebP images are accepted"
+                        )
+                size += len(chunk)
+                if size > max_bytes:
+                    raise too_large
+                digest.update(chunk)
+                await run_in_threadpool(buffer.write, chunk)
+        if extension is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Empty file"
+            )
+        file_path = os.path.join(destination_dir, f"{digest.hexdigest()[:32]}.{extension}")
+        # Linking fails if the file exists, so of two identical uploads at once only one creates it
+        try:
+            os.link(temp_path, file_path)
+            created = True
+        except FileExistsError:
+            created = False
+    finally:
+        os.unlink(temp_path)
+    return file_path, created
 
 def format_currency(amount: float) -> str:
     """Format amount as currency."""
@@ -28,7 +88,25 @@ def calculate_tax(subtotal: float, tax_rate: float = 0.08) -> float:
     """Calculate tax amount."""
     return subtotal * tax_rate
 
+def calculate_shipping(subtotal: float, flat_rate: float = 10.0, free_over: float = 100.0) -> float:
+    """Calculate flat-rate shipping, free from free_over upwards."""
+    return 0.0 if subtotal >= free_over else flat_rate
+
 def calculate_total(subtotal: float, tax_rate: float = 0.08, shipping: float = 0.0) -> float:
     """Calculate total amount including tax and shipping."""
     tax = calculate_tax(subtotal, tax_rate)
-    return subtotal + tax + shipping
\ No newline at end of file
+    return subtotal + tax + shipping
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Encode a (created_at, id) keyset position as an opaque cursor."""
+    raw = json.dumps([created_at.isoformat() if created_at else None, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], int]:
+    """Decode a cursor produced by encode_cursor. Raises ValueError if it is malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return (datetime.fromisoformat(created_at) if created_at else None), int(row_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
@@ -1,28 +1,50 @@
+import hmac
 import os
+import threading
 from dotenv import load_dotenv
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
 import uvicorn
 
 # Load environment variables
 load_dotenv()
 
 # Import API routes
-from api.routes import auth, products, orders, users
+from api.routes import auth, products, orders, cart, users, admin
 
 # Import database initialization
-from core.database import engine, Base
+from core.database import engine, async_engine, Base
+
+from core.cache import cache_bus
+from core.admission import ConcurrencyLimitMiddleware, RateLimitMiddleware
+from core.compression import CompressionMiddleware, PrecompressedStaticFiles
+from core.responses import FastJSONResponse
+from core.telemetry import TimingMiddleware, render_prometheus
+from services.images import CONTENT_HASHED_PATH
+from services.jobs import Purger, Worker
+from services.search import search_index
+from app.config import settings
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
+search_index.ensure(engine)
 
 app = FastAPI(
     title="Adidas Shoes Store API",
     description="Professional ecommerce API for Adidas shoes",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse if settings.fast_json_responses else JSONResponse
 )
 
+# Innermost, so rejections still get CORS headers and are timed; the concurrency
+# cap applies only to requests that got past the rate limiter
+if settings.max_concurrent_requests > 0:
+    app.add_middleware(ConcurrencyLimitMiddleware)
+if settings.rate_limit_enabled:
+    app.add_middleware(RateLimitMiddleware)
+
 # CORS middleware for React frontend
 app.add_middleware(
     CORSMiddleware,
@@ -30,17 +52,45 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Last-Modified", "Server-Timing", "Idempotent-Replayed", "Retry-After"],
 )
 
+if settings.compression_enabled:
+    app.add_middleware(CompressionMiddleware)
+
+# Outermost, so the recorded latency includes compression and CORS handling
+app.add_middleware(TimingMiddleware)
+
 # Mount static files
 os.makedirs("static/images", exist_ok=True)
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount("/static", PrecompressedStaticFiles(directory="static", immutable_paths=CONTENT_HASHED_PATH), name="static")
 
 # Include API routes
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(products.router, prefix="/api/products", tags=["Products"])
 app.include_router(orders.router, prefix="/api/orders", tags=["Orders"])
+app.include_router(cart.router, prefix="/api/cart", tags=["Cart"])
 app.include_router(users.router, prefix="/api/users", tags=["Users"])
+app.include_router(admin.router, prefix="/api/admin", tags=["Admin"])
+
+# Without a worker thread, finished jobs are still purged here in case no dedicated worker runs
+job_worker = Worker() if settings.jobs_run_in_process else Purger()
+
+@app.on_event("startup")
+async def start_cache_bus():
+    # Broadcasts from other workers (cache invalidations, search index updates) are heard from the start
+    await run_in_threadpool(cache_bus.start)
+
+@app.on_event("startup")
+async def start_job_worker():
+    threading.Thread(target=job_worker.run, name="job-worker", daemon=True).start()
+
+@app.on_event("shutdown")
+async def dispose_engines():
+    job_worker.stop()
+    if async_engine is not None:
+        await async_engine.dispose()
+    engine.dispose()
 
 @app.get("/")
 async def root():
@@ -50,6 +100,20 @@ async def root():
 async def health_check():
     return {"status": "healthy", "service": "adidas-store-api"}
 
+if settings.metrics_enabled:
+    @app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+    async def metrics(request: Request):
+        """Prometheus text exposition of request, database, cache and compression metrics."""
+        if settings.metrics_token:
+            scheme, _, token = request.headers.get("authorization", "").partition(" ")
+            if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), settings.metrics_token.encode()):
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Invalid metrics token",
+                    headers={"WWW-Authenticate": "Bearer"},
+                )
+        return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 8000))
     host = os.getenv("HOST", "0.0.0.0")
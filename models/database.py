@@ -1,8 +1,12 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text
+from datetime import datetime, timezone
+from sqlalchemy import Column, Integer, String, Float, Boolean, Date, DateTime, ForeignKey, Text, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from core.database import Base
 
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
 class User(Base):
     __tablename__ = "users"
     
@@ -42,15 +46,45 @@ class Product(Base):
     category_id = Column(Integer, ForeignKey("categories.id"))
     sizes = Column(String)  # JSON string of available sizes
     colors = Column(String)  # JSON string of available colors
-    stock_quantity = Column(Integer, default=0)
+    stock_quantity = Column(Integer, default=0)  # sum of variant stock when the product has variants
     is_featured = Column(Boolean, default=False)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Stamped in Python for sub-second precision: product ETags are derived from it
+    updated_at = Column(DateTime(timezone=True), onupdate=utcnow)
     
     # Relationships
     category = relationship("Category", back_populates="products")
     order_items = relationship("OrderItem", back_populates="product")
+    variants = relationship(
+        "ProductVariant", back_populates="product", cascade="all, delete-orphan", order_by="ProductVariant.id"
+    )
+    
+    __table_args__ = (
+        # Keyset pagination order
+        Index("ix_products_created_at_id", "created_at", "id"),
+        Index("ix_products_category_id_price", "category_id", "price"),
+        Index("ix_products_name", "name"),
+    )
+
+class ProductVariant(Base):
+    __tablename__ = "product_variants"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    size = Column(String, nullable=False)
+    color = Column(String, nullable=False)
+    stock_quantity = Column(Integer, nullable=False, default=0)
+    
+    # Relationships
+    product = relationship("Product", back_populates="variants")
+    
+    __table_args__ = (
+        UniqueConstraint("product_id", "size", "color", name="uq_product_variants_product_size_color"),
+        # Facet filters: size (+ color) first, then the product they belong to
+        Index("ix_product_variants_size_color_product_id", "size", "color", "product_id"),
+        Index("ix_product_variants_color_product_id", "color", "product_id"),
+    )
 
 class Order(Base):
     __tablename__ = "orders"
@@ -70,6 +104,13 @@ class Order(Base):
     # Relationships
     user = relationship("User", back_populates="orders")
     order_items = relationship("OrderItem", back_populates="order")
+    
+    __table_args__ = (
+        # Keyset pagination of a user's order history
+        Index("ix_orders_user_id_created_at_id", "user_id", "created_at", "id"),
+        # Date-range order export
+        Index("ix_orders_created_at", "created_at"),
+    )
 
 class OrderItem(Base):
     __tablename__ = "order_items"
@@ -85,4 +126,104 @@ class OrderItem(Base):
     
     # Relationships
     order = relationship("Order", back_populates="order_items")
-    product = relationship("Product", back_populates="order_items")
\ No newline at end of file
+    product = relationship("Product", back_populates="order_items")
+
+class SalesDaily(Base):
+    """Units and revenue per product per day, kept current by checkout."""
+    __tablename__ = "sales_daily"
+    
+    day = Column(Date, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    # The product's category when it sold
+    category_id = Column(Integer, ForeignKey("categories.id"))
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0.0)
+    order_count = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        Index("ix_sales_daily_category_id_day", "category_id", "day"),
+    )
+
+class ProductSalesTotal(Base):
+    """All-time units and revenue per product, kept current by checkout."""
+    __tablename__ = "product_sales_totals"
+    
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0.0)
+    order_count = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        # Best sellers
+        Index("ix_product_sales_totals_units_product_id", "units", "product_id"),
+    )
+
+class IdempotencyKey(Base):
+    """A client-supplied Idempotency-Key and, once the request finished, its stored response."""
+    __tablename__ = "idempotency_keys"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    key = Column(String, nullable=False)
+    fingerprint = Column(String, nullable=False)  # hash of the request body
+    status = Column(String, nullable=False, default="in_progress")  # in_progress, completed
+    response_status = Column(Integer)
+    response_body = Column(Text)
+    locked_at = Column(DateTime(timezone=True), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    
+    __table_args__ = (
+        UniqueConstraint("user_id", "key", name="uq_idempotency_keys_user_id_key"),
+        Index("ix_idempotency_keys_expires_at", "expires_at"),
+    )
+
+class Job(Base):
+    """Background work, written in the same transaction as the change that calls for it."""
+    __tablename__ = "jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)  # selects the registered handler
+    payload = Column(Text, nullable=False, default="{}")  # JSON
+    status = Column(String, nullable=False, default="queued")  # queued, running, done, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False)
+    run_at = Column(DateTime(timezone=True), nullable=False)  # not picked up before this
+    locked_at = Column(DateTime(timezone=True))
+    locked_by = Column(String)
+    last_error = Column(Text)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+    
+    __table_args__ = (
+        # Claiming due jobs
+        Index("ix_jobs_status_run_at", "status", "run_at"),
+        # Latency stats and purging of finished jobs
+        Index("ix_jobs_finished_at", "finished_at"),
+    )
+
+class Cart(Base):
+    """A user's server-side cart. The subtotal is kept current as items change, in cents."""
+    __tablename__ = "carts"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    subtotal_cents = Column(Integer, nullable=False, default=0)
+    item_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class CartItem(Base):
+    __tablename__ = "cart_items"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("carts.user_id"), nullable=False)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    size = Column(String)
+    color = Column(String)
+    quantity = Column(Integer, nullable=False)
+    unit_price_cents = Column(Integer, nullable=False)
+    
+    __table_args__ = (
+        UniqueConstraint("user_id", "product_id", "size", "color", name="uq_cart_items_user_product_size_color"),
+        # Repricing carts when a product's price changes
+        Index("ix_cart_items_product_id", "product_id"),
+    )
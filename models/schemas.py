@@ -64,6 +64,17 @@ class ProductBase(BaseModel):
 class ProductCreate(ProductBase):
     pass
 
+class ProductVariantBase(BaseModel):
+    size: str
+    color: str
+    stock_quantity: int = 0
+
+class ProductVariant(ProductVariantBase):
+    id: int
+    
+    class Config:
+        from_attributes = True
+
 class ProductUpdate(BaseModel):
     name: Optional[str] = None
     description: Optional[str] = None
@@ -82,10 +93,31 @@ class Product(ProductBase):
     created_at: datetime
     updated_at: Optional[datetime] = None
     category: Optional[Category] = None
+    variants: List[ProductVariant] = []
     
     class Config:
         from_attributes = True
 
+# Facet schemas
+class FacetValue(BaseModel):
+    value: str
+    count: int
+
+class CategoryFacet(BaseModel):
+    id: int
+    name: str
+    count: int
+
+class PriceRange(BaseModel):
+    min: Optional[float] = None
+    max: Optional[float] = None
+
+class ProductFacets(BaseModel):
+    categories: List[CategoryFacet]
+    sizes: List[FacetValue]
+    colors: List[FacetValue]
+    price: PriceRange
+
 # Order schemas
 class OrderItemBase(BaseModel):
     product_id: int
@@ -134,8 +166,17 @@ class CartItem(BaseModel):
     size: Optional[str] = None
     color: Optional[str] = None
 
+class CartLine(CartItem):
+    id: int
+    unit_price: float
+    total_price: float
+
+class CartItemUpdate(BaseModel):
+    quantity: int
+
 class Cart(BaseModel):
-    items: List[CartItem]
+    items: List[CartLine]
+    item_count: int = 0
     subtotal: float
     tax_amount: float
     shipping_amount: float
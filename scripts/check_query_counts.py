@@ -0,0 +1,100 @@
+"""Query-count harness for the catalog and order endpoints.
+
+Seeds a throwaway SQLite database with a small and a large data set, calls each
+endpoint against both and fails when the number of SQL statements grows with the
+result size (i.e. an N+1 pattern crept back into serialization).
+
+    python scripts/check_query_counts.py [--strategy selectin|joined|lazy]
+"""
+import sys
+import os
+import argparse
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_tmpdir = tempfile.mkdtemp(prefix="query-counts-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'query_counts.db')}"
+
+from fastapi.testclient import TestClient
+from core.database import SessionLocal, count_queries
+from core.security import create_access_token, get_password_hash
+from models.database import Category, Product, User, Order, OrderItem
+from services.business import catalog_cache
+from app.config import settings
+import main
+
+SMALL_ORDERS, LARGE_ORDERS = 2, 12
+SMALL_ITEMS, LARGE_ITEMS = 1, 4
+
+def seed():
+    db = SessionLocal()
+    try:
+        categories = [Category(name=f"Category {i}") for i in range(5)]
+        db.add_all(categories)
+        db.flush()
+        products = [
+            Product(name=f"Shoe {i}", price=50.0 + i, category_id=categories[i % 5].id,
+                    stock_quantity=100, is_featured=i % 2 == 0)
+            for i in range(40)
+        ]
+        db.add_all(products)
+        password = get_password_hash("password")
+        users = {}
+        for label, n_orders, n_items in (("small", SMALL_ORDERS, SMALL_ITEMS), ("large", LARGE_ORDERS, LARGE_ITEMS)):
+            user = User(email=f"{label}@example.com", hashed_password=password, first_name=label, last_name="User")
+            db.add(user)
+            db.flush()
+            for o in range(n_orders):
+                order = Order(user_id=user.id, subtotal=0.0, total_amount=0.0)
+                db.add(order)
+                db.flush()
+                for i in range(n_items):
+                    product = products[(o * n_items + i) % len(products)]
+                    db.add(OrderItem(order_id=order.id, product_id=product.id, quantity=1,
+                                     unit_price=product.price, total_price=product.price))
+            users[label] = user.email
+        db.commit()
+        first_order = {
+            label: db.query(Order.id).join(User).filter(User.email == email).order_by(Order.id).first()[0]
+            for label, email in users.items()
+        }
+        return users, first_order
+    finally:
+        db.close()
+
+def measure(client, path, headers=None):
+    catalog_cache.clear()
+    with count_queries() as counter:
+        response = client.get(path, headers=headers or {})
+    assert response.status_code == 200, f"{path} -> {response.status_code}: {response.text}"
+    return counter.count
+
+def main_check(strategy: str) -> int:
+    settings.orm_loading_strategy = strategy
+    users, first_order = seed()
+    client = TestClient(main.app)
+    auth = {
+        label: {"Authorization": f"Bearer {create_access_token({'sub': email})}"}
+        for label, email in users.items()
+    }
+    checks = [
+        ("GET /api/products/", measure(client, "/api/products/?limit=2"), measure(client, "/api/products/?limit=40")),
+        ("GET /api/products/featured", measure(client, "/api/products/featured?limit=1"),
+         measure(client, "/api/products/featured?limit=20")),
+        ("GET /api/orders/", measure(client, "/api/orders/", auth["small"]),
+         measure(client, "/api/orders/", auth["large"])),
+        ("GET /api/orders/{id}", measure(client, f"/api/orders/{first_order['small']}", auth["small"]),
+         measure(client, f"/api/orders/{first_order['large']}", auth["large"])),
+    ]
+    failed = False
+    print(f"loading strategy: {strategy}")
+    for name, small, large in checks:
+        status = "ok" if large <= small else "FAIL"
+        failed = failed or large > small
+        print(f"  {status:4} {name:28} small={small:3} large={large:3}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--strategy", default=settings.orm_loading_strategy, choices=["selectin", "joined", "lazy"])
+    sys.exit(main_check(parser.parse_args().strategy))
@@ -0,0 +1,95 @@
+"""Concurrent checkout stress test.
+
+Fires parallel POST /api/orders/ requests at a product with limited stock and
+checks that stock never goes negative and that the units sold add up exactly.
+
+    python scripts/checkout_stress.py [--stock 25] [--buyers 80] [--quantity 1] [--database-url URL]
+
+Uses a throwaway SQLite database unless --database-url is given (point it at a
+scratch PostgreSQL database to exercise SELECT ... FOR UPDATE).
+"""
+import sys
+import os
+import argparse
+import asyncio
+import tempfile
+from collections import Counter
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stock", type=int, default=25)
+    parser.add_argument("--buyers", type=int, default=80)
+    parser.add_argument("--quantity", type=int, default=1)
+    parser.add_argument("--database-url", default=None)
+    return parser.parse_args()
+
+args = parse_args()
+if args.database_url:
+    os.environ["DATABASE_URL"] = args.database_url
+else:
+    _tmpdir = tempfile.mkdtemp(prefix="checkout-stress-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'checkout_stress.db')}"
+
+# Every simulated request comes from one client address
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+import httpx
+from core.database import SessionLocal, async_engine
+from core.security import create_access_token
+from models.database import Category, Product, User, OrderItem
+import main
+
+def seed(stock: int, buyers: int):
+    db = SessionLocal()
+    try:
+        category = Category(name="Stress Test")
+        db.add(category)
+        db.flush()
+        product = Product(name="Limited Edition", price=120.0, category_id=category.id, stock_quantity=stock)
+        db.add(product)
+        emails = [f"buyer{i}@example.com" for i in range(buyers)]
+        db.add_all(User(email=email, hashed_password="x", first_name="Buyer", last_name=str(i))
+                   for i, email in enumerate(emails))
+        db.commit()
+        return product.id, emails
+    finally:
+        db.close()
+
+async def checkout_all(product_id, emails):
+    statuses = Counter()
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://stress") as client:
+        async def buy(email):
+            response = await client.post(
+                "/api/orders/",
+                json={"items": [{"product_id": product_id, "quantity": args.quantity}]},
+                headers={"Authorization": f"Bearer {create_access_token({'sub': email})}"},
+            )
+            statuses[response.status_code] += 1
+
+        await asyncio.gather(*(buy(email) for email in emails))
+    if async_engine is not None:
+        await async_engine.dispose()
+    return statuses
+
+def run():
+    product_id, emails = seed(args.stock, args.buyers)
+    statuses = asyncio.run(checkout_all(product_id, emails))
+
+    db = SessionLocal()
+    try:
+        remaining = db.query(Product.stock_quantity).filter(Product.id == product_id).scalar()
+        sold = sum(q for (q,) in db.query(OrderItem.quantity).filter(OrderItem.product_id == product_id))
+    finally:
+        db.close()
+
+    print(f"stock={args.stock} buyers={args.buyers} quantity={args.quantity}")
+    print(f"responses: {dict(sorted(statuses.items()))}")
+    print(f"units sold={sold} remaining={remaining}")
+    ok = remaining >= 0 and sold + remaining == args.stock and sold == statuses[200] * args.quantity
+    print("OK: nothing oversold" if ok else "FAIL: stock accounting is inconsistent")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -0,0 +1,50 @@
+"""Backfill product_variants from the legacy Product.sizes/Product.colors JSON columns.
+
+Creates the product_variants table if it is missing and gives every product that
+has sizes and colors but no variant rows one row per combination, spreading its
+stock_quantity across them. Products that already have variants are left alone,
+so the script is safe to re-run.
+
+    python scripts/migrate_variants.py [--batch-size 500]
+"""
+import sys
+import os
+import argparse
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, select
+from core.database import SessionLocal, engine
+from models.database import Base, Product, ProductVariant
+from services.business import split_variant_stock
+
+def migrate(batch_size: int) -> int:
+    Base.metadata.create_all(bind=engine, tables=[ProductVariant.__table__])
+    db = SessionLocal()
+    migrated = 0
+    try:
+        has_variants = select(ProductVariant.id).where(ProductVariant.product_id == Product.id).exists()
+        pending = db.query(Product.id, Product.sizes, Product.colors, Product.stock_quantity).filter(
+            Product.sizes.isnot(None), Product.colors.isnot(None), ~has_variants
+        ).order_by(Product.id).all()
+        rows = []
+        for product_id, sizes, colors, stock_quantity in pending:
+            variants = split_variant_stock(sizes, colors, stock_quantity)
+            if not variants:
+                continue
+            rows.extend({"product_id": product_id, **variant} for variant in variants)
+            migrated += 1
+            if migrated % batch_size == 0:
+                db.execute(insert(ProductVariant), rows)
+                db.commit()
+                rows.clear()
+        if rows:
+            db.execute(insert(ProductVariant), rows)
+        db.commit()
+    finally:
+        db.close()
+    return migrated
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500)
+    print(f"Created variants for {migrate(parser.parse_args().batch_size)} products")
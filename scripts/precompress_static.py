@@ -0,0 +1,60 @@
+"""Write .gz and .br siblings for compressible static assets.
+
+Run as a build step after the frontend bundle is copied into static/. The app
+serves these siblings to clients that accept them, so assets are compressed
+once at maximum level instead of on every request. Up-to-date siblings are
+skipped; siblings that would not be smaller than the original are not kept.
+
+    python scripts/precompress_static.py [--directory static] [--force]
+"""
+import sys
+import os
+import argparse
+import gzip
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.compression import brotli
+
+EXTENSIONS = {".html", ".css", ".js", ".mjs", ".map", ".json", ".svg", ".txt", ".xml", ".wasm", ".ico"}
+
+def encoders():
+    yield ".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0)
+    if brotli is not None:
+        yield ".br", lambda data: brotli.compress(data, quality=11)
+    else:
+        print("brotli is not installed; writing .gz files only")
+
+def precompress(directory: str, force: bool) -> int:
+    written = 0
+    codecs = list(encoders())
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if os.path.splitext(name)[1].lower() not in EXTENSIONS:
+                continue
+            source = os.path.join(root, name)
+            mtime = os.path.getmtime(source)
+            data = None
+            for suffix, encode in codecs:
+                target = source + suffix
+                if not force and os.path.exists(target) and os.path.getmtime(target) >= mtime:
+                    continue
+                if data is None:
+                    with open(source, "rb") as f:
+                        data = f.read()
+                encoded = encode(data)
+                if len(encoded) >= len(data):
+                    if os.path.exists(target):
+                        os.remove(target)
+                    continue
+                with open(target, "wb") as f:
+                    f.write(encoded)
+                written += 1
+                print(f"{target}: {len(data)} -> {len(encoded)} bytes")
+    return written
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--directory", default="static")
+    parser.add_argument("--force", action="store_true", help="rewrite siblings even when they are up to date")
+    args = parser.parse_args()
+    print(f"Wrote {precompress(args.directory, args.force)} compressed files")
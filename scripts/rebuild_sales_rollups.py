@@ -0,0 +1,24 @@
+"""Recompute the sales_daily and product_sales_totals rollups from order history.
+
+Checkout keeps the rollups current as orders are placed. Run this once after
+upgrading a database that already has orders, or after orders were edited or
+cancelled outside the API. It replaces both tables in one transaction.
+
+    python scripts/rebuild_sales_rollups.py
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.database import SessionLocal, engine
+from models.database import Base, ProductSalesTotal, SalesDaily
+from services.business import AnalyticsService
+
+if __name__ == "__main__":
+    Base.metadata.create_all(bind=engine, tables=[SalesDaily.__table__, ProductSalesTotal.__table__])
+    db = SessionLocal()
+    try:
+        counts = AnalyticsService.rebuild_rollups(db)
+    finally:
+        db.close()
+    print(f"Rebuilt {counts['sales_daily']} daily rows and {counts['product_sales_totals']} product totals")
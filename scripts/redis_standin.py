@@ -0,0 +1,161 @@
+"""A small in-memory server speaking the Redis protocol, for testing CACHE_BACKEND=redis:// locally.
+
+Implements only the commands the cache backend uses (GET, SET with PX/EX,
+DEL, SADD, SMEMBERS, PEXPIRE/EXPIRE, SCAN, PUBLISH, SUBSCRIBE) plus PING,
+SELECT, AUTH and FLUSHDB; every database number shares one keyspace. Data
+is lost on exit; use a real Redis in production.
+
+    python scripts/redis_standin.py [--port 6399]
+    CACHE_BACKEND=redis://127.0.0.1:6399/0 uvicorn main:app --workers 4
+"""
+import argparse
+import asyncio
+import fnmatch
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+class Store:
+    def __init__(self):
+        self.data: Dict[bytes, object] = {}
+        self.expires: Dict[bytes, float] = {}
+        self.subscribers: Dict[bytes, Set[asyncio.StreamWriter]] = {}
+
+    def _live(self, key: bytes) -> bool:
+        expires_at = self.expires.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    def _expire(self, key: bytes, ms: int) -> None:
+        self.expires[key] = time.monotonic() + ms / 1000
+
+    def execute(self, command: bytes, args: List[bytes], writer: asyncio.StreamWriter):
+        name = command.upper()
+        if name == b"PING":
+            return Simple(b"PONG")
+        if name in (b"SELECT", b"AUTH"):
+            return Simple(b"OK")
+        if name == b"FLUSHDB":
+            self.data.clear()
+            self.expires.clear()
+            return Simple(b"OK")
+        if name == b"GET":
+            if not self._live(args[0]):
+                return None
+            value = self.data[args[0]]
+            return value if isinstance(value, bytes) else Error(b"WRONGTYPE")
+        if name == b"SET":
+            key, value, options = args[0], args[1], [arg.upper() for arg in args[2:]]
+            self.data[key] = value
+            self.expires.pop(key, None)
+            for flag, scale in ((b"PX", 1), (b"EX", 1000)):
+                if flag in options:
+                    self._expire(key, int(args[2 + options.index(flag) + 1]) * scale)
+            return Simple(b"OK")
+        if name == b"DEL":
+            removed = sum(1 for key in args if self._live(key))
+            for key in args:
+                self.data.pop(key, None)
+                self.expires.pop(key, None)
+            return removed
+        if name == b"SADD":
+            self._live(args[0])
+            members = self.data.setdefault(args[0], set())
+            before = len(members)
+            members.update(args[1:])
+            return len(members) - before
+        if name == b"SMEMBERS":
+            return sorted(self.data[args[0]]) if self._live(args[0]) else []
+        if name in (b"PEXPIRE", b"EXPIRE"):
+            if not self._live(args[0]):
+                return 0
+            self._expire(args[0], int(args[1]) * (1 if name == b"PEXPIRE" else 1000))
+            return 1
+        if name == b"SCAN":
+            # One pass over everything; the cursor is always 0 afterwards
+            pattern = b"*"
+            if b"MATCH" in [arg.upper() for arg in args]:
+                pattern = args[[arg.upper() for arg in args].index(b"MATCH") + 1]
+            keys = [key for key in list(self.data) if self._live(key) and fnmatch.fnmatchcase(key, pattern)]
+            return [b"0", keys]
+        if name == b"PUBLISH":
+            receivers = self.subscribers.get(args[0], set())
+            for subscriber in list(receivers):
+                subscriber.write(encode([b"message", args[0], args[1]]))
+            return len(receivers)
+        if name == b"SUBSCRIBE":
+            for channel in args:
+                self.subscribers.setdefault(channel, set()).add(writer)
+                writer.write(encode([b"subscribe", channel, 1]))
+            return NO_REPLY
+        return Error(b"ERR unknown command '" + command + b"'")
+
+class Simple(bytes):
+    pass
+
+class Error(bytes):
+    pass
+
+NO_REPLY = object()
+
+def encode(value) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, Simple):
+        return b"+" + value + b"\r\n"
+    if isinstance(value, Error):
+        return b"-" + value + b"\r\n"
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, bytes):
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+    return b"*%d\r\n" % len(value) + b"".join(encode(item) for item in value)
+
+async def read_command(reader: asyncio.StreamReader) -> Optional[Tuple[bytes, List[bytes]]]:
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        # Inline command, as typed into telnet
+        parts = line.split()
+        return (parts[0], parts[1:]) if parts else (b"PING", [])
+    parts = []
+    for _ in range(int(line[1:])):
+        length = int((await reader.readline())[1:])
+        parts.append((await reader.readexactly(length + 2))[:-2])
+    return parts[0], parts[1:]
+
+async def serve(port: int) -> None:
+    store = Store()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                command = await read_command(reader)
+                if command is None:
+                    break
+                reply = store.execute(*command, writer)
+                if reply is not NO_REPLY:
+                    writer.write(encode(reply))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for subscribers in store.subscribers.values():
+                subscribers.discard(writer)
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", port)
+    print(f"listening on 127.0.0.1:{port}", flush=True)
+    async with server:
+        await server.serve_forever()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=6399)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.port))
+    except KeyboardInterrupt:
+        pass
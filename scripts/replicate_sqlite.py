@@ -0,0 +1,57 @@
+"""Keep SQLite read replicas in step with the primary, for local replica testing.
+
+A stand-in for real replication: every --interval seconds the primary named
+by DATABASE_URL is copied into each file in DATABASE_REPLICA_URLS with
+SQLite's online backup API, which gives readers of a replica a consistent
+snapshot throughout. Keep REPLICA_LAG_SECONDS above the interval plus the
+time a copy takes, which is printed on each pass.
+
+    DATABASE_REPLICA_URLS=sqlite:///./replica1.db python scripts/replicate_sqlite.py [--interval 1] [--once]
+"""
+import sys
+import os
+import argparse
+import sqlite3
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings
+from core.database import replica_urls, sync_url
+
+def sqlite_path(url: str) -> str:
+    scheme, _, path = sync_url(url).partition(":///")
+    if scheme != "sqlite" or not path or path == ":memory:":
+        raise SystemExit(f"not a SQLite file URL: {url}")
+    return path
+
+def replicate(primary: str, replicas: list) -> float:
+    """Copy the primary into every replica; returns the seconds taken."""
+    start = time.perf_counter()
+    source = sqlite3.connect(primary)
+    try:
+        for path in replicas:
+            target = sqlite3.connect(path)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+    finally:
+        source.close()
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between copies")
+    parser.add_argument("--once", action="store_true", help="copy once and exit")
+    args = parser.parse_args()
+
+    if not replica_urls:
+        raise SystemExit("DATABASE_REPLICA_URLS is empty")
+    primary = sqlite_path(settings.database_url)
+    replicas = [sqlite_path(url) for url in replica_urls]
+    while True:
+        elapsed = replicate(primary, replicas)
+        print(f"replicated {primary} to {len(replicas)} replica(s) in {elapsed * 1000:.0f} ms", flush=True)
+        if args.once:
+            break
+        time.sleep(args.interval)
@@ -0,0 +1,56 @@
+"""Run background job workers against the jobs table.
+
+Each process polls for due jobs and runs them; any number of processes, on
+any number of hosts sharing the database, can run side by side. SIGINT or
+SIGTERM lets each finish its current batch and exit.
+
+    python scripts/run_worker.py [--processes 2] [--batch-size 10] [--drain]
+
+--drain runs until no job is due and exits, for cron or one-off catch-up.
+"""
+import sys
+import os
+import argparse
+import logging
+import multiprocessing
+import signal
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.database import engine
+from models.database import Base, Job
+from services.jobs import Worker
+
+def work(batch_size: int, drain: bool) -> None:
+    # Connections inherited from the parent must not be shared with it
+    engine.dispose(close=False)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(processName)s %(levelname)s %(message)s")
+    worker = Worker(batch_size=batch_size)
+    if drain:
+        while worker.run_once():
+            pass
+        return
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: worker.stop())
+    worker.run()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--drain", action="store_true", help="exit once no job is due")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine, tables=[Job.__table__])
+    if args.processes == 1:
+        work(args.batch_size, args.drain)
+    else:
+        processes = [
+            multiprocessing.Process(target=work, args=(args.batch_size, args.drain), name=f"worker-{n}")
+            for n in range(args.processes)
+        ]
+        for process in processes:
+            process.start()
+        # Workers handle the signal themselves; the parent just waits for them
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        for process in processes:
+            process.join()
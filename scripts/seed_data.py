@@ -5,8 +5,9 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import json
 from sqlalchemy.orm import Session
 from core.database import SessionLocal, engine
-from models.database import Base, Category, Product, User
+from models.database import Base, Category, Product, ProductVariant, User
 from core.security import get_password_hash
+from services.business import split_variant_stock
 
 # Create tables
 Base.metadata.create_all(bind=engine)
@@ -133,6 +134,10 @@ def seed_data():
             existing_product = db.query(Product).filter(Product.name == product_data["name"]).first()
             if not existing_product:
                 product = Product(**product_data)
+                product.variants = [
+                    ProductVariant(**row)
+                    for row in split_variant_stock(product.sizes, product.colors, product.stock_quantity)
+                ]
                 db.add(product)
         
         # Create admin user
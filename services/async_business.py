@@ -0,0 +1,160 @@
+"""Awaitable counterparts of the services in services.business.
+
+Each method runs the corresponding sync service on the request session via
+core.database.run_db: through AsyncSession.run_sync() on the async driver when
+DATABASE_URL selects one, otherwise on the threadpool. Either way the event
+loop is free while the query runs, and the query logic lives in one place.
+"""
+from datetime import date
+from typing import List, Optional
+from core.database import DBSession, run_db
+from models import database as db_models
+from models.schemas import CartItem, ProductCreate, ProductUpdate, ProductVariantBase, OrderBase, OrderCreate, UserCreate
+from models.schemas import Product as ProductSchema
+from services.business import (
+    AnalyticsService, BeforeCommit, CartService, UserService, ProductService, OrderService, CategoryService
+)
+
+class AsyncUserService:
+    @staticmethod
+    async def create_user(db: DBSession, user: UserCreate, hashed_password: Optional[str] = None) -> db_models.User:
+        return await run_db(db, UserService.create_user, user, hashed_password=hashed_password)
+    
+    @staticmethod
+    async def get_user_by_email(db: DBSession, email: str) -> Optional[db_models.User]:
+        return await run_db(db, UserService.get_user_by_email, email)
+    
+    @staticmethod
+    async def update_password_hash(db: DBSession, user: db_models.User, hashed_password: str) -> db_models.User:
+        return await run_db(db, UserService.update_password_hash, user, hashed_password)
+
+class AsyncProductService:
+    @staticmethod
+    async def get_products(
+        db: DBSession,
+        skip: int = 0,
+        limit: int = 100,
+        category_id: Optional[int] = None,
+        cursor: Optional[str] = None,
+        size: Optional[str] = None,
+        color: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        sort: str = "newest"
+    ) -> List[ProductSchema]:
+        return await run_db(
+            db, ProductService.get_products, skip=skip, limit=limit, category_id=category_id, cursor=cursor,
+            size=size, color=color, min_price=min_price, max_price=max_price, sort=sort
+        )
+    
+    @staticmethod
+    async def get_facets(
+        db: DBSession,
+        category_id: Optional[int] = None,
+        size: Optional[str] = None,
+        color: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None
+    ) -> dict:
+        return await run_db(
+            db, ProductService.get_facets, category_id=category_id,
+            size=size, color=color, min_price=min_price, max_price=max_price
+        )
+    
+    @staticmethod
+    async def get_product(db: DBSession, product_id: int) -> Optional[ProductSchema]:
+        return await run_db(db, ProductService.get_product, product_id)
+    
+    @staticmethod
+    async def create_product(db: DBSession, product: ProductCreate) -> ProductSchema:
+        return await run_db(db, ProductService.create_product, product)
+    
+    @staticmethod
+    async def update_product(db: DBSession, product_id: int, product_update: ProductUpdate) -> Optional[ProductSchema]:
+        return await run_db(db, ProductService.update_product, product_id, product_update)
+    
+    @staticmethod
+    async def update_variant_stock(
+        db: DBSession, product_id: int, variants: List[ProductVariantBase]
+    ) -> Optional[ProductSchema]:
+        return await run_db(db, ProductService.update_variant_stock, product_id, variants)
+    
+    @staticmethod
+    async def get_featured_products(db: DBSession, limit: int = 6) -> List[ProductSchema]:
+        return await run_db(db, ProductService.get_featured_products, limit=limit)
+    
+    @staticmethod
+    async def search_products(db: DBSession, q: str, limit: int = 20, offset: int = 0) -> List[ProductSchema]:
+        return await run_db(db, ProductService.search_products, q, limit=limit, offset=offset)
+
+class AsyncOrderService:
+    @staticmethod
+    async def create_order(
+        db: DBSession, order: OrderCreate, user_id: int, before_commit: Optional[BeforeCommit] = None
+    ) -> db_models.Order:
+        return await run_db(db, OrderService.create_order, order, user_id, before_commit)
+    
+    @staticmethod
+    async def get_user_orders(
+        db: DBSession,
+        user_id: int,
+        skip: int = 0,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None
+    ) -> List[db_models.Order]:
+        return await run_db(db, OrderService.get_user_orders, user_id, skip=skip, limit=limit, cursor=cursor)
+    
+    @staticmethod
+    async def get_order(db: DBSession, order_id: int, user_id: Optional[int] = None) -> Optional[db_models.Order]:
+        return await run_db(db, OrderService.get_order, order_id, user_id)
+
+class AsyncCartService:
+    @staticmethod
+    async def get_cart(db: DBSession, user_id: int) -> dict:
+        return await run_db(db, CartService.get_cart, user_id)
+    
+    @staticmethod
+    async def add_item(db: DBSession, user_id: int, item: CartItem) -> dict:
+        return await run_db(db, CartService.add_item, user_id, item)
+    
+    @staticmethod
+    async def set_quantity(db: DBSession, user_id: int, item_id: int, quantity: int) -> Optional[dict]:
+        return await run_db(db, CartService.set_quantity, user_id, item_id, quantity)
+    
+    @staticmethod
+    async def remove_item(db: DBSession, user_id: int, item_id: int) -> Optional[dict]:
+        return await run_db(db, CartService.remove_item, user_id, item_id)
+    
+    @staticmethod
+    async def clear(db: DBSession, user_id: int) -> dict:
+        return await run_db(db, CartService.clear, user_id)
+    
+    @staticmethod
+    async def checkout(
+        db: DBSession, user_id: int, details: OrderBase, before_commit: Optional[BeforeCommit] = None
+    ) -> db_models.Order:
+        return await run_db(db, CartService.checkout, user_id, details, before_commit)
+
+class AsyncCategoryService:
+    @staticmethod
+    async def get_categories(db: DBSession) -> List[db_models.Category]:
+        return await run_db(db, CategoryService.get_categories)
+    
+    @staticmethod
+    async def create_category(db: DBSession, name: str, description: Optional[str] = None) -> db_models.Category:
+        return await run_db(db, CategoryService.create_category, name, description)
+
+class AsyncAnalyticsService:
+    @staticmethod
+    async def get_daily_sales(db: DBSession, start: Optional[date] = None, end: Optional[date] = None) -> List[dict]:
+        return await run_db(db, AnalyticsService.get_daily_sales, start=start, end=end)
+    
+    @staticmethod
+    async def get_top_products(
+        db: DBSession, start: Optional[date] = None, end: Optional[date] = None, limit: int = 10
+    ) -> List[dict]:
+        return await run_db(db, AnalyticsService.get_top_products, start=start, end=end, limit=limit)
+    
+    @staticmethod
+    async def get_category_sales(db: DBSession, start: Optional[date] = None, end: Optional[date] = None) -> List[dict]:
+        return await run_db(db, AnalyticsService.get_category_sales, start=start, end=end)
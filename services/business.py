@@ -1,15 +1,324 @@
 import json
-from typing import List, Optional
-from sqlalchemy.orm import Session
+from datetime import date, datetime, timezone
+from typing import Callable, Dict, List, Optional
+from sqlalchemy import Integer, and_, case, cast, delete, func, insert, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, joinedload, selectinload
 from fastapi import HTTPException, status
 from models import database as db_models
-from models.schemas import ProductCreate, ProductUpdate, OrderCreate, UserCreate
+from models.schemas import ProductCreate, ProductUpdate, ProductVariantBase, OrderBase, OrderCreate, UserCreate
+from models.schemas import CartItem, OrderItemCreate
+from models.schemas import Product as ProductSchema
+from core.cache import SharedCache
+from core.database import database_is_async, pin_primary, read_from_replica, read_only
+from core.responses import SnapshotList
 from core.security import get_password_hash
-from core.utils import calculate_tax, calculate_total
+from core.utils import calculate_shipping, calculate_tax, calculate_total, decode_cursor
+from services.jobs import enqueue
+from services.search import search_index
+from app.config import settings
+
+# Catalog reads are served from snapshots; entries are tagged with the product ids
+# they contain plus the listing scope, so writes only drop what they can affect.
+catalog_cache = SharedCache(
+    maxsize=settings.catalog_cache_size,
+    ttl=settings.catalog_cache_ttl_seconds,
+    name="catalog",
+)
+
+# (price in cents, is_active) per product id, for cart updates; dropped on product writes
+price_cache = SharedCache(
+    maxsize=settings.price_cache_size,
+    ttl=settings.catalog_cache_ttl_seconds,
+    name="prices",
+)
+
+# Called with the session and the flushed order just before an order commits
+BeforeCommit = Callable[[Session, db_models.Order], None]
+
+_MEMBERSHIP_FIELDS = {"is_active", "is_featured", "category_id"}
+# Fields that can move a product in or out of a size/color/price filtered listing
+_FILTER_FIELDS = {"price", "sizes", "colors", "stock_quantity"}
+
+def _product_tag(product_id: int) -> str:
+    return f"product:{product_id}"
+
+def _list_scope_tag(category_id: Optional[int]) -> str:
+    return f"products:category:{category_id}" if category_id else "products:all"
+
+def _json_list(value: Optional[str]) -> List[str]:
+    try:
+        items = json.loads(value) if value else []
+    except (TypeError, ValueError):
+        return []
+    return [str(item) for item in items] if isinstance(items, list) else []
+
+def split_variant_stock(sizes: Optional[str], colors: Optional[str], total_stock: int) -> List[dict]:
+    """Variant rows for every size/color combination, spreading total_stock as evenly as possible."""
+    combos = [(size, color) for size in _json_list(sizes) for color in _json_list(colors)]
+    if not combos:
+        return []
+    share, remainder = divmod(max(total_stock or 0, 0), len(combos))
+    return [
+        {"size": size, "color": color, "stock_quantity": share + (1 if i < remainder else 0)}
+        for i, (size, color) in enumerate(combos)
+    ]
+
+def _snapshot_list(products: List[db_models.Product]) -> List[ProductSchema]:
+    # SnapshotList keeps the rendered JSON next to the cached snapshots, so it is dropped with them
+    return SnapshotList(ProductSchema.model_validate(p) for p in products)
+
+def _loading_strategy(strategy: Optional[str]) -> str:
+    strategy = strategy or settings.orm_loading_strategy
+    if strategy == "lazy" and database_is_async:
+        # Lazy loads cannot run once an AsyncSession has handed the objects back
+        return "selectin"
+    return strategy
+
+def product_load_options(strategy: Optional[str] = None) -> list:
+    """Loader options so Product.category and Product.variants are fetched with the products, not per row."""
+    strategy = _loading_strategy(strategy)
+    if strategy == "joined":
+        return [joinedload(db_models.Product.category), joinedload(db_models.Product.variants)]
+    if strategy == "selectin":
+        return [selectinload(db_models.Product.category), selectinload(db_models.Product.variants)]
+    return []
+
+def order_load_options(strategy: Optional[str] = None) -> list:
+    """Loader options for the Order -> OrderItem -> Product -> Category/variants tree the Order schema nests."""
+    strategy = _loading_strategy(strategy)
+    if strategy == "joined":
+        return [joinedload(db_models.Order.order_items)
+                .joinedload(db_models.OrderItem.product)
+                .options(joinedload(db_models.Product.category), joinedload(db_models.Product.variants))]
+    if strategy == "selectin":
+        return [selectinload(db_models.Order.order_items)
+                .selectinload(db_models.OrderItem.product)
+                .options(selectinload(db_models.Product.category), selectinload(db_models.Product.variants))]
+    return []
+
+def _apply_product_filters(
+    query,
+    category_id: Optional[int] = None,
+    size: Optional[str] = None,
+    color: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None
+):
+    """Restrict a Product query; size/color match products with that variant in stock."""
+    if category_id:
+        query = query.filter(db_models.Product.category_id == category_id)
+    if min_price is not None:
+        query = query.filter(db_models.Product.price >= min_price)
+    if max_price is not None:
+        query = query.filter(db_models.Product.price <= max_price)
+    if size or color:
+        in_stock = select(db_models.ProductVariant.id).where(
+            db_models.ProductVariant.product_id == db_models.Product.id,
+            db_models.ProductVariant.stock_quantity > 0,
+        )
+        if size:
+            in_stock = in_stock.where(db_models.ProductVariant.size == size)
+        if color:
+            in_stock = in_stock.where(db_models.ProductVariant.color == color)
+        query = query.filter(in_stock.exists())
+    return query
+
+def _variant_facet(db: Session, column, other_column, other_value: Optional[str], **filters) -> List[dict]:
+    """Products with an in-stock variant per value of column, honouring the other dimension's filter."""
+    query = db.query(column, func.count(func.distinct(db_models.ProductVariant.product_id))).join(
+        db_models.Product, db_models.Product.id == db_models.ProductVariant.product_id
+    ).filter(
+        db_models.Product.is_active == True,
+        db_models.ProductVariant.stock_quantity > 0
+    )
+    if other_value:
+        query = query.filter(other_column == other_value)
+    rows = _apply_product_filters(query, **filters).group_by(column).all()
+    return [{"value": value, "count": count} for value, count in sorted(rows, key=lambda row: _facet_sort_key(row[0]))]
+
+def _facet_sort_key(value: str):
+    # Numeric sizes sort numerically ("9.5" before "10"), everything else alphabetically
+    try:
+        return (0, float(value), "")
+    except ValueError:
+        return (1, 0.0, value)
+
+def _apply_keyset(query, model, cursor: Optional[str], descending: bool = False):
+    """Order by (created_at, id) and, given a cursor, continue after the row it points at."""
+    if descending:
+        query = query.order_by(model.created_at.desc(), model.id.desc())
+    else:
+        query = query.order_by(model.created_at, model.id)
+    if not cursor:
+        return query
+    
+    try:
+        created_at, last_id = decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+    # Compare against the anchor row's stored value so timestamp formatting never matters;
+    # the value carried in the cursor is only a fallback for rows that no longer exist.
+    anchor = func.coalesce(
+        select(model.created_at).where(model.id == last_id).scalar_subquery(),
+        created_at,
+    )
+    if descending:
+        return query.filter(or_(model.created_at < anchor, and_(model.created_at == anchor, model.id < last_id)))
+    return query.filter(or_(model.created_at > anchor, and_(model.created_at == anchor, model.id > last_id)))
+
+def _apply_best_selling(query, cursor: Optional[str]):
+    """Order products by units sold from the sales rollup, then id; a cursor continues after its row."""
+    totals = db_models.ProductSalesTotal
+    units = func.coalesce(totals.units, 0)
+    query = query.outerjoin(totals, totals.product_id == db_models.Product.id).order_by(
+        units.desc(), db_models.Product.id
+    )
+    if not cursor:
+        return query
+    
+    try:
+        _, last_id = decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+    # Like _apply_keyset, the anchor is the row's current position, not one carried in the cursor
+    anchor = func.coalesce(select(totals.units).where(totals.product_id == last_id).scalar_subquery(), 0)
+    return query.filter(or_(units < anchor, and_(units == anchor, db_models.Product.id > last_id)))
+
+def invalidate_catalog(
+    product_ids=(), category_ids=(), featured: bool = False, filtered: bool = False, pin: bool = True
+) -> None:
+    """Drop cached catalog entries affected by a write to the given products.
+
+    pin=False leaves catalog reads on the replicas, for writes as frequent as
+    orders; entries filled from a replica meanwhile expire within the lag window.
+    """
+    tags = [_product_tag(pid) for pid in product_ids]
+    if category_ids:
+        tags.append(_list_scope_tag(None))
+        tags.extend(_list_scope_tag(cid) for cid in category_ids if cid)
+    if featured:
+        tags.append("products:featured")
+    if category_ids or filtered:
+        # Filtered listings and facet counts can gain products, not only lose them
+        tags.extend(["products:filtered", "products:facets"])
+    catalog_cache.invalidate_tags(tags)
+    if pin:
+        # Until the replicas have the write, a cache miss filled from one would cache the old rows
+        pin_primary("catalog")
+
+def invalidate_whole_catalog() -> None:
+    """Drop every cached catalog entry, e.g. after a bulk import touched an unknown set of products."""
+    catalog_cache.clear()
+    price_cache.clear()
+    pin_primary("catalog")
+
+_SALES_COUNTERS = ["units", "revenue", "order_count"]
+
+def _upsert_counters(db: Session, model, rows: List[dict], key: List[str]) -> None:
+    """Insert rollup rows, or add their counters onto the existing rows with the same key."""
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        stmt = (sqlite_insert if dialect == "sqlite" else postgresql_insert)(model)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=key,
+            set_={column: getattr(model, column) + getattr(stmt.excluded, column) for column in _SALES_COUNTERS},
+        )
+        db.execute(stmt, rows)
+        return
+    for row in rows:
+        result = db.execute(
+            update(model)
+            .where(*(getattr(model, column) == row[column] for column in key))
+            .values({column: getattr(model, column) + row[column] for column in _SALES_COUNTERS})
+        )
+        if result.rowcount == 0:
+            db.execute(insert(model).values(**row))
+
+def _record_sales(db: Session, products: Dict[int, db_models.Product], order_items: List[dict]) -> None:
+    """Add a checkout's line items to the sales rollups as part of the checkout transaction."""
+    sold: Dict[int, List] = {}
+    for item in order_items:
+        units_revenue = sold.setdefault(item["product_id"], [0, 0.0])
+        units_revenue[0] += item["quantity"]
+        units_revenue[1] += item["total_price"]
+    # Product id order, so concurrent checkouts lock rollup rows in the same order
+    totals = [
+        {"product_id": product_id, "units": units, "revenue": revenue, "order_count": 1}
+        for product_id, (units, revenue) in sorted(sold.items())
+    ]
+    day = datetime.now(timezone.utc).date()
+    _upsert_counters(db, db_models.SalesDaily, [
+        {"day": day, "category_id": products[row["product_id"]].category_id, **row} for row in totals
+    ], key=["day", "product_id"])
+    _upsert_counters(db, db_models.ProductSalesTotal, totals, key=["product_id"])
+
+def _variant_for_item(variants: dict, product_name: str, item) -> db_models.ProductVariant:
+    """The variant an item of a product sold in sizes/colors refers to, from {(product_id, size, color): variant}."""
+    if not item.size or not item.color:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Select a size and color for product {product_name}"
+        )
+    variant = variants.get((item.product_id, item.size, item.color))
+    if variant is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Product {product_name} is not available in size {item.size} and color {item.color}"
+        )
+    return variant
+
+def _fill_ttl(db: Session) -> Optional[float]:
+    """TTL for a catalog entry read through db; None keeps the cache's own."""
+    # Orders change stock without pinning the catalog, so a replica may not have the latest one yet
+    if read_from_replica(db):
+        return min(settings.replica_lag_seconds, catalog_cache.ttl)
+    return None
+
+def _cents(amount: float) -> int:
+    return int(round(amount * 100))
+
+def _product_price(db: Session, product_id: int) -> Optional[int]:
+    """Current price in cents of an active product, or None."""
+    cached = price_cache.get(product_id)
+    if cached is None:
+        row = db.query(db_models.Product.price, db_models.Product.is_active).filter(
+            db_models.Product.id == product_id
+        ).first()
+        if row is None:
+            return None
+        cached = (_cents(row.price), bool(row.is_active))
+        price_cache.set(product_id, cached)
+    price_cents, is_active = cached
+    return price_cents if is_active else None
+
+def reprice_carts(db: Session, product_ids) -> None:
+    """Move cart lines for these products to their current price and recompute the affected subtotals."""
+    product_ids = list(product_ids)
+    item, cart = db_models.CartItem, db_models.Cart
+    db.execute(
+        update(item).where(item.product_id.in_(product_ids)).values(
+            unit_price_cents=select(cast(func.round(db_models.Product.price * 100), Integer))
+            .where(db_models.Product.id == item.product_id).scalar_subquery()
+        ).execution_options(synchronize_session=False)
+    )
+    db.execute(
+        update(cart).where(cart.user_id.in_(select(item.user_id).where(item.product_id.in_(product_ids)))).values(
+            subtotal_cents=select(func.coalesce(func.sum(item.quantity * item.unit_price_cents), 0))
+            .where(item.user_id == cart.user_id).scalar_subquery()
+        ).execution_options(synchronize_session=False)
+    )
 
 class UserService:
     @staticmethod
-    def create_user(db: Session, user: UserCreate) -> db_models.User:
+    def create_user(db: Session, user: UserCreate, hashed_password: Optional[str] = None) -> db_models.User:
         # Check if user already exists
         db_user = db.query(db_models.User).filter(db_models.User.email == user.email).first()
         if db_user:
@@ -19,7 +328,8 @@ class UserService:
             )
         
         # Create new user
-        hashed_password = get_password_hash(user.password)
+        if hashed_password is None:
+            hashed_password = get_password_hash(user.password)
         db_user = db_models.User(
             email=user.email,
             hashed_password=hashed_password,
@@ -34,88 +344,402 @@ class UserService:
     @staticmethod
     def get_user_by_email(db: Session, email: str) -> Optional[db_models.User]:
         return db.query(db_models.User).filter(db_models.User.email == email).first()
+    
+    @staticmethod
+    def update_password_hash(db: Session, user: db_models.User, hashed_password: str) -> db_models.User:
+        user.hashed_password = hashed_password
+        db.commit()
+        return user
 
 class ProductService:
     @staticmethod
-    def get_products(db: Session, skip: int = 0, limit: int = 100, category_id: Optional[int] = None) -> List[db_models.Product]:
-        query = db.query(db_models.Product).filter(db_models.Product.is_active == True)
-        if category_id:
-            query = query.filter(db_models.Product.category_id == category_id)
-        return query.offset(skip).limit(limit).all()
+    @read_only("catalog")
+    def get_products(
+        db: Session,
+        skip: int = 0,
+        limit: int = 100,
+        category_id: Optional[int] = None,
+        cursor: Optional[str] = None,
+        size: Optional[str] = None,
+        color: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        sort: str = "newest"
+    ) -> List[ProductSchema]:
+        key = ("products", skip, limit, category_id, cursor, size, color, min_price, max_price, sort)
+        cached = catalog_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        query = db.query(db_models.Product).options(*product_load_options()).filter(
+            db_models.Product.is_active == True
+        )
+        query = _apply_product_filters(query, category_id, size, color, min_price, max_price)
+        if sort == "best_selling":
+            # Ranked from the rollup; the order catches up with new sales as cached pages expire
+            query = _apply_best_selling(query, cursor)
+        else:
+            query = _apply_keyset(query, db_models.Product, cursor)
+        if not cursor:
+            query = query.offset(skip)
+        products = _snapshot_list(query.limit(limit).all())
+        tags = [_list_scope_tag(category_id), *(_product_tag(p.id) for p in products)]
+        if size or color or min_price is not None or max_price is not None:
+            tags.append("products:filtered")
+        catalog_cache.set(key, products, tags=tags, ttl=_fill_ttl(db))
+        return products
+    
+    @staticmethod
+    @read_only("catalog")
+    def get_facets(
+        db: Session,
+        category_id: Optional[int] = None,
+        size: Optional[str] = None,
+        color: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None
+    ) -> dict:
+        """Counts per category, size and color plus the price range; each ignores its own filter."""
+        key = ("facets", category_id, size, color, min_price, max_price)
+        cached = catalog_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        prices = {"min_price": min_price, "max_price": max_price}
+        categories = _apply_product_filters(
+            db.query(db_models.Category.id, db_models.Category.name, func.count(db_models.Product.id))
+            .join(db_models.Product, db_models.Product.category_id == db_models.Category.id)
+            .filter(db_models.Product.is_active == True),
+            size=size, color=color, **prices
+        ).group_by(db_models.Category.id, db_models.Category.name).order_by(db_models.Category.name).all()
+        price_min, price_max = _apply_product_filters(
+            db.query(func.min(db_models.Product.price), func.max(db_models.Product.price))
+            .filter(db_models.Product.is_active == True),
+            category_id=category_id, size=size, color=color
+        ).one()
+        facets = {
+            "categories": [{"id": cid, "name": name, "count": count} for cid, name, count in categories],
+            "sizes": _variant_facet(db, db_models.ProductVariant.size, db_models.ProductVariant.color, color,
+                                    category_id=category_id, **prices),
+            "colors": _variant_facet(db, db_models.ProductVariant.color, db_models.ProductVariant.size, size,
+                                     category_id=category_id, **prices),
+            "price": {"min": price_min, "max": price_max},
+        }
+        catalog_cache.set(key, facets, tags=["products:facets"], ttl=_fill_ttl(db))
+        return facets
     
     @staticmethod
-    def get_product(db: Session, product_id: int) -> Optional[db_models.Product]:
-        return db.query(db_models.Product).filter(
+    @read_only("catalog")
+    def get_product(db: Session, product_id: int) -> Optional[ProductSchema]:
+        key = ("product", product_id)
+        cached = catalog_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        db_product = db.query(db_models.Product).options(*product_load_options()).filter(
             db_models.Product.id == product_id,
             db_models.Product.is_active == True
         ).first()
+        if not db_product:
+            return None
+        product = ProductSchema.model_validate(db_product)
+        catalog_cache.set(key, product, tags=[_product_tag(product_id)], ttl=_fill_ttl(db))
+        return product
     
     @staticmethod
-    def create_product(db: Session, product: ProductCreate) -> db_models.Product:
+    def create_product(db: Session, product: ProductCreate) -> ProductSchema:
         db_product = db_models.Product(**product.dict())
+        db_product.variants = [
+            db_models.ProductVariant(**row)
+            for row in split_variant_stock(product.sizes, product.colors, product.stock_quantity)
+        ]
         db.add(db_product)
+        db.flush()
+        search_index.index_product(db, db_product)
         db.commit()
         db.refresh(db_product)
-        return db_product
+        invalidate_catalog(
+            product_ids=[db_product.id],
+            category_ids=[db_product.category_id],
+            featured=bool(db_product.is_featured),
+            filtered=bool(db_product.variants),
+        )
+        return ProductSchema.model_validate(db_product)
     
     @staticmethod
-    def update_product(db: Session, product_id: int, product_update: ProductUpdate) -> Optional[db_models.Product]:
+    def update_product(db: Session, product_id: int, product_update: ProductUpdate) -> Optional[ProductSchema]:
         db_product = db.query(db_models.Product).filter(db_models.Product.id == product_id).first()
         if not db_product:
             return None
         
+        old_category_id = db_product.category_id
+        was_featured = bool(db_product.is_featured)
         update_data = product_update.dict(exclude_unset=True)
         for field, value in update_data.items():
             setattr(db_product, field, value)
+        if {"sizes", "colors", "stock_quantity"} & update_data.keys():
+            ProductService._sync_variants(db_product, redistribute="stock_quantity" in update_data)
         
+        db.flush()
+        search_index.index_product(db, db_product)
+        if "price" in update_data:
+            reprice_carts(db, [product_id])
         db.commit()
         db.refresh(db_product)
-        return db_product
+        price_cache.delete(product_id)
+        
+        membership_changed = bool(_MEMBERSHIP_FIELDS & update_data.keys())
+        invalidate_catalog(
+            product_ids=[product_id],
+            category_ids=[old_category_id, db_product.category_id] if membership_changed else (),
+            featured=membership_changed and (was_featured or bool(db_product.is_featured)),
+            filtered=bool(_FILTER_FIELDS & update_data.keys()),
+        )
+        return ProductSchema.model_validate(db_product)
     
     @staticmethod
-    def get_featured_products(db: Session, limit: int = 6) -> List[db_models.Product]:
-        return db.query(db_models.Product).filter(
+    def _sync_variants(db_product: db_models.Product, redistribute: bool) -> None:
+        """Match variants to the size/color lists; new combinations start with no stock."""
+        wanted = split_variant_stock(db_product.sizes, db_product.colors, db_product.stock_quantity)
+        existing = {(v.size, v.color): v for v in db_product.variants}
+        wanted_keys = {(row["size"], row["color"]) for row in wanted}
+        for key, variant in existing.items():
+            if key not in wanted_keys:
+                db_product.variants.remove(variant)
+        for row in wanted:
+            variant = existing.get((row["size"], row["color"]))
+            if variant is None:
+                variant = db_models.ProductVariant(size=row["size"], color=row["color"], stock_quantity=0)
+                db_product.variants.append(variant)
+            if redistribute:
+                variant.stock_quantity = row["stock_quantity"]
+        if db_product.variants:
+            db_product.stock_quantity = sum(v.stock_quantity for v in db_product.variants)
+    
+    @staticmethod
+    def update_variant_stock(
+        db: Session, product_id: int, variants: List[ProductVariantBase]
+    ) -> Optional[ProductSchema]:
+        """Set stock for individual size/color combinations; the product total follows."""
+        db_product = db.query(db_models.Product).filter(db_models.Product.id == product_id).first()
+        if not db_product:
+            return None
+        
+        existing = {(v.size, v.color): v for v in db_product.variants}
+        for item in variants:
+            variant = existing.get((item.size, item.color))
+            if variant is None:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Product {db_product.name} has no size {item.size} in {item.color}"
+                )
+            if item.stock_quantity < 0:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Stock quantity cannot be negative"
+                )
+            variant.stock_quantity = item.stock_quantity
+        db_product.stock_quantity = sum(v.stock_quantity for v in db_product.variants)
+        # Stock moved between variants leaves the product row as it was; its ETag follows updated_at
+        db_product.updated_at = db_models.utcnow()
+        db.commit()
+        db.refresh(db_product)
+        invalidate_catalog(product_ids=[product_id], filtered=True)
+        return ProductSchema.model_validate(db_product)
+    
+    @staticmethod
+    @read_only("catalog")
+    def get_featured_products(db: Session, limit: int = 6) -> List[ProductSchema]:
+        key = ("featured", limit)
+        cached = catalog_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        products = _snapshot_list(db.query(db_models.Product).options(*product_load_options()).filter(
             db_models.Product.is_featured == True,
             db_models.Product.is_active == True
-        ).limit(limit).all()
+        ).limit(limit).all())
+        catalog_cache.set(
+            key, products, tags=["products:featured", *(_product_tag(p.id) for p in products)], ttl=_fill_ttl(db)
+        )
+        return products
+    
+    @staticmethod
+    def search_products(db: Session, q: str, limit: int = 20, offset: int = 0) -> List[ProductSchema]:
+        hits = search_index.search(db, q, limit=limit, offset=offset)
+        if not hits:
+            return []
+        ids = [product_id for product_id, _ in hits]
+        products = {
+            p.id: p
+            for p in db.query(db_models.Product).options(*product_load_options()).filter(
+                db_models.Product.id.in_(ids),
+                db_models.Product.is_active == True
+            )
+        }
+        return [ProductSchema.model_validate(products[pid]) for pid in ids if pid in products]
+    
+    @staticmethod
+    def get_cache_stats() -> dict:
+        return catalog_cache.stats()
 
 class OrderService:
     @staticmethod
-    def create_order(db: Session, order: OrderCreate, user_id: int) -> db_models.Order:
-        # Calculate order totals
-        subtotal = 0.0
-        order_items = []
-        
+    def create_order(
+        db: Session, order: OrderCreate, user_id: int, before_commit: Optional[BeforeCommit] = None
+    ) -> db_models.Order:
+        """Place and commit an order.
+
+        before_commit(db, order) runs inside the order's transaction, e.g. to
+        record the idempotent response so that it commits together with the order.
+        """
+        db_order, product_ids, sold_out = OrderService.place_order(db, order, user_id)
+        OrderService._before_commit(db, db_order, before_commit)
+        db.commit()
+        # Stock levels are part of the cached product payloads; a variant selling out
+        # also changes size/color filter results and facet counts
+        invalidate_catalog(product_ids=product_ids, filtered=sold_out, pin=False)
+        return OrderService.reload_order(db, db_order.id)
+    
+    @staticmethod
+    def _before_commit(db: Session, db_order: db_models.Order, hook: Optional[BeforeCommit]) -> None:
+        if hook is not None:
+            db.flush()
+            hook(db, OrderService.reload_order(db, db_order.id))
+
+    @staticmethod
+    def reload_order(db: Session, order_id: int) -> db_models.Order:
+        return db.query(db_models.Order).options(*order_load_options()).populate_existing().filter(
+            db_models.Order.id == order_id
+        ).one()
+    
+    @staticmethod
+    def place_order(db: Session, order: OrderCreate, user_id: int):
+        """Reserve stock and write the order without committing.
+
+        Returns the order, the ids of the products it took stock from and
+        whether any variant sold out, for the caller's cache invalidation.
+        """
+        requested = {}
         for item in order.items:
-            product = db.query(db_models.Product).filter(db_models.Product.id == item.product_id).first()
+            if item.quantity < 1:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Item quantity must be at least 1"
+                )
+            requested[item.product_id] = requested.get(item.product_id, 0) + item.quantity
+        if not requested:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Order has no items"
+            )
+        
+        # One round trip for every referenced product. Rows are locked in id order so
+        # concurrent checkouts cannot deadlock; dialects without FOR UPDATE (SQLite)
+        # simply omit the clause and rely on the conditional decrement below.
+        products = {
+            product.id: product
+            for product in db.query(db_models.Product)
+            .filter(db_models.Product.id.in_(requested))
+            .order_by(db_models.Product.id)
+            .with_for_update()
+        }
+        for product_id, quantity in requested.items():
+            product = products.get(product_id)
             if not product:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
-                    detail=f"Product with id {item.product_id} not found"
+                    detail=f"Product with id {product_id} not found"
                 )
-            
-            if product.stock_quantity < item.quantity:
+            if product.stock_quantity < quantity:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail=f"Insufficient stock for product {product.name}"
                 )
-            
-            item_total = product.price * item.quantity
+        
+        # Products sold in sizes/colors are stocked per variant: the exact combination
+        # being bought has to exist and have enough units.
+        variants = {
+            (variant.product_id, variant.size, variant.color): variant
+            for variant in db.query(db_models.ProductVariant)
+            .filter(db_models.ProductVariant.product_id.in_(requested))
+            .order_by(db_models.ProductVariant.id)
+            .with_for_update()
+        }
+        variant_products = {product_id for product_id, _, _ in variants}
+        requested_variants: Dict[int, int] = {}
+        for item in order.items:
+            if item.product_id not in variant_products:
+                continue
+            variant = _variant_for_item(variants, products[item.product_id].name, item)
+            requested_variants[variant.id] = requested_variants.get(variant.id, 0) + item.quantity
+        for variant in variants.values():
+            quantity = requested_variants.get(variant.id)
+            if quantity and variant.stock_quantity < quantity:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Insufficient stock for product {products[variant.product_id].name} "
+                           f"in size {variant.size} and color {variant.color}"
+                )
+        
+        # Calculate order totals
+        subtotal = 0.0
+        order_items = []
+        for item in order.items:
+            unit_price = products[item.product_id].price
+            item_total = unit_price * item.quantity
             subtotal += item_total
-            
             order_items.append({
                 "product_id": item.product_id,
                 "quantity": item.quantity,
                 "size": item.size,
                 "color": item.color,
-                "unit_price": product.price,
+                "unit_price": unit_price,
                 "total_price": item_total
             })
         
         tax_amount = calculate_tax(subtotal)
-        shipping_amount = 10.0 if subtotal < 100 else 0.0  # Free shipping over $100
+        shipping_amount = calculate_shipping(subtotal)
         total_amount = calculate_total(subtotal, shipping=shipping_amount)
         
+        # Decrement stock for all products in a single conditional UPDATE; if any row
+        # lost a race for the remaining stock, fewer rows match and nothing is sold.
+        decrement = case(requested, value=db_models.Product.id)
+        result = db.execute(
+            update(db_models.Product)
+            .where(db_models.Product.id.in_(requested), db_models.Product.stock_quantity >= decrement)
+            .values(stock_quantity=db_models.Product.stock_quantity - decrement)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != len(requested):
+            db.rollback()
+            short = db.query(db_models.Product.name).filter(
+                db_models.Product.id.in_(requested),
+                db_models.Product.stock_quantity < case(requested, value=db_models.Product.id)
+            ).first()
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Insufficient stock for product {short.name if short else 'in order'}"
+            )
+        if requested_variants:
+            decrement = case(requested_variants, value=db_models.ProductVariant.id)
+            result = db.execute(
+                update(db_models.ProductVariant)
+                .where(db_models.ProductVariant.id.in_(requested_variants),
+                       db_models.ProductVariant.stock_quantity >= decrement)
+                .values(stock_quantity=db_models.ProductVariant.stock_quantity - decrement)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount != len(requested_variants):
+                db.rollback()
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Insufficient stock for a size or color in order"
+                )
+        sold_out = any(
+            variant.stock_quantity == requested_variants.get(variant.id) for variant in variants.values()
+        )
+        
         # Create order
         db_order = db_models.Order(
             user_id=user_id,
@@ -129,37 +753,208 @@ class OrderService:
         db.add(db_order)
         db.flush()  # Get order ID
         
-        # Create order items
-        for item_data in order_items:
-            db_order_item = db_models.OrderItem(
-                order_id=db_order.id,
-                **item_data
-            )
-            db.add(db_order_item)
-            
-            # Update product stock
-            product = db.query(db_models.Product).filter(
-                db_models.Product.id == item_data["product_id"]
-            ).first()
-            product.stock_quantity -= item_data["quantity"]
-        
-        db.commit()
-        db.refresh(db_order)
-        return db_order
+        # Create order items in one bulk INSERT
+        db.execute(insert(db_models.OrderItem), [
+            {"order_id": db_order.id, **item_data} for item_data in order_items
+        ])
+        _record_sales(db, products, order_items)
+        # Confirmation and stock alerts run after the commit, on a job worker
+        enqueue(db, "order.placed", {"order_id": db_order.id})
+        return db_order, list(requested), sold_out
     
     @staticmethod
-    def get_user_orders(db: Session, user_id: int) -> List[db_models.Order]:
-        return db.query(db_models.Order).filter(db_models.Order.user_id == user_id).all()
+    @read_only("orders")
+    def get_user_orders(
+        db: Session,
+        user_id: int,
+        skip: int = 0,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None
+    ) -> List[db_models.Order]:
+        query = db.query(db_models.Order).options(*order_load_options()).filter(
+            db_models.Order.user_id == user_id
+        )
+        # Newest orders first
+        query = _apply_keyset(query, db_models.Order, cursor, descending=True)
+        if not cursor:
+            query = query.offset(skip)
+        if limit is not None:
+            query = query.limit(limit)
+        return query.all()
     
     @staticmethod
+    @read_only("orders")
     def get_order(db: Session, order_id: int, user_id: Optional[int] = None) -> Optional[db_models.Order]:
-        query = db.query(db_models.Order).filter(db_models.Order.id == order_id)
+        query = db.query(db_models.Order).options(*order_load_options()).filter(db_models.Order.id == order_id)
         if user_id:
             query = query.filter(db_models.Order.user_id == user_id)
         return query.first()
 
+def _adjust_cart(db: Session, user_id: int, subtotal_cents: int, items: int) -> None:
+    cart = db_models.Cart
+    result = db.execute(
+        update(cart).where(cart.user_id == user_id).values(
+            subtotal_cents=cart.subtotal_cents + subtotal_cents, item_count=cart.item_count + items
+        ).execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        db.execute(insert(cart).values(user_id=user_id, subtotal_cents=subtotal_cents, item_count=items))
+
+def _cart_line(db: Session, user_id: int, item_id: int) -> Optional[db_models.CartItem]:
+    return db.query(db_models.CartItem).filter(
+        db_models.CartItem.id == item_id, db_models.CartItem.user_id == user_id
+    ).first()
+
+class CartService:
+    """Per-user carts whose totals are adjusted by each change instead of being recomputed."""
+
+    @staticmethod
+    def get_cart(db: Session, user_id: int) -> dict:
+        cart = db.get(db_models.Cart, user_id, populate_existing=True)
+        lines = db.query(db_models.CartItem).filter(db_models.CartItem.user_id == user_id).order_by(
+            db_models.CartItem.id
+        ).all()
+        subtotal = cart.subtotal_cents / 100 if cart else 0.0
+        shipping_amount = calculate_shipping(subtotal) if lines else 0.0
+        return {
+            "items": [
+                {"id": line.id, "product_id": line.product_id, "quantity": line.quantity, "size": line.size,
+                 "color": line.color, "unit_price": line.unit_price_cents / 100,
+                 "total_price": line.unit_price_cents * line.quantity / 100}
+                for line in lines
+            ],
+            "item_count": cart.item_count if cart else 0,
+            "subtotal": subtotal,
+            "tax_amount": calculate_tax(subtotal),
+            "shipping_amount": shipping_amount,
+            "total_amount": calculate_total(subtotal, shipping=shipping_amount),
+        }
+    
+    @staticmethod
+    def add_item(db: Session, user_id: int, item: CartItem) -> dict:
+        if item.quantity < 1:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Item quantity must be at least 1"
+            )
+        price_cents = _product_price(db, item.product_id)
+        if price_cents is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Product with id {item.product_id} not found"
+            )
+        line = db.query(db_models.CartItem).filter(
+            db_models.CartItem.user_id == user_id,
+            db_models.CartItem.product_id == item.product_id,
+            db_models.CartItem.size.is_not_distinct_from(item.size),
+            db_models.CartItem.color.is_not_distinct_from(item.color),
+        ).first()
+        CartService._check_item(db, item, item.quantity + (line.quantity if line is not None else 0))
+        if line is not None:
+            # Priced like the rest of the line so the subtotal stays the sum of its lines
+            _adjust_cart(db, user_id, line.unit_price_cents * item.quantity, item.quantity)
+            db.execute(
+                update(db_models.CartItem).where(db_models.CartItem.id == line.id)
+                .values(quantity=db_models.CartItem.quantity + item.quantity)
+                .execution_options(synchronize_session=False)
+            )
+        else:
+            _adjust_cart(db, user_id, price_cents * item.quantity, item.quantity)
+            db.add(db_models.CartItem(
+                user_id=user_id, product_id=item.product_id, size=item.size, color=item.color,
+                quantity=item.quantity, unit_price_cents=price_cents,
+            ))
+        db.commit()
+        return CartService.get_cart(db, user_id)
+    
+    @staticmethod
+    def _check_item(db: Session, item, quantity: int) -> None:
+        """Reject a line checkout would reject: a missing or unknown size/color, or more than is in stock."""
+        product = db.query(db_models.Product.name, db_models.Product.stock_quantity).filter(
+            db_models.Product.id == item.product_id
+        ).one()
+        variants = {
+            (variant.product_id, variant.size, variant.color): variant
+            for variant in db.query(db_models.ProductVariant).filter(
+                db_models.ProductVariant.product_id == item.product_id
+            )
+        }
+        if variants:
+            variant = _variant_for_item(variants, product.name, item)
+            if variant.stock_quantity < quantity:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Insufficient stock for product {product.name} "
+                           f"in size {variant.size} and color {variant.color}"
+                )
+        if product.stock_quantity < quantity:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Insufficient stock for product {product.name}"
+            )
+    
+    @staticmethod
+    def set_quantity(db: Session, user_id: int, item_id: int, quantity: int) -> Optional[dict]:
+        line = _cart_line(db, user_id, item_id)
+        if line is None:
+            return None
+        if quantity <= 0:
+            return CartService.remove_item(db, user_id, item_id)
+        CartService._check_item(db, line, quantity)
+        _adjust_cart(db, user_id, line.unit_price_cents * (quantity - line.quantity), quantity - line.quantity)
+        line.quantity = quantity
+        db.commit()
+        return CartService.get_cart(db, user_id)
+    
+    @staticmethod
+    def remove_item(db: Session, user_id: int, item_id: int) -> Optional[dict]:
+        line = _cart_line(db, user_id, item_id)
+        if line is None:
+            return None
+        _adjust_cart(db, user_id, -line.unit_price_cents * line.quantity, -line.quantity)
+        db.delete(line)
+        db.commit()
+        return CartService.get_cart(db, user_id)
+    
+    @staticmethod
+    def clear(db: Session, user_id: int) -> dict:
+        db.query(db_models.CartItem).filter(db_models.CartItem.user_id == user_id).delete(synchronize_session=False)
+        db.query(db_models.Cart).filter(db_models.Cart.user_id == user_id).delete(synchronize_session=False)
+        db.commit()
+        return CartService.get_cart(db, user_id)
+    
+    @staticmethod
+    def checkout(
+        db: Session, user_id: int, details: OrderBase, before_commit: Optional[BeforeCommit] = None
+    ) -> db_models.Order:
+        """Turn the cart into an order and empty it, in one transaction; before_commit as for create_order."""
+        lines = db.query(db_models.CartItem).filter(db_models.CartItem.user_id == user_id).order_by(
+            db_models.CartItem.id
+        ).all()
+        if not lines:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cart is empty"
+            )
+        order = OrderCreate(
+            items=[
+                OrderItemCreate(product_id=line.product_id, quantity=line.quantity, size=line.size, color=line.color)
+                for line in lines
+            ],
+            shipping_address=details.shipping_address,
+            billing_address=details.billing_address,
+        )
+        db_order, product_ids, sold_out = OrderService.place_order(db, order, user_id)
+        db.query(db_models.CartItem).filter(db_models.CartItem.user_id == user_id).delete(synchronize_session=False)
+        db.query(db_models.Cart).filter(db_models.Cart.user_id == user_id).delete(synchronize_session=False)
+        OrderService._before_commit(db, db_order, before_commit)
+        db.commit()
+        invalidate_catalog(product_ids=product_ids, filtered=sold_out, pin=False)
+        return OrderService.reload_order(db, db_order.id)
+
 class CategoryService:
     @staticmethod
+    @read_only("catalog")
     def get_categories(db: Session) -> List[db_models.Category]:
         return db.query(db_models.Category).all()
     
@@ -169,4 +964,96 @@ class CategoryService:
         db.add(db_category)
         db.commit()
         db.refresh(db_category)
-        return db_category
\ No newline at end of file
+        pin_primary("catalog")
+        return db_category
+
+def _day_range(query, start: Optional[date], end: Optional[date]):
+    if start is not None:
+        query = query.filter(db_models.SalesDaily.day >= start)
+    if end is not None:
+        query = query.filter(db_models.SalesDaily.day <= end)
+    return query
+
+class AnalyticsService:
+    """Sales reports served from the sales_daily/product_sales_totals rollups, never from order_items."""
+
+    @staticmethod
+    @read_only("analytics")
+    def get_daily_sales(db: Session, start: Optional[date] = None, end: Optional[date] = None) -> List[dict]:
+        daily = db_models.SalesDaily
+        rows = _day_range(
+            db.query(daily.day, func.sum(daily.units), func.sum(daily.revenue)), start, end
+        ).group_by(daily.day).order_by(daily.day).all()
+        return [{"day": day, "units": units, "revenue": round(revenue, 2)} for day, units, revenue in rows]
+    
+    @staticmethod
+    @read_only("analytics")
+    def get_top_products(
+        db: Session, start: Optional[date] = None, end: Optional[date] = None, limit: int = 10
+    ) -> List[dict]:
+        if start is None and end is None:
+            totals = db_models.ProductSalesTotal
+            query = db.query(totals.product_id, totals.units, totals.revenue, totals.order_count).order_by(
+                totals.units.desc(), totals.product_id
+            )
+        else:
+            daily = db_models.SalesDaily
+            units = func.sum(daily.units)
+            query = _day_range(
+                db.query(daily.product_id, units, func.sum(daily.revenue), func.sum(daily.order_count)), start, end
+            ).group_by(daily.product_id).order_by(units.desc(), daily.product_id)
+        rows = query.limit(limit).all()
+        names = dict(
+            db.query(db_models.Product.id, db_models.Product.name)
+            .filter(db_models.Product.id.in_([row[0] for row in rows]))
+        )
+        return [
+            {"product_id": product_id, "name": names.get(product_id), "units": units,
+             "revenue": round(revenue, 2), "orders": orders}
+            for product_id, units, revenue, orders in rows
+        ]
+    
+    @staticmethod
+    @read_only("analytics")
+    def get_category_sales(db: Session, start: Optional[date] = None, end: Optional[date] = None) -> List[dict]:
+        daily = db_models.SalesDaily
+        revenue = func.sum(daily.revenue)
+        rows = _day_range(
+            db.query(daily.category_id, db_models.Category.name, func.sum(daily.units), revenue)
+            .outerjoin(db_models.Category, db_models.Category.id == daily.category_id), start, end
+        ).group_by(daily.category_id, db_models.Category.name).order_by(revenue.desc()).all()
+        return [
+            {"category_id": category_id, "name": name, "units": units, "revenue": round(total, 2)}
+            for category_id, name, units, total in rows
+        ]
+    
+    @staticmethod
+    def rebuild_rollups(db: Session) -> dict:
+        """Recompute both rollups from orders and order_items, e.g. after editing orders by hand."""
+        daily, totals = db_models.SalesDaily, db_models.ProductSalesTotal
+        Order, OrderItem = db_models.Order, db_models.OrderItem
+        day = func.date(Order.created_at)
+        db.execute(delete(daily))
+        db.execute(delete(totals))
+        db.execute(insert(daily).from_select(
+            ["day", "product_id", "category_id", "units", "revenue", "order_count"],
+            select(
+                day, OrderItem.product_id, db_models.Product.category_id, func.sum(OrderItem.quantity),
+                func.sum(OrderItem.total_price), func.count(func.distinct(OrderItem.order_id)),
+            )
+            .join(Order, Order.id == OrderItem.order_id)
+            .outerjoin(db_models.Product, db_models.Product.id == OrderItem.product_id)
+            .where(Order.status != "cancelled", OrderItem.product_id.isnot(None))
+            .group_by(day, OrderItem.product_id, db_models.Product.category_id)
+        ))
+        # Every order falls on one day, so per-day order counts add up exactly
+        db.execute(insert(totals).from_select(
+            ["product_id", "units", "revenue", "order_count"],
+            select(daily.product_id, func.sum(daily.units), func.sum(daily.revenue), func.sum(daily.order_count))
+            .group_by(daily.product_id)
+        ))
+        db.commit()
+        return {
+            "sales_daily": db.scalar(select(func.count()).select_from(daily)),
+            "product_sales_totals": db.scalar(select(func.count()).select_from(totals)),
+        }
@@ -0,0 +1,266 @@
+"""Streaming bulk import of product feeds.
+
+Feeds are CSV (with a header row) or JSON Lines, one product per record, keyed
+on the product name. Records are read lazily and applied in chunks: each chunk
+costs one lookup query, one multi-row INSERT for new products, one bulk UPDATE
+for existing ones and a variant rebuild, and is committed on its own. Memory
+therefore stays flat no matter how long the feed is.
+
+Recognised fields: name, description, price, original_price, image_url,
+category (name) or category_id, sizes, colors, stock_quantity, is_featured,
+is_active. sizes/colors take a JSON array or a "|"-separated list. Fields
+missing from a record keep their stored value when the product exists.
+"""
+import csv
+import json
+import time
+from typing import Callable, Dict, Iterable, Iterator, Optional, TextIO, Tuple
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.orm import Session
+from models import database as db_models
+from services.business import invalidate_whole_catalog, reprice_carts, split_variant_stock
+from services.search import search_index
+
+FORMATS = ("csv", "jsonl")
+# Updated fields that change a product's search document; the name is the import key
+_SEARCH_FIELDS = {"description", "category_id", "is_active"}
+MAX_REPORTED_ERRORS = 50
+
+_NEW_PRODUCT_DEFAULTS = {
+    "description": None, "original_price": None, "image_url": None, "category_id": None,
+    "sizes": None, "colors": None, "stock_quantity": 0, "is_featured": False, "is_active": True,
+}
+
+class RecordError(ValueError):
+    """A record that cannot be imported; reported and skipped."""
+
+def detect_format(filename: Optional[str]) -> str:
+    if filename and filename.lower().endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    return "csv"
+
+def iter_records(stream: TextIO, fmt: str) -> Iterator[Tuple[int, dict]]:
+    """(line number, raw record) pairs, read lazily from a text stream."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            record = e
+        yield line_number, record
+
+def _text(value) -> Optional[str]:
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+def _number(value, field: str, cast=float):
+    if value is None or value == "":
+        return None
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        raise RecordError(f"{field} must be a number, got {value!r}")
+
+def _flag(value) -> Optional[bool]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "yes", "y")
+
+def _string_list(value, field: str) -> Optional[str]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        if value.startswith("["):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                raise RecordError(f"{field} is not a valid JSON array")
+        else:
+            value = [part.strip() for part in value.split("|") if part.strip()]
+    if not isinstance(value, list):
+        raise RecordError(f"{field} must be a list")
+    return json.dumps([str(item) for item in value])
+
+class CatalogImporter:
+    """Applies product records to the catalog in chunks; see the module docstring."""
+
+    def __init__(self, db: Session, chunk_size: int = 1000, create_categories: bool = True,
+                 progress: Optional[Callable[[dict], None]] = None):
+        self.db = db
+        self.chunk_size = chunk_size
+        self.create_categories = create_categories
+        self.progress = progress
+        self.categories: Dict[str, int] = {
+            name.casefold(): category_id
+            for category_id, name in db.execute(select(db_models.Category.id, db_models.Category.name))
+        }
+        self.category_ids = set(self.categories.values())
+        self.summary = {
+            "rows": 0, "inserted": 0, "updated": 0, "skipped": 0,
+            "categories_created": 0, "errors": [], "elapsed_seconds": 0.0, "rows_per_second": None,
+        }
+        self._started = time.perf_counter()
+
+    def _category_id(self, record: dict) -> Optional[int]:
+        category_id = _number(record.get("category_id"), "category_id", int)
+        if category_id is not None:
+            if category_id not in self.category_ids:
+                raise RecordError(f"unknown category_id {category_id}")
+            return category_id
+        name = _text(record.get("category"))
+        if name is None:
+            return None
+        key = name.casefold()
+        if key not in self.categories:
+            if not self.create_categories:
+                raise RecordError(f"unknown category {name!r}")
+            category_id = self.db.execute(
+                insert(db_models.Category).values(name=name).returning(db_models.Category.id)
+            ).scalar_one()
+            self.categories[key] = category_id
+            self.category_ids.add(category_id)
+            self.summary["categories_created"] += 1
+        return self.categories[key]
+
+    def _normalize(self, record) -> dict:
+        if isinstance(record, Exception):
+            raise RecordError(f"invalid JSON: {record}")
+        if not isinstance(record, dict):
+            raise RecordError("record must be an object")
+        name = _text(record.get("name"))
+        if name is None:
+            raise RecordError("name is required")
+        row = {
+            "name": name,
+            "description": _text(record.get("description")),
+            "price": _number(record.get("price"), "price"),
+            "original_price": _number(record.get("original_price"), "original_price"),
+            "image_url": _text(record.get("image_url")),
+            "sizes": _string_list(record.get("sizes"), "sizes"),
+            "colors": _string_list(record.get("colors"), "colors"),
+            "stock_quantity": _number(record.get("stock_quantity"), "stock_quantity", int),
+            "is_featured": _flag(record.get("is_featured")),
+            "is_active": _flag(record.get("is_active")),
+        }
+        if "category" in record or "category_id" in record:
+            row["category_id"] = self._category_id(record)
+        if row["price"] is not None and row["price"] < 0:
+            raise RecordError("price cannot be negative")
+        if row["stock_quantity"] is not None and row["stock_quantity"] < 0:
+            raise RecordError("stock_quantity cannot be negative")
+        # Only fields present in the record are written
+        return {field: value for field, value in row.items() if value is not None or field == "category_id"}
+
+    def _error(self, line: int, message: str) -> None:
+        self.summary["skipped"] += 1
+        if len(self.summary["errors"]) < MAX_REPORTED_ERRORS:
+            self.summary["errors"].append({"line": line, "error": message})
+
+    def _apply_chunk(self, chunk: Dict[str, Tuple[int, dict]]) -> None:
+        db = self.db
+        existing = dict(db.execute(
+            select(db_models.Product.name, func.min(db_models.Product.id))
+            .where(db_models.Product.name.in_(list(chunk)))
+            .group_by(db_models.Product.name)
+        ).all())
+
+        new_rows, updates = [], []
+        for name, (line, row) in chunk.items():
+            if name in existing:
+                updates.append({"id": existing[name], **row})
+            elif "price" not in row:
+                self._error(line, "price is required for new products")
+            else:
+                new_rows.append({**_NEW_PRODUCT_DEFAULTS, **row})
+
+        touched = [row["id"] for row in updates if {"sizes", "colors", "stock_quantity"} & row.keys()]
+        reindexed = [row["id"] for row in updates if _SEARCH_FIELDS & row.keys()]
+        if new_rows:
+            inserted = db.execute(
+                insert(db_models.Product).returning(db_models.Product.id, sort_by_parameter_order=True),
+                new_rows,
+            ).scalars().all()
+            touched.extend(product_id for product_id, row in zip(inserted, new_rows) if row["sizes"] and row["colors"])
+            reindexed.extend(inserted)
+            self.summary["inserted"] += len(inserted)
+        if updates:
+            db.execute(update(db_models.Product), updates)
+            self.summary["updated"] += len(updates)
+            repriced = [row["id"] for row in updates if "price" in row]
+            if repriced:
+                reprice_carts(db, repriced)
+        if touched:
+            self._rebuild_variants(touched)
+        if reindexed:
+            # Committed with the chunk, like a single product write
+            search_index.index_products(db, reindexed)
+        db.commit()
+
+    def _rebuild_variants(self, product_ids) -> None:
+        """Regenerate variants from the stored size/color lists, spreading each product's stock."""
+        db = self.db
+        db.execute(delete(db_models.ProductVariant).where(db_models.ProductVariant.product_id.in_(product_ids)))
+        variants = [
+            {"product_id": product_id, **variant}
+            for product_id, sizes, colors, stock_quantity in db.execute(
+                select(db_models.Product.id, db_models.Product.sizes, db_models.Product.colors,
+                       db_models.Product.stock_quantity).where(db_models.Product.id.in_(product_ids))
+            )
+            for variant in split_variant_stock(sizes, colors, stock_quantity)
+        ]
+        if variants:
+            db.execute(insert(db_models.ProductVariant), variants)
+
+    def _timings(self) -> None:
+        elapsed = time.perf_counter() - self._started
+        self.summary["elapsed_seconds"] = round(elapsed, 3)
+        self.summary["rows_per_second"] = round(self.summary["rows"] / elapsed, 1) if elapsed else None
+
+    def _report(self) -> None:
+        self._timings()
+        if self.progress:
+            self.progress({**self.summary, "errors": len(self.summary["errors"])})
+
+    def run(self, records: Iterable[Tuple[int, dict]]) -> dict:
+        chunk: Dict[str, Tuple[int, dict]] = {}
+        for line, record in records:
+            self.summary["rows"] += 1
+            try:
+                row = self._normalize(record)
+            except RecordError as e:
+                self._error(line, str(e))
+                continue
+            # A name repeated within a chunk is one product; the last record wins
+            chunk[row["name"]] = (line, row)
+            if len(chunk) >= self.chunk_size:
+                self._apply_chunk(chunk)
+                chunk = {}
+                self._report()
+        if chunk:
+            self._apply_chunk(chunk)
+        self.db.commit()
+
+        # Cache entries for an unknown set of products are stale
+        invalidate_whole_catalog()
+        self._timings()
+        return self.summary
+
+def import_catalog(db: Session, stream: TextIO, fmt: str, chunk_size: int = 1000, create_categories: bool = True,
+                   progress: Optional[Callable[[dict], None]] = None) -> dict:
+    """Import a CSV or JSONL product feed from a text stream; returns the import summary."""
+    if fmt not in FORMATS:
+        raise ValueError(f"unsupported feed format {fmt!r}")
+    importer = CatalogImporter(db, chunk_size=chunk_size, create_categories=create_categories, progress=progress)
+    return importer.run(iter_records(stream, fmt))
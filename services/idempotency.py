@@ -0,0 +1,215 @@
+"""Idempotency-Key handling for retried POST requests.
+
+The first request with a key claims it by inserting an in_progress row and
+runs the operation, which records its response on the row in the same
+transaction as its own writes; later requests with the same key and body get
+that response replayed without touching the operation again. A duplicate that
+arrives while the first is still running waits for its result: on an
+in-process asyncio future when the first request is in this worker, otherwise
+by polling the row. Operations that fail release their claim so a retry can
+run; a cancelled one keeps it until IDEMPOTENCY_LOCK_TIMEOUT_SECONDS, since its
+transaction may still commit. Rows expire after IDEMPOTENCY_KEY_TTL_SECONDS and
+are purged opportunistically.
+"""
+import asyncio
+import hashlib
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.config import settings
+from core.database import DBSession, run_db
+from models import database as db_models
+
+StoredResponse = Tuple[int, str]
+# Given to the operation: stores its response in the session it is about to commit
+Recorder = Callable[[Session, StoredResponse], None]
+
+PURGE_INTERVAL_SECONDS = 60.0
+_last_purge = 0.0
+
+# Requests currently executing in this worker, by (user_id, key)
+_inflight: Dict[Tuple[int, str], Tuple[str, asyncio.Future]] = {}
+
+def fingerprint(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+class IdempotencyService:
+    @staticmethod
+    def claim(db: Session, user_id: int, key: str, request_fingerprint: str) -> Tuple[str, Optional[StoredResponse]]:
+        """Claim a key for this request.
+
+        Returns ("claimed", None) when the caller should run the operation,
+        ("completed", response) to replay, ("in_progress", None) while another
+        request holds the key, or ("mismatch", None) if the key was used with a
+        different body.
+        """
+        IdempotencyService._purge_if_due(db)
+        model = db_models.IdempotencyKey
+        now = _utcnow()
+        # Insert first: a fresh key, the common case, costs one statement
+        for _ in range(2):
+            db.add(model(
+                user_id=user_id, key=key, fingerprint=request_fingerprint, locked_at=now,
+                expires_at=now + timedelta(seconds=settings.idempotency_key_ttl_seconds),
+            ))
+            try:
+                db.commit()
+                return "claimed", None
+            except IntegrityError:
+                db.rollback()
+            expired = db.query(model).filter(
+                model.user_id == user_id, model.key == key, model.expires_at <= now
+            ).delete(synchronize_session=False)
+            db.commit()
+            if not expired:
+                break
+
+        record = db.query(model).filter(model.user_id == user_id, model.key == key).first()
+        if record is None:
+            # Released between our insert and this read; the caller retries
+            return "in_progress", None
+        if record.fingerprint != request_fingerprint:
+            return "mismatch", None
+        if record.status == "completed":
+            return "completed", (record.response_status, record.response_body)
+        # Take over a claim whose holder died without finishing or releasing it
+        taken = db.query(model).filter(
+            model.id == record.id,
+            model.status == "in_progress",
+            model.locked_at <= now - timedelta(seconds=settings.idempotency_lock_timeout_seconds),
+        ).update({"locked_at": now}, synchronize_session=False)
+        db.commit()
+        return ("claimed" if taken else "in_progress"), None
+
+    @staticmethod
+    def record(db: Session, user_id: int, key: str, response: StoredResponse) -> None:
+        """Mark the key completed with response as part of the caller's transaction, without committing.
+
+        Raises 409 if the claim is gone, i.e. released or completed by a request
+        that took it over, so the caller's transaction rolls back instead.
+        """
+        model = db_models.IdempotencyKey
+        recorded = db.query(model).filter(
+            model.user_id == user_id, model.key == key, model.status == "in_progress"
+        ).update(
+            {"status": "completed", "response_status": response[0], "response_body": response[1]},
+            synchronize_session=False,
+        )
+        if not recorded:
+            raise _still_processing()
+
+    @staticmethod
+    def release(db: Session, user_id: int, key: str) -> None:
+        db.rollback()
+        model = db_models.IdempotencyKey
+        db.query(model).filter(
+            model.user_id == user_id, model.key == key, model.status == "in_progress"
+        ).delete(synchronize_session=False)
+        db.commit()
+
+    @staticmethod
+    def purge_expired(db: Session) -> int:
+        model = db_models.IdempotencyKey
+        purged = db.query(model).filter(model.expires_at <= _utcnow()).delete(synchronize_session=False)
+        db.commit()
+        return purged
+
+    @staticmethod
+    def _purge_if_due(db: Session) -> None:
+        global _last_purge
+        if time.monotonic() - _last_purge >= PURGE_INTERVAL_SECONDS:
+            _last_purge = time.monotonic()
+            IdempotencyService.purge_expired(db)
+
+class _Abandoned(Exception):
+    """The request holding a key stopped without a response; a waiting duplicate runs instead."""
+
+def _key_reused() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        detail="Idempotency-Key was already used with a different request"
+    )
+
+def _still_processing() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="A request with this Idempotency-Key is still being processed",
+        headers={"Retry-After": "1"},
+    )
+
+async def run_idempotent(
+    db: DBSession,
+    user_id: int,
+    key: str,
+    request_fingerprint: str,
+    operation: Callable[[Recorder], Awaitable[None]],
+) -> Tuple[StoredResponse, bool]:
+    """Run operation at most once per (user, key); returns its response and whether it was replayed.
+
+    operation(record) must call record(db, response) in the transaction that
+    commits its work, so the work and the stored response commit together.
+    """
+    scope = (user_id, key)
+    deadline = time.monotonic() + settings.idempotency_wait_seconds
+
+    while scope in _inflight:
+        leader_fingerprint, leader_result = _inflight[scope]
+        if leader_fingerprint != request_fingerprint:
+            raise _key_reused()
+        try:
+            stored = await asyncio.wait_for(asyncio.shield(leader_result), max(deadline - time.monotonic(), 0))
+            return stored, True
+        except asyncio.TimeoutError:
+            raise _still_processing()
+        except _Abandoned:
+            continue
+
+    # Registered before the first await, so duplicates in this worker queue behind us
+    result = asyncio.get_running_loop().create_future()
+    # Nobody may be waiting; mark the exception as seen so it is not logged
+    result.add_done_callback(lambda future: future.cancelled() or future.exception())
+    _inflight[scope] = (request_fingerprint, result)
+    try:
+        delay = 0.05
+        while True:
+            state, stored = await run_db(db, IdempotencyService.claim, user_id, key, request_fingerprint)
+            if state != "in_progress":
+                break
+            # Held by another worker
+            if time.monotonic() + delay > deadline:
+                raise _still_processing()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+        if state == "mismatch":
+            raise _key_reused()
+        replayed = state == "completed"
+        if not replayed:
+            recorded: List[StoredResponse] = []
+
+            def record(session: Session, response: StoredResponse) -> None:
+                IdempotencyService.record(session, user_id, key, response)
+                recorded.append(response)
+
+            try:
+                await operation(record)
+            except Exception:
+                # The operation's transaction rolled back; release() only removes a claim
+                # still in_progress, so a completed key is never dropped
+                await run_db(db, IdempotencyService.release, user_id, key)
+                raise
+            stored = recorded[-1]
+        result.set_result(stored)
+        return stored, replayed
+    except BaseException as e:
+        # Duplicates get the same client error; anything else and they try for themselves
+        result.set_exception(e if isinstance(e, HTTPException) else _Abandoned())
+        raise
+    finally:
+        del _inflight[scope]
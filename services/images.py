@@ -0,0 +1,149 @@
+"""Product image uploads: content-addressed originals plus resized WebP derivatives.
+
+Originals are streamed to static/images under the first 32 hex digits of
+their SHA-256, so re-uploading an image reuses the stored file. Each width in
+IMAGE_DERIVATIVE_WIDTHS gets a WebP copy named <hash>-<width>.webp, produced
+on a bounded worker pool off the event loop; existing derivatives are not
+regenerated. Because a name only ever refers to one content, these files are
+served with an immutable Cache-Control. Derivatives need Pillow; without it
+only the original is stored.
+"""
+import asyncio
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from fastapi import HTTPException, UploadFile, status
+from app.config import settings
+from core.utils import save_upload_file
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; uploads are then stored without derivatives
+    Image = None
+
+IMAGE_DIR = "static/images"
+IMAGE_URL_PREFIX = "/static/images/"
+
+# Paths under the /static mount whose content never changes
+CONTENT_HASHED_PATH = re.compile(r"^images/[0-9a-f]{32}(-\d+)?\.(jpg|png|gif|webp)$")
+
+def derivative_widths() -> List[int]:
+    return sorted({int(width) for width in settings.image_derivative_widths.split(",") if width.strip()})
+
+def generate_derivatives(path: str) -> List[dict]:
+    """Write the WebP derivatives of the image at path and describe them; runs on a worker thread."""
+    stem = os.path.splitext(path)[0]
+    derivatives = []
+    try:
+        with Image.open(path) as original:
+            original_width = original.width
+            image = None
+            # Never upscale: widths at or above the original collapse into one full-size copy
+            for width in sorted({min(width, original_width) for width in derivative_widths()}):
+                target = f"{stem}-{width}.webp"
+                if not os.path.exists(target):
+                    if image is None:
+                        image = ImageOps.exif_transpose(original)
+                        if image.mode not in ("RGB", "RGBA"):
+                            has_alpha = image.mode in ("LA", "PA") or "transparency" in image.info
+                            image = image.convert("RGBA" if has_alpha else "RGB")
+                    height = max(round(image.height * width / image.width), 1)
+                    # A name of its own, since a concurrent upload of the same image writes the same target
+                    fd, temp = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".webp.part")
+                    os.close(fd)
+                    try:
+                        image.resize((width, height), Image.LANCZOS).save(
+                            temp, "WEBP", quality=settings.image_webp_quality, method=4
+                        )
+                        os.replace(temp, target)
+                    except BaseException:
+                        os.unlink(temp)
+                        raise
+                derivatives.append({"width": width, "url": IMAGE_URL_PREFIX + os.path.basename(target)})
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ValueError(f"Image could not be decoded: {e}") from e
+    return derivatives
+
+class ImageProcessor:
+    """Runs derivative generation on a bounded worker pool.
+
+    Pillow releases the GIL while decoding, resizing and encoding, so a small
+    thread pool works in parallel. Once max_pending jobs are queued or
+    running, new uploads are rejected with 503 rather than queueing without
+    bound.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image-processor")
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    async def run(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Image processing busy, please retry",
+                    headers={"Retry-After": "1"},
+                )
+            self.pending += 1
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self.pending -= 1
+        with self._lock:
+            self.completed += 1
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "in_flight": self.pending,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "derivatives_enabled": Image is not None,
+                "derivative_widths": derivative_widths(),
+            }
+
+image_processor = ImageProcessor(settings.image_workers, settings.image_max_pending)
+
+async def store_image(upload: UploadFile) -> dict:
+    """Store an uploaded image and its derivatives, returning their URLs."""
+    path, created = await save_upload_file(upload, IMAGE_DIR, max_bytes=settings.image_upload_max_bytes)
+    derivatives = []
+    if Image is not None:
+        try:
+            derivatives = await image_processor.run(generate_derivatives, path)
+        except ValueError as e:
+            # The magic bytes matched but the body is not a usable image; only the
+            # upload that stored the file removes it
+            if created:
+                os.unlink(path)
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail=str(e)
+            )
+    name = os.path.basename(path)
+    return {
+        "hash": os.path.splitext(name)[0],
+        "url": IMAGE_URL_PREFIX + name,
+        "size": os.path.getsize(path),
+        "derivatives": derivatives,
+    }
@@ -0,0 +1,276 @@
+"""Durable background jobs backed by the jobs table.
+
+enqueue() adds a job to the caller's session, so it is committed, or rolled
+back, together with the change that needs it; checkout only pays for one
+extra INSERT. Workers (scripts/run_worker.py, or a thread in the API process
+with JOBS_RUN_IN_PROCESS) claim due jobs with a conditional UPDATE, so any
+number of them can share the table, and run each in its own transaction. A
+failed job is retried with exponential backoff and jitter until it has had
+JOB_MAX_ATTEMPTS attempts, then left as failed. A job whose worker died is
+picked up again once its lock is older than JOB_LOCK_TIMEOUT_SECONDS, so
+handlers must be safe to run more than once.
+"""
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.orm import Session
+from app.config import settings
+from core.database import SessionLocal
+from models import database as db_models
+
+logger = logging.getLogger("app.jobs")
+
+Handler = Callable[[Session, dict], None]
+handlers: Dict[str, Handler] = {}
+
+PURGE_INTERVAL_SECONDS = 60.0
+# Finished jobs sampled for the latency percentiles
+STATS_SAMPLE_SIZE = 1000
+
+def job_handler(name: str) -> Callable[[Handler], Handler]:
+    """Register fn(db, payload) as the handler for jobs called name."""
+    def register(fn: Handler) -> Handler:
+        handlers[name] = fn
+        return fn
+    return register
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite hands timestamps back without a zone; they are stored in UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+def enqueue(db: Session, name: str, payload: Optional[dict] = None, delay_seconds: float = 0.0) -> db_models.Job:
+    """Add a job to the session; it is only visible to workers once the caller commits."""
+    now = _utcnow()
+    job = db_models.Job(
+        name=name, payload=json.dumps(payload or {}), max_attempts=settings.job_max_attempts,
+        run_at=now + timedelta(seconds=delay_seconds), created_at=now,
+    )
+    db.add(job)
+    return job
+
+def retry_delay(attempts: int) -> float:
+    """Seconds before the next attempt: exponential in the attempts so far, capped, with jitter."""
+    delay = min(settings.job_retry_base_seconds * 2 ** (attempts - 1), settings.job_retry_max_seconds)
+    return delay * random.uniform(0.5, 1.0)
+
+class JobService:
+    @staticmethod
+    def _claimable(now: datetime):
+        job = db_models.Job
+        return or_(
+            and_(job.status == "queued", job.run_at <= now),
+            and_(job.status == "running",
+                 job.locked_at <= now - timedelta(seconds=settings.job_lock_timeout_seconds)),
+        )
+
+    @staticmethod
+    def claim(db: Session, worker_id: str, limit: int) -> List[int]:
+        """Lock up to limit due jobs for worker_id and return their ids, oldest due first."""
+        job = db_models.Job
+        now = _utcnow()
+        candidates = db.execute(
+            select(job.id).where(JobService._claimable(now)).order_by(job.run_at, job.id).limit(limit)
+            # Postgres workers skip each other's rows; SQLite omits the clause
+            .with_for_update(skip_locked=True)
+        ).scalars().all()
+        claimed = []
+        for job_id in candidates:
+            # Re-checked in the UPDATE: another worker may have claimed it since the SELECT
+            result = db.execute(
+                update(job).where(job.id == job_id, JobService._claimable(now)).values(
+                    status="running", locked_at=now, locked_by=worker_id, started_at=now,
+                    attempts=job.attempts + 1,
+                ).execution_options(synchronize_session=False)
+            )
+            if result.rowcount:
+                claimed.append(job_id)
+        db.commit()
+        return claimed
+
+    @staticmethod
+    def execute(db: Session, job_id: int, worker_id: str) -> bool:
+        """Run a claimed job and record the outcome; returns whether it succeeded."""
+        job = db_models.Job
+        record = db.get(job, job_id)
+        mine = and_(job.id == job_id, job.locked_by == worker_id, job.status == "running")
+        try:
+            if record.attempts > record.max_attempts:
+                # Only reachable when a worker died holding the last attempt
+                raise RuntimeError("attempts exhausted by workers that stopped mid-job")
+            handler = handlers.get(record.name)
+            if handler is None:
+                raise LookupError(f"no handler registered for {record.name!r}")
+            handler(db, json.loads(record.payload))
+            # The handler's writes commit together with the job's completion
+            db.execute(update(job).where(mine).values(
+                status="done", finished_at=_utcnow(), locked_by=None, last_error=None
+            ).execution_options(synchronize_session=False))
+            db.commit()
+            return True
+        except Exception as e:
+            db.rollback()
+            attempts, max_attempts, name = record.attempts, record.max_attempts, record.name
+            if attempts >= max_attempts:
+                values = {"status": "failed", "finished_at": _utcnow()}
+                logger.error("Job %s (%s) failed after %s attempts: %r", job_id, name, attempts, e)
+            else:
+                values = {"status": "queued", "run_at": _utcnow() + timedelta(seconds=retry_delay(attempts))}
+                logger.warning("Job %s (%s) attempt %s failed, retrying: %r", job_id, name, attempts, e)
+            db.execute(update(job).where(mine).values(
+                locked_by=None, last_error=repr(e)[:2000], **values
+            ).execution_options(synchronize_session=False))
+            db.commit()
+            return False
+
+    @staticmethod
+    def purge_finished(db: Session) -> int:
+        job = db_models.Job
+        purged = db.query(job).filter(
+            job.status.in_(("done", "failed")),
+            job.finished_at <= _utcnow() - timedelta(seconds=settings.job_retention_seconds),
+        ).delete(synchronize_session=False)
+        db.commit()
+        return purged
+
+    @staticmethod
+    def requeue_failed(db: Session, job_id: Optional[int] = None) -> int:
+        """Give failed jobs (or just job_id) a fresh set of attempts."""
+        job = db_models.Job
+        query = db.query(job).filter(job.status == "failed")
+        if job_id is not None:
+            query = query.filter(job.id == job_id)
+        requeued = query.update(
+            {"status": "queued", "attempts": 0, "run_at": _utcnow(), "finished_at": None},
+            synchronize_session=False,
+        )
+        db.commit()
+        return requeued
+
+    @staticmethod
+    def get_stats(db: Session, window_seconds: int = 3600) -> dict:
+        """Queue depth by status, age of the oldest due job, and latencies of recently finished jobs."""
+        job = db_models.Job
+        now = _utcnow()
+        depth = {name: 0 for name in ("queued", "running", "done", "failed")}
+        depth.update(dict(db.query(job.status, func.count(job.id)).group_by(job.status).all()))
+        due, oldest_due = db.query(func.count(job.id), func.min(job.run_at)).filter(
+            job.status == "queued", job.run_at <= now
+        ).one()
+        since = now - timedelta(seconds=window_seconds)
+        finished = dict(db.query(job.status, func.count(job.id)).filter(
+            job.status.in_(("done", "failed")), job.finished_at >= since
+        ).group_by(job.status).all())
+        recent = db.query(job.created_at, job.run_at, job.started_at, job.finished_at).filter(
+            job.status == "done", job.finished_at >= since
+        ).order_by(job.finished_at.desc()).limit(STATS_SAMPLE_SIZE).all()
+
+        def summary(values: List[float]) -> Optional[dict]:
+            if not values:
+                return None
+            values.sort()
+            return {
+                "avg": round(sum(values) / len(values), 4),
+                "p50": round(values[len(values) // 2], 4),
+                "p95": round(values[min(int(len(values) * 0.95), len(values) - 1)], 4),
+                "max": round(values[-1], 4),
+            }
+
+        return {
+            "depth": depth,
+            "due": due,
+            "oldest_due_age_seconds": round((now - _as_utc(oldest_due)).total_seconds(), 3) if oldest_due else 0.0,
+            "window_seconds": window_seconds,
+            "completed": finished.get("done", 0),
+            "failed": finished.get("failed", 0),
+            # Seconds: due until picked up, picked up until done, and enqueued until done
+            "latency_seconds": {
+                "queue_wait": summary([max((row.started_at - row.run_at).total_seconds(), 0) for row in recent]),
+                "run": summary([(row.finished_at - row.started_at).total_seconds() for row in recent]),
+                "end_to_end": summary([(row.finished_at - row.created_at).total_seconds() for row in recent]),
+            },
+        }
+
+class Worker:
+    """Claims and runs jobs in a loop until stopped."""
+
+    def __init__(self, worker_id: Optional[str] = None, batch_size: Optional[int] = None):
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+        self.batch_size = batch_size or settings.job_batch_size
+        self.stop_event = threading.Event()
+        self._last_purge = 0.0
+
+    def run_once(self) -> int:
+        """Claim and run one batch; returns how many jobs were claimed."""
+        db = SessionLocal()
+        try:
+            if time.monotonic() - self._last_purge >= PURGE_INTERVAL_SECONDS:
+                self._last_purge = time.monotonic()
+                JobService.purge_finished(db)
+            job_ids = JobService.claim(db, self.worker_id, self.batch_size)
+            for job_id in job_ids:
+                JobService.execute(db, job_id, self.worker_id)
+            return len(job_ids)
+        finally:
+            db.close()
+
+    def run(self) -> None:
+        logger.info("Job worker %s started", self.worker_id)
+        while not self.stop_event.is_set():
+            try:
+                claimed = self.run_once()
+            except Exception:
+                logger.exception("Job worker %s failed to poll", self.worker_id)
+                claimed = 0
+            # Keep going while there is a backlog; otherwise poll
+            if claimed < self.batch_size:
+                self.stop_event.wait(settings.job_poll_interval_seconds)
+        logger.info("Job worker %s stopped", self.worker_id)
+
+    def stop(self) -> None:
+        self.stop_event.set()
+
+class Purger:
+    """Purges finished jobs every PURGE_INTERVAL_SECONDS in processes that do not run jobs themselves."""
+
+    def __init__(self):
+        self.stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self.stop_event.wait(PURGE_INTERVAL_SECONDS):
+            db = SessionLocal()
+            try:
+                JobService.purge_finished(db)
+            except Exception:
+                logger.exception("Could not purge finished jobs")
+            finally:
+                db.close()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+
+@job_handler("order.placed")
+def order_placed(db: Session, payload: dict) -> None:
+    """Follow-up work for a new order: customer confirmation and low-stock alerts."""
+    order = db.get(db_models.Order, payload["order_id"])
+    if order is None:
+        return
+    # Hand-off point for the confirmation email once a mail provider is configured
+    logger.info("Order %s confirmed for user %s: %.2f", order.id, order.user_id, order.total_amount)
+    low_stock = db.query(db_models.Product.id, db_models.Product.name, db_models.Product.stock_quantity).join(
+        db_models.OrderItem, db_models.OrderItem.product_id == db_models.Product.id
+    ).filter(
+        db_models.OrderItem.order_id == order.id,
+        db_models.Product.stock_quantity <= settings.low_stock_threshold,
+    ).distinct().all()
+    for product_id, name, stock_quantity in low_stock:
+        logger.warning("Low stock after order %s: product %s (%s) has %s left", order.id, product_id, name, stock_quantity)
@@ -0,0 +1,105 @@
+"""Streaming export of orders and their line items for back-office reporting.
+
+Rows come from a single flat Order/OrderItem join read with yield_per, so the
+export holds one batch in memory whatever the date range. Orders are written
+in id order: CSV has one row per line item with the order fields repeated,
+NDJSON has one object per order with its items nested. An interrupted export
+resumes from the last complete order with after_id.
+"""
+import csv
+import io
+from datetime import datetime, timezone
+from typing import Iterator, Optional
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from core.responses import dumps
+from models import database as db_models
+
+BATCH_SIZE = 1000
+
+ORDER_COLUMNS = [
+    "order_id", "created_at", "status", "user_id", "user_email",
+    "subtotal", "tax_amount", "shipping_amount", "total_amount",
+]
+ITEM_COLUMNS = ["item_id", "product_id", "product_name", "size", "color", "quantity", "unit_price", "total_price"]
+COLUMNS = ORDER_COLUMNS + ITEM_COLUMNS
+
+def _utc_naive(value: Optional[datetime]) -> Optional[datetime]:
+    # Timestamps are stored in UTC
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def _export_query(start: Optional[datetime], end: Optional[datetime], after_id: Optional[int]):
+    Order, OrderItem = db_models.Order, db_models.OrderItem
+    query = (
+        select(
+            Order.id, Order.created_at, Order.status, Order.user_id, db_models.User.email,
+            Order.subtotal, Order.tax_amount, Order.shipping_amount, Order.total_amount,
+            OrderItem.id, OrderItem.product_id, db_models.Product.name, OrderItem.size, OrderItem.color,
+            OrderItem.quantity, OrderItem.unit_price, OrderItem.total_price,
+        )
+        .select_from(Order)
+        .outerjoin(db_models.User, db_models.User.id == Order.user_id)
+        .outerjoin(OrderItem, OrderItem.order_id == Order.id)
+        .outerjoin(db_models.Product, db_models.Product.id == OrderItem.product_id)
+    )
+    if start is not None:
+        query = query.where(Order.created_at >= _utc_naive(start))
+    if end is not None:
+        query = query.where(Order.created_at < _utc_naive(end))
+    if after_id is not None:
+        query = query.where(Order.id > after_id)
+    return query.order_by(Order.id, OrderItem.id)
+
+def iter_batches(
+    db: Session,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    after_id: Optional[int] = None,
+    batch_size: int = BATCH_SIZE,
+):
+    """Flat (order, item) rows in order id order, fetched batch_size at a time."""
+    result = db.execute(_export_query(start, end, after_id), execution_options={"yield_per": batch_size})
+    for rows in result.partitions():
+        yield [
+            tuple(value.isoformat() if isinstance(value, datetime) else value for value in row)
+            for row in rows
+        ]
+
+def export_csv(db: Session, **filters) -> Iterator[str]:
+    """CSV text, one chunk per batch, starting with the header row."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for rows in iter_batches(db, **filters):
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def export_ndjson(db: Session, **filters) -> Iterator[bytes]:
+    """One JSON object per order with nested items; chunks only ever hold complete orders."""
+    order = None
+    for rows in iter_batches(db, **filters):
+        lines = []
+        for row in rows:
+            if order is None or order["order_id"] != row[0]:
+                if order is not None:
+                    lines.append(dumps(order))
+                order = dict(zip(ORDER_COLUMNS, row))
+                order["items"] = []
+            # Orders without items still come through the outer join, with a NULL item
+            if row[len(ORDER_COLUMNS)] is not None:
+                order["items"].append(dict(zip(ITEM_COLUMNS, row[len(ORDER_COLUMNS):])))
+        if lines:
+            yield b"\n".join(lines) + b"\n"
+    if order is not None:
+        yield dumps(order) + b"\n"
+
+EXPORTERS = {
+    "csv": (export_csv, "text/csv; charset=utf-8"),
+    "ndjson": (export_ndjson, "application/x-ndjson"),
+}
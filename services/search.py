@@ -0,0 +1,348 @@
+"""Product search indexes.
+
+Two interchangeable backends cover Product.name, Product.description and the
+category name with relevance ranking, prefix matching and typo tolerance:
+
+* FTS5SearchIndex keeps an SQLite FTS5 table inside the catalog database, so
+  index writes commit atomically with the product change.
+* InvertedIndex is an in-process BM25 index for other databases. It is built
+  from the database on first use and updated when the product's transaction
+  commits; the product ids are then broadcast on the cache bus so the other
+  workers' indexes re-read those products too.
+
+ProductService calls index_product() after flushing a product write; the
+catalog import calls index_products() for each chunk it writes.
+"""
+import bisect
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+from sqlalchemy import bindparam, event, text
+from sqlalchemy.orm import Session
+from app.config import settings
+from core.cache import cache_bus
+from core.database import SessionLocal
+from models import database as db_models
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Per-field weights: a hit in the name counts far more than one in the description
+FIELD_WEIGHTS = {"name": 10.0, "category_name": 4.0, "description": 1.0}
+
+def tokenize(value: Optional[str]) -> List[str]:
+    if not value:
+        return []
+    folded = unicodedata.normalize("NFKD", value.lower())
+    folded = "".join(ch for ch in folded if not unicodedata.combining(ch))
+    return _TOKEN_RE.findall(folded)
+
+def max_typos(term: str) -> int:
+    """Edit distance tolerated for a query term, scaled with its length."""
+    if len(term) <= 3:
+        return 0
+    return 1 if len(term) <= 7 else 2
+
+def within_distance(a: str, b: str, limit: int) -> bool:
+    """True when the Levenshtein distance between a and b is at most limit."""
+    if abs(len(a) - len(b)) > limit:
+        return False
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return False
+        previous = current
+    return previous[-1] <= limit
+
+def _product_documents(db: Session):
+    return db.query(
+        db_models.Product.id,
+        db_models.Product.name,
+        db_models.Product.description,
+        db_models.Category.name,
+    ).outerjoin(db_models.Category, db_models.Product.category_id == db_models.Category.id).filter(
+        db_models.Product.is_active == True
+    ).yield_per(1000)
+
+def _documents_for(db: Session, product_ids: List[int]):
+    """(id, name, description, category name, is_active) of the given products."""
+    return db.query(
+        db_models.Product.id,
+        db_models.Product.name,
+        db_models.Product.description,
+        db_models.Category.name,
+        db_models.Product.is_active,
+    ).outerjoin(db_models.Category, db_models.Product.category_id == db_models.Category.id).filter(
+        db_models.Product.id.in_(product_ids)
+    ).all()
+
+class FTS5SearchIndex:
+    """SQLite FTS5 backed index living next to the catalog tables."""
+
+    name = "fts5"
+
+    def ensure(self, bind) -> None:
+        """Create the FTS tables if needed and rebuild them if they drifted from the catalog."""
+        with bind.begin() as conn:
+            conn.execute(text(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5("
+                "product_id UNINDEXED, name, description, category_name, "
+                "tokenize = 'unicode61 remove_diacritics 2')"
+            ))
+            conn.execute(text(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS products_fts_vocab USING fts5vocab(products_fts, 'row')"
+            ))
+            indexed = conn.execute(text("SELECT count(*) FROM products_fts")).scalar()
+            active = conn.execute(text("SELECT count(*) FROM products WHERE is_active = 1")).scalar()
+        if indexed != active:
+            with Session(bind=bind) as db:
+                self.rebuild(db)
+                db.commit()
+
+    def rebuild(self, db: Session) -> None:
+        db.execute(text("DELETE FROM products_fts"))
+        db.execute(text(
+            "INSERT INTO products_fts (product_id, name, description, category_name) "
+            "SELECT p.id, p.name, coalesce(p.description, ''), coalesce(c.name, '') "
+            "FROM products p LEFT JOIN categories c ON c.id = p.category_id WHERE p.is_active = 1"
+        ))
+
+    def index_product(self, db: Session, product: db_models.Product) -> None:
+        db.execute(text("DELETE FROM products_fts WHERE product_id = :id"), {"id": product.id})
+        if product.is_active:
+            db.execute(text(
+                "INSERT INTO products_fts (product_id, name, description, category_name) "
+                "SELECT p.id, p.name, coalesce(p.description, ''), coalesce(c.name, '') "
+                "FROM products p LEFT JOIN categories c ON c.id = p.category_id WHERE p.id = :id"
+            ), {"id": product.id})
+
+    def index_products(self, db: Session, product_ids: List[int]) -> None:
+        """Reindex several flushed products with two statements."""
+        ids = {"ids": list(product_ids)}
+        db.execute(
+            text("DELETE FROM products_fts WHERE product_id IN :ids").bindparams(bindparam("ids", expanding=True)), ids
+        )
+        db.execute(text(
+            "INSERT INTO products_fts (product_id, name, description, category_name) "
+            "SELECT p.id, p.name, coalesce(p.description, ''), coalesce(c.name, '') "
+            "FROM products p LEFT JOIN categories c ON c.id = p.category_id WHERE p.id IN :ids AND p.is_active = 1"
+        ).bindparams(bindparam("ids", expanding=True)), ids)
+
+    def _expand(self, db: Session, term: str) -> List[str]:
+        """Match expression alternatives for one query term: a prefix match, or near misses."""
+        prefix_hit = db.execute(text(
+            "SELECT 1 FROM products_fts_vocab WHERE term >= :lo AND term < :hi LIMIT 1"
+        ), {"lo": term, "hi": term + "\uffff"}).first()
+        alternatives = [f'"{term}"*']
+        typos = max_typos(term)
+        if prefix_hit or not typos:
+            return alternatives
+        candidates = db.execute(text(
+            "SELECT term FROM products_fts_vocab "
+            "WHERE term >= :lo AND term < :hi AND length(term) BETWEEN :shortest AND :longest"
+        ), {
+            "lo": term[0], "hi": term[0] + "\uffff",
+            "shortest": len(term) - typos, "longest": len(term) + typos,
+        }).scalars()
+        alternatives.extend(f'"{c}"' for c in candidates if within_distance(term, c, typos))
+        return alternatives
+
+    def search(self, db: Session, query: str, limit: int = 20, offset: int = 0) -> List[Tuple[int, float]]:
+        terms = tokenize(query)
+        if not terms:
+            return []
+        match = " AND ".join("(" + " OR ".join(self._expand(db, term)) + ")" for term in terms)
+        rows = db.execute(text(
+            "SELECT product_id, bm25(products_fts, 0.0, :w_name, :w_description, :w_category) AS score "
+            "FROM products_fts WHERE products_fts MATCH :match ORDER BY score LIMIT :limit OFFSET :offset"
+        ), {
+            "match": match, "limit": limit, "offset": offset,
+            "w_name": FIELD_WEIGHTS["name"],
+            "w_description": FIELD_WEIGHTS["description"],
+            "w_category": FIELD_WEIGHTS["category_name"],
+        })
+        # bm25() is lower-is-better; report higher-is-better scores
+        return [(int(product_id), -score) for product_id, score in rows]
+
+class InvertedIndex:
+    """In-process BM25 inverted index with prefix and fuzzy term expansion."""
+
+    name = "memory"
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        self._doc_terms: Dict[int, Set[str]] = {}
+        self._doc_lengths: Dict[int, float] = {}
+        self._total_length = 0.0
+        self._terms: List[str] = []
+        self._terms_dirty = False
+        self._built = False
+        cache_bus.subscribe("search-index", self._apply_remote)
+
+    def ensure(self, bind) -> None:
+        # Built lazily on the first search so startup stays fast on large catalogs
+        pass
+
+    def _ensure_built(self, db: Session) -> None:
+        if not self._built:
+            with self._lock:
+                if not self._built:
+                    self.rebuild(db)
+
+    def rebuild(self, db: Session) -> None:
+        # Listening before reading, so no change committed from here on is missed
+        cache_bus.start()
+        with self._lock:
+            self._postings.clear()
+            self._doc_terms.clear()
+            self._doc_lengths.clear()
+            self._total_length = 0.0
+            for product_id, name, description, category_name in _product_documents(db):
+                self._add(product_id, name, description, category_name)
+            self._terms_dirty = True
+            self._built = True
+
+    def _add(self, product_id: int, name: str, description: Optional[str], category_name: Optional[str]) -> None:
+        weights: Dict[str, float] = defaultdict(float)
+        for field, value in (("name", name), ("description", description), ("category_name", category_name)):
+            for token in tokenize(value):
+                weights[token] += FIELD_WEIGHTS[field]
+        for token, weight in weights.items():
+            if token not in self._postings:
+                self._terms_dirty = True
+            self._postings[token][product_id] = weight
+        self._doc_terms[product_id] = set(weights)
+        self._doc_lengths[product_id] = sum(weights.values())
+        self._total_length += self._doc_lengths[product_id]
+
+    def _remove(self, product_id: int) -> None:
+        for token in self._doc_terms.pop(product_id, ()):
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.pop(product_id, None)
+                if not postings:
+                    del self._postings[token]
+                    self._terms_dirty = True
+        self._total_length -= self._doc_lengths.pop(product_id, 0.0)
+
+    def index_product(self, db: Session, product: db_models.Product) -> None:
+        # Applied by _apply_pending_documents once the surrounding transaction commits
+        category_name = db.query(db_models.Category.name).filter(
+            db_models.Category.id == product.category_id
+        ).scalar() if product.category_id else None
+        db.info.setdefault("search_pending", []).append(
+            (self, product.id, product.name, product.description, category_name, bool(product.is_active))
+        )
+
+    def index_products(self, db: Session, product_ids: List[int]) -> None:
+        """Queue several flushed products like index_product(), reading them in one query."""
+        db.info.setdefault("search_pending", []).extend(
+            (self, product_id, name, description, category_name, bool(is_active))
+            for product_id, name, description, category_name, is_active in _documents_for(db, product_ids)
+        )
+
+    def _apply_remote(self, message: dict) -> None:
+        """Re-read products another worker committed changes to."""
+        if not self._built:
+            return
+        product_ids = message["product_ids"]
+        with SessionLocal() as db:
+            documents = {document[0]: document for document in _documents_for(db, product_ids)}
+        for product_id in product_ids:
+            document = documents.get(product_id)
+            if document is None:
+                self.apply(product_id, "", None, None, False)
+            else:
+                self.apply(*document[:4], bool(document[4]))
+
+    def apply(self, product_id: int, name: str, description: Optional[str],
+              category_name: Optional[str], is_active: bool) -> None:
+        if not self._built:
+            return
+        with self._lock:
+            self._remove(product_id)
+            if is_active:
+                self._add(product_id, name, description, category_name)
+
+    def _sorted_terms(self) -> List[str]:
+        if self._terms_dirty:
+            self._terms = sorted(self._postings)
+            self._terms_dirty = False
+        return self._terms
+
+    def _expand(self, term: str) -> List[Tuple[str, float]]:
+        """(index term, match quality) pairs for one query term."""
+        terms = self._sorted_terms()
+        start = bisect.bisect_left(terms, term)
+        matches = []
+        for candidate in terms[start:]:
+            if not candidate.startswith(term):
+                break
+            # Exact hits beat prefix completions
+            matches.append((candidate, 1.0 if candidate == term else 0.8))
+        if matches:
+            return matches
+        typos = max_typos(term)
+        if not typos:
+            return []
+        # Restrict the fuzzy scan to terms sharing the first character
+        lo = bisect.bisect_left(terms, term[0])
+        hi = bisect.bisect_left(terms, term[0] + "\uffff")
+        return [(candidate, 0.5) for candidate in terms[lo:hi] if within_distance(term, candidate, typos)]
+
+    def search(self, db: Session, query: str, limit: int = 20, offset: int = 0) -> List[Tuple[int, float]]:
+        self._ensure_built(db)
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self._lock:
+            total_docs = len(self._doc_lengths) or 1
+            avg_length = (self._total_length / total_docs) or 1.0
+            scores: Optional[Dict[int, float]] = None
+            for term in terms:
+                term_scores: Dict[int, float] = defaultdict(float)
+                for candidate, quality in self._expand(term):
+                    postings = self._postings[candidate]
+                    idf = math.log(1 + (total_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for product_id, tf in postings.items():
+                        norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[product_id] / avg_length)
+                        score = quality * idf * tf * (self.k1 + 1) / (tf + norm)
+                        term_scores[product_id] = max(term_scores[product_id], score)
+                # Every query term has to match (AND semantics, like the FTS5 backend)
+                if scores is None:
+                    scores = dict(term_scores)
+                else:
+                    scores = {pid: s + term_scores[pid] for pid, s in scores.items() if pid in term_scores}
+                if not scores:
+                    return []
+        ranked = heapq.nsmallest(offset + limit, scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[offset:]
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending_documents(session):
+    pending = session.info.pop("search_pending", ())
+    for index, *document in pending:
+        index.apply(*document)
+    if pending:
+        cache_bus.publish("search-index", {"product_ids": [document[0] for _, *document in pending]})
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_documents(session):
+    session.info.pop("search_pending", None)
+
+def create_search_index(database_url: str):
+    backend = settings.search_backend
+    if backend == "auto":
+        backend = "fts5" if database_url.startswith("sqlite") else "memory"
+    return FTS5SearchIndex() if backend == "fts5" else InvertedIndex()
+
+search_index = create_search_index(settings.database_url)